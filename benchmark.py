@@ -0,0 +1,363 @@
+"""
+Ilova uchun yuklama (benchmark) o'lchovlari.
+
+Sintetik bazani berilgan hajmda datagen.py orqali (mahsulotlar, taomlar, retseptlar,
+bir necha oylik ovqat berish loglari, kirimlar, audit loglar) yaratadi va ilovani jarayon ichida ASGI orqali
+(httpx.ASGITransport, tarmoqsiz) real ssenariylar bilan yuklaydi:
+
+  * login_burst        - ish kuni boshida hamma bir vaqtda tizimga kiradi
+  * lunchtime_serves   - tushlik payti oshpazlar parallel ovqat beradi
+  * dashboard_polling  - boshqaruv paneli ro'yxat va ogohlantirishlarni so'rab turadi
+  * month_end_reports  - oy oxiridagi hisobotlar
+
+Har bir endpoint uchun p50/p95/p99 kechikish, o'tkazuvchanlik (so'rov/s) va bitta
+so'rovdagi SQL so'rovlar soni JSON ko'rinishida chiqariladi, shunda natijalarni
+commit'lar orasida solishtirish mumkin.
+
+Ishlatish:
+    python benchmark.py --products 500 --meals 120 --months 12 --output bench.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+BENCH_USERS = {
+    "admin": "adminpassword",
+    "chef": "chefpassword",
+    "manager": "managerpassword",
+}
+BENCH_STOCK_TOP_UP_GRAMS = 10_000_000.0
+SCENARIOS = ("login_burst", "lunchtime_serves", "dashboard_polling", "month_end_reports")
+
+class Recorder:
+    """Endpoint yorlig'i bo'yicha (kechikish, status, SQL soni, baza vaqti) namunalarini yig'adi."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[tuple]] = defaultdict(list)
+
+    def add(self, label: str, latency: float, status_code: int, sql_count: int, db_ms: float) -> None:
+        self.samples[label].append((latency, status_code, sql_count, db_ms))
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        total = errors = 0
+        for label, samples in sorted(self.samples.items()):
+            latencies = np.array([s[0] for s in samples]) * 1000.0
+            sql_counts = np.array([s[2] for s in samples])
+            db_times = np.array([s[3] for s in samples])
+            statuses = Counter(str(s[1]) for s in samples)
+            endpoint_errors = sum(count for code, count in statuses.items() if int(code) >= 400)
+            total += len(samples)
+            errors += endpoint_errors
+            endpoints[label] = {
+                "count": len(samples),
+                "errors": endpoint_errors,
+                "status_codes": dict(sorted(statuses.items())),
+                "latency_ms": {
+                    "p50": round(float(np.percentile(latencies, 50)), 3),
+                    "p95": round(float(np.percentile(latencies, 95)), 3),
+                    "p99": round(float(np.percentile(latencies, 99)), 3),
+                    "mean": round(float(latencies.mean()), 3),
+                    "max": round(float(latencies.max()), 3),
+                },
+                "sql_per_request": {
+                    "mean": round(float(sql_counts.mean()), 2),
+                    "max": int(sql_counts.max()),
+                },
+                "db_time_ms": {
+                    "mean": round(float(db_times.mean()), 3),
+                    "max": round(float(db_times.max()), 3),
+                },
+            }
+        return {
+            "duration_seconds": round(elapsed, 4),
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else None,
+            "endpoints": endpoints,
+        }
+
+
+async def _timed(client, recorder: Recorder, label: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    # SQL statistikasi ilovaning o'zidan (BOGCHA_DEBUG rejimidagi X-DB-* sarlavhalari)
+    sql_count = int(response.headers.get("x-db-queries", 0))
+    db_ms = float(response.headers.get("x-db-time", "0ms").rstrip("ms"))
+    recorder.add(label, time.perf_counter() - start, response.status_code, sql_count, db_ms)
+    return response
+
+
+async def _run_limited(concurrency: int, factories) -> None:
+    """Korutina fabrikalarini bir vaqtda ko'pi bilan 'concurrency' tadan bajaradi."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(factory):
+        async with semaphore:
+            await factory()
+
+    await asyncio.gather(*(run(factory) for factory in factories))
+
+
+# --- Sintetik ma'lumotlar ---
+def generate_database(args) -> Dict[str, int]:
+    """Bo'sh bazani datagen bilan to'ldiradi (ilova ishga tushishidan oldin) va jadvallar bo'yicha qatorlar sonini qaytaradi."""
+    import database, datagen
+
+    config = datagen.GeneratorConfig(
+        years=args.months / 12.0,
+        products=args.products,
+        meals=args.meals,
+        ingredients_per_meal=(args.ingredients_per_meal, args.ingredients_per_meal),
+        groups=args.groups,
+    )
+    result = datagen.generate(database.DATABASE_URL, config, seed=args.seed)[0]
+    # datagen real qoldiqlarni (bir necha kunlik zaxira) beradi; lunchtime_serves qoldiq yetmasligini emas,
+    # ovqat berish yo'lini o'lchashi uchun qoldiqlar ko'paytiriladi.
+    with database.engine.begin() as conn:
+        conn.execute(database.Product.__table__.update().values(
+            quantity_grams=database.Product.__table__.c.quantity_grams + BENCH_STOCK_TOP_UP_GRAMS
+        ))
+    return {table: entry["rows"] for table, entry in result["tables"].items()}
+
+
+def load_ids() -> Dict[str, List[int]]:
+    import database
+
+    with database.engine.connect() as conn:
+        return {
+            "product_ids": [row[0] for row in conn.execute(select(database.Product.id).order_by(database.Product.id))],
+            "meal_ids": [row[0] for row in conn.execute(select(database.Meal.id).order_by(database.Meal.id))],
+        }
+
+
+def _reset_in_memory_caches() -> None:
+    """Bazaga to'g'ridan-to'g'ri yozilgandan keyin jarayon ichidagi keshlarni tashlab yuboradi."""
+    import http_cache, snapshot, stock_cache
+
+    stock_cache.invalidate()
+    snapshot.invalidate()
+    http_cache.clear()
+    http_cache.bump(http_cache.PRODUCTS, http_cache.DELIVERIES, http_cache.MEALS, http_cache.SERVING_LOGS, http_cache.USERS)
+
+
+# --- Ssenariylar ---
+async def scenario_login_burst(client, args, data, tokens, rng) -> Recorder:
+    recorder = Recorder()
+    usernames = list(BENCH_USERS)
+
+    def login(username):
+        async def run():
+            response = await _timed(client, recorder, "POST /auth/token", "POST", "/auth/token",
+                                    data={"username": username, "password": BENCH_USERS[username]})
+            if response.status_code == 200:
+                tokens[username] = response.json()["access_token"]
+        return run
+
+    await _run_limited(args.concurrency, [login(usernames[i % len(usernames)]) for i in range(args.logins)])
+    return recorder
+
+
+async def scenario_lunchtime_serves(client, args, data, tokens, rng) -> Recorder:
+    recorder = Recorder()
+    headers = {"Authorization": f"Bearer {tokens['chef']}"}
+
+    def serve(i):
+        meal_id = rng.choice(data["meal_ids"])
+        portions = rng.randint(1, 5)
+        async def run():
+            await _timed(client, recorder, "POST /serve/{meal_id}", "POST", f"/serve/{meal_id}",
+                         json={"portions_to_serve": portions},
+                         headers={**headers, "Idempotency-Key": f"bench-serve-{i}"})
+            if i % 5 == 0:
+                await _timed(client, recorder, "GET /portions/all/all/calculate", "GET", "/portions/all/all/calculate", headers=headers)
+        return run
+
+    await _run_limited(args.concurrency, [serve(i) for i in range(args.serves)])
+    return recorder
+
+
+async def scenario_dashboard_polling(client, args, data, tokens, rng) -> Recorder:
+    recorder = Recorder()
+    headers = {"Authorization": f"Bearer {tokens['manager']}"}
+    etags: Dict[str, str] = {}
+    since = {"seq": 0}
+
+    async def poll_once():
+        for label, url in (
+            ("GET /alerts/low_stock", "/alerts/low_stock"),
+            ("GET /products/", "/products/?limit=100"),
+            ("GET /meals/", "/meals/?limit=100"),
+            ("GET /portions/all/all/calculate", "/portions/all/all/calculate"),
+        ):
+            request_headers = dict(headers)
+            if url in etags:
+                request_headers["If-None-Match"] = etags[url]  # Brauzer kabi shartli so'rov
+            response = await _timed(client, recorder, label, "GET", url, headers=request_headers)
+            if response.headers.get("etag"):
+                etags[url] = response.headers["etag"]
+        response = await _timed(client, recorder, "GET /changes", "GET", f"/changes?since={since['seq']}", headers=headers)
+        if response.status_code == 200:
+            since["seq"] = response.json()["next_since"]
+
+    # Bir nechta panel (foydalanuvchi) parallel ishlaydi, har biri ketma-ket so'raydi
+    async def dashboard(rounds):
+        for _ in range(rounds):
+            await poll_once()
+
+    panels = max(1, min(args.concurrency, args.polls))
+    await asyncio.gather(*(dashboard(args.polls // panels + (1 if i < args.polls % panels else 0)) for i in range(panels)))
+    return recorder
+
+
+async def scenario_month_end_reports(client, args, data, tokens, rng) -> Recorder:
+    recorder = Recorder()
+    headers = {"Authorization": f"Bearer {tokens['manager']}"}
+    today = datetime.date.today()
+    months = []
+    year, month = today.year, today.month
+    for _ in range(max(1, min(args.months, 12))):
+        months.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+
+    factories = []
+    for year, month in months:
+        first_day = datetime.date(year, month, 1)
+        last_day = (first_day + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+        product_id = rng.choice(data["product_ids"])
+        requests_for_month = [
+            ("GET /reports/monthly_summary", f"/reports/monthly_summary?year={year}&month={month}"),
+            ("GET /alerts/potential_abuse", f"/alerts/potential_abuse?year={year}&month={month}"),
+            ("GET /reports/ingredient_consumption",
+             f"/reports/ingredient_consumption?product_id={product_id}&start_date={first_day}&end_date={last_day}"),
+            ("GET /reports/meal_serving_logs", f"/reports/meal_serving_logs?startDate={first_day}&endDate={last_day}&limit=100"),
+        ]
+        for label, url in requests_for_month:
+            factories.append(lambda label=label, url=url: _timed(client, recorder, label, "GET", url, headers=headers))
+    factories.append(lambda: _timed(client, recorder, "GET /reports/forecast", "GET", "/reports/forecast", headers=headers))
+    await _run_limited(args.concurrency, factories)
+    return recorder
+
+
+_SCENARIO_FUNCTIONS = {
+    "login_burst": scenario_login_burst,
+    "lunchtime_serves": scenario_lunchtime_serves,
+    "dashboard_polling": scenario_dashboard_polling,
+    "month_end_reports": scenario_month_end_reports,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+    import database, main
+
+    rng = random.Random(args.seed)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "started_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database_url": database.DATABASE_URL,
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "keep_db")},
+        },
+        "scenarios": {},
+    }
+    seed_start = time.perf_counter()
+    results["meta"]["rows"] = await asyncio.to_thread(generate_database, args)
+    results["meta"]["seed_seconds"] = round(time.perf_counter() - seed_start, 3)
+    async with main.app.router.lifespan_context(main.app):
+        data = load_ids()
+        _reset_in_memory_caches()
+
+        tokens: Dict[str, str] = {}
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for username, password in BENCH_USERS.items():  # Boshqa ssenariylar login_burst'siz ham ishlashi uchun
+                response = await client.post("/auth/token", data={"username": username, "password": password})
+                tokens[username] = response.json()["access_token"]
+            for name in args.scenarios:
+                start = time.perf_counter()
+                recorder = await _SCENARIO_FUNCTIONS[name](client, args, data, tokens, rng)
+                results["scenarios"][name] = recorder.summary(time.perf_counter() - start)
+        if main.scheduler.running:
+            main.scheduler.shutdown(wait=False)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bog'cha CRM uchun yuklama o'lchovlari (natija JSON).")
+    parser.add_argument("--db", help="Sintetik baza fayli (standart: vaqtinchalik fayl). Mavjud fayl ishlatilmaydi.")
+    parser.add_argument("--keep-db", action="store_true", help="Tugagandan keyin vaqtinchalik bazani o'chirmaslik")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--meals", type=int, default=60)
+    parser.add_argument("--ingredients-per-meal", type=int, default=6)
+    parser.add_argument("--months", type=int, default=6, help="Ovqat berish loglari necha oylik")
+    parser.add_argument("--groups", type=int, default=8, help="Bog'chadagi guruhlar soni (ovqat berish loglari hajmi)")
+    # Har bir yozish so'rovi ikkita ulanish ishlatadi (endpoint + audit log), standart pool esa 5+10 ta
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=30)
+    parser.add_argument("--serves", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=50, help="Boshqaruv paneli so'rov aylanmalari soni")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="JSON natija fayli (standart: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    db_path = args.db
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix="bogcha_bench_", suffix=".db")
+        os.close(fd)
+        os.remove(db_path)
+    elif os.path.exists(db_path):
+        print(f"BENCHMARK: '{db_path}' allaqachon mavjud. Yangi fayl nomini bering.", file=sys.stderr)
+        return 2
+    # database moduli import qilinishidan OLDIN o'rnatilishi kerak
+    os.environ["BOGCHA_DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["BOGCHA_DEBUG"] = "1"
+
+    try:
+        results = asyncio.run(run_benchmark(args))  # Ilova loglari stderr'ga yoziladi, stdout'da faqat JSON
+    finally:
+        if args.db is None and not args.keep_db and os.path.exists(db_path):
+            os.remove(db_path)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"BENCHMARK: natijalar '{args.output}' fayliga yozildi.", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
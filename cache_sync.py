@@ -0,0 +1,126 @@
+"""
+Bir nechta worker ishlaganda xotiradagi keshlarni bir-biriga moslab turish.
+
+http_cache versiyalari va javob keshi, stock_cache, snapshot va lotlar indeksi (lots) har bir
+jarayonning o'z xotirasida. Bitta worker'dagi yozish boshqa worker keshlarini yangilamaydi, shuning uchun
+har bir worker change_log jadvalini kuzatadi: har POLL_INTERVAL_SECONDS soniyada oxirgi
+ko'rilgan seq'dan keyingi yozuvlarni o'qiydi va tegishli keshlarni yangilaydi. Kesh eskirishi
+shu interval bilan chegaralanadi. O'z yozuvlari ham qayta qo'llanadi - bu zararsiz (keshga
+bazadagi joriy holat yoziladi). seq commit tartibiga mos keladi (database.lock_change_log),
+shuning uchun _last_seq'dan oldin commit qilinmagan o'zgarish qolmaydi.
+
+Faqat BOGCHA_CACHE_SYNC=1 bo'lganda yoqiladi (serve.py bir nechta worker bilan o'zi yoqadi);
+bitta jarayonda keshlar crud orqali to'g'ridan-to'g'ri yangilanadi. Alohida bazalar rejimida
+(BOGCHA_TENANT_DATABASE_URL) shu worker'da ochiq bo'lgan har bir bog'cha bazasi kuzatiladi.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+import database, http_cache, lots, regional, snapshot, stock_cache
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("BOGCHA_CACHE_SYNC", "0").lower() in ("1", "true", "yes")
+POLL_INTERVAL_SECONDS = float(os.getenv("BOGCHA_CACHE_SYNC_INTERVAL", "1"))
+MAX_CHANGES_PER_POLL = 5000  # Bundan ko'p bo'lsa keshlar to'liq tashlab yuboriladi
+
+_lock = threading.Lock()
+# Engine kaliti (database.open_tenant_engines: tenant_id yoki umumiy baza uchun None) -> oxirgi ko'rilgan seq
+_last_seq: Dict[Optional[int], int] = {}
+
+# Ovqat berish va kirimlar change_log'ga mahsulot yozuvi sifatida tushadi
+_RELATED_ENTITIES = {
+    http_cache.PRODUCTS: (http_cache.PRODUCTS, http_cache.DELIVERIES, http_cache.SERVING_LOGS),
+    http_cache.DELIVERIES: (http_cache.DELIVERIES, http_cache.PRODUCTS),
+    http_cache.MEALS: (http_cache.MEALS,),
+    http_cache.USERS: (http_cache.USERS,),
+}
+
+
+def _invalidate_all() -> None:
+    stock_cache.invalidate()
+    lots.invalidate()
+    snapshot.invalidate()
+    http_cache.reset()
+    regional.clear()
+
+
+def _apply(conn, tenant_id: int, changes: List[tuple]) -> None:
+    """Bitta bog'chaning o'zgarishlarini uning keshlariga qo'llaydi."""
+    products = database.Product.__table__
+    product_ids = {entity_id for entity, entity_id in changes if entity == http_cache.PRODUCTS}
+    if product_ids:
+        current = conn.execute(
+            select(products.c.id, products.c.name, products.c.quantity_grams, products.c.min_stock_grams, products.c.unit)
+            .where(products.c.id.in_(product_ids))
+        ).all()
+        stock_cache.update_products(current, tenant_id=tenant_id)
+        for product_id in product_ids - {row.id for row in current}:
+            stock_cache.remove_product(product_id, tenant_id=tenant_id)
+            lots.unload_product(product_id, tenant_id=tenant_id)
+    deliveries = database.ProductDelivery.__table__
+    delivery_ids = {entity_id for entity, entity_id in changes if entity == http_cache.DELIVERIES}
+    if delivery_ids:
+        current = conn.execute(
+            select(deliveries.c.id, deliveries.c.product_id, deliveries.c.expiry_date,
+                   deliveries.c.delivery_date, deliveries.c.remaining_grams)
+            .where(deliveries.c.id.in_(delivery_ids))
+        ).all()
+        lots.apply_committed(tenant_id, current, removed_ids=delivery_ids - {row.id for row in current})
+    # snapshot o'zi PRODUCTS/MEALS versiyalarini tekshiradi, alohida tashlash shart emas
+    entities = {entity for entity, _ in changes}
+    http_cache.bump(
+        *{related for entity in entities for related in _RELATED_ENTITIES.get(entity, (entity,))}, tenant_id=tenant_id
+    )
+
+
+def _poll_engine(key: Optional[int], engine) -> int:
+    change_log = database.ChangeLog.__table__
+    with engine.connect() as conn:
+        last_seq = _last_seq.get(key)
+        if last_seq is None:
+            _last_seq[key] = conn.execute(select(func.max(change_log.c.seq))).scalar() or 0
+            return 0
+        rows = conn.execute(
+            select(change_log.c.seq, change_log.c.tenant_id, change_log.c.entity, change_log.c.entity_id)
+            .where(change_log.c.seq > last_seq)
+            .order_by(change_log.c.seq)
+            .limit(MAX_CHANGES_PER_POLL + 1)
+        ).all()
+        if not rows:
+            return 0
+        if len(rows) > MAX_CHANGES_PER_POLL:
+            _last_seq[key] = conn.execute(select(func.max(change_log.c.seq))).scalar() or 0
+            _invalidate_all()
+            logger.info("Ko'p o'zgarishlar (> %s), keshlar to'liq tashlab yuborildi.", MAX_CHANGES_PER_POLL)
+            return len(rows)
+
+        by_tenant: Dict[int, List[tuple]] = defaultdict(list)
+        for _, row_tenant_id, entity, entity_id in rows:
+            # Alohida bazada tenant_id ustuni emas, engine kaliti hal qiladi
+            by_tenant[key if key is not None else row_tenant_id].append((entity, entity_id))
+        for tenant_id, changes in by_tenant.items():
+            _apply(conn, tenant_id, changes)
+        _last_seq[key] = rows[-1][0]
+    return len(rows)
+
+
+def poll() -> int:
+    """Boshqa worker'lardagi o'zgarishlarni qo'llaydi. Ko'rilgan o'zgarishlar sonini qaytaradi."""
+    seen = 0
+    with _lock:
+        for key, engine in database.open_tenant_engines().items():
+            seen += _poll_engine(key, engine)
+    return seen
+
+
+def run_poll() -> None:
+    try:
+        poll()
+    except Exception:
+        logger.exception("Keshlarni sinxronlashda xatolik")
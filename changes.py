@@ -0,0 +1,97 @@
+"""
+Mahsulotlar, kirimlar, taomlar va foydalanuvchilar uchun o'zgarishlar lentasi (GET /changes?since=<seq>).
+
+crud'dagi yozish funksiyalari har bir yaratish/yangilash/o'chirishni change_log jadvaliga
+o'sha tranzaksiya ichida yozadi. Mijoz oxirgi ko'rgan seq'ni yuboradi va faqat shundan
+keyin o'zgargan obyektlarni (joriy holati bilan) hamda o'chirilganlari uchun "tombstone"
+larni oladi, shuning uchun trafik katalog hajmiga emas, o'zgarishlar soniga bog'liq.
+
+Bir sahifadagi bir obyektning bir nechta o'zgarishi bittaga qisqartiriladi (oxirgisi
+hisobga olinadi). Eski jurnal qatorlari retention orqali o'chiriladi; mijozning since
+qiymati saqlangan oraliqdan tashqarida bo'lsa, reset=True qaytadi.
+
+seq tartibi commit tartibiga mos keladi, shuning uchun since'dan keyingi o'zgarish o'tkazib
+yuborilmaydi: SQLite'da yozish tranzaksiyalari baribir ketma-ket, PostgreSQL'da esa change_log'ga
+yozuvchi tranzaksiyalar advisory lock bilan ketma-ket qilinadi (database.lock_change_log).
+Bir nechta bog'cha bitta bazada bo'lsa, seq bog'cha ichida uzluksiz emas: since bog'chaning
+eng eski saqlangan seq'idan oldin bo'lsa (masalan, yangi bog'cha uchun since=0), reset=True
+qaytadi va mijoz to'liq ro'yxatlarni yuklaydi.
+"""
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+import crud, database, http_cache, schemas
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Obyekt turi -> (model, qo'shimcha yuklash opsiyalari)
+_ENTITY_MODELS = {
+    http_cache.PRODUCTS: (database.Product, ()),
+    http_cache.DELIVERIES: (database.ProductDelivery, (selectinload(database.ProductDelivery.product),)),
+    http_cache.MEALS: (database.Meal, (selectinload(database.Meal.ingredients).selectinload(database.MealIngredient.product),)),
+    http_cache.USERS: (database.User, ()),
+}
+
+
+def needs_reset(since: int, oldest, latest) -> bool:
+    """since jurnalning saqlangan oralig'idan tashqarida bo'lsa True (mijoz to'liq ro'yxatni yuklashi kerak)."""
+    if latest is None:
+        # Jurnal bo'sh (hammasi retention bilan o'chgan): since > 0 ni tekshirib bo'lmaydi
+        return since > 0
+    return since > latest or since < oldest - 1
+
+
+def get_changes(db: Session, since: int, limit: int = DEFAULT_PAGE_SIZE, include_users: bool = False) -> schemas.ChangesResponse:
+    oldest, latest = crud.get_change_log_bounds(db)
+    latest_seq = latest or 0
+    if needs_reset(since, oldest, latest):
+        return schemas.ChangesResponse(
+            since=since, next_since=latest_seq, latest_seq=latest_seq, has_more=False, reset=True
+        )
+
+    rows = crud.get_changes_since(db, since, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_since = rows[-1].seq if rows else since
+
+    # (entity, id) -> (op, seq): sahifadagi oxirgi o'zgarish
+    latest_changes: Dict[Tuple[str, int], Tuple[database.ChangeOp, int]] = {}
+    for row in rows:
+        if row.entity == http_cache.USERS and not include_users:
+            continue
+        latest_changes[(row.entity, row.entity_id)] = (row.op, row.seq)
+
+    upserts: Dict[str, List[int]] = {entity: [] for entity in _ENTITY_MODELS}
+    deleted: List[schemas.ChangeTombstone] = []
+    for (entity, entity_id), (op, seq) in latest_changes.items():
+        if op == database.ChangeOp.delete:
+            deleted.append(schemas.ChangeTombstone(entity=entity, id=entity_id, seq=seq))
+        elif entity in upserts:
+            upserts[entity].append(entity_id)
+
+    loaded: Dict[str, list] = {}
+    for entity, ids in upserts.items():
+        model, options = _ENTITY_MODELS[entity]
+        objects = db.query(model).options(*options).filter(model.id.in_(ids)).order_by(model.id).all() if ids else []
+        found = {obj.id for obj in objects}
+        for entity_id in ids:
+            if entity_id not in found:
+                # Keyingi sahifada o'chirilgan - hozirdanoq tombstone sifatida qaytaramiz
+                deleted.append(schemas.ChangeTombstone(entity=entity, id=entity_id, seq=latest_changes[(entity, entity_id)][1]))
+        loaded[entity] = objects
+
+    deleted.sort(key=lambda tombstone: tombstone.seq)
+    return schemas.ChangesResponse(
+        since=since,
+        next_since=next_since,
+        latest_seq=latest_seq,
+        has_more=has_more,
+        reset=False,
+        products=[schemas.Product.model_validate(obj, from_attributes=True) for obj in loaded[http_cache.PRODUCTS]],
+        deliveries=[schemas.ProductDelivery.model_validate(obj, from_attributes=True) for obj in loaded[http_cache.DELIVERIES]],
+        meals=[schemas.Meal.model_validate(obj, from_attributes=True) for obj in loaded[http_cache.MEALS]],
+        users=[schemas.UserSchema.model_validate(obj, from_attributes=True) for obj in loaded[http_cache.USERS]],
+        deleted=deleted,
+    )
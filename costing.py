@@ -0,0 +1,187 @@
+"""
+Kirim narxlari bo'yicha tannarx (lotlar bo'yicha) va xarajat hisobotlari.
+
+Har bir kirim (ProductDelivery) lot: unit_price - 1000 asosiy birlik (1 kg) narxi, remaining_grams - lotning hali
+sarflanmagan qismi, expiry_date - yaroqlilik muddati. Ovqat berilganda har bir mahsulot
+miqdori ochiq lotlardan avval muddati yaqinlaridan (FEFO), muddatsizlari kirim sanasi bo'yicha
+(FIFO) olinadi (allocate_serving) va har bir bo'lak LotAllocation sifatida narxi bilan yoziladi.
+Lotlar tartibi xotiradagi indeksdan (lots.py) olinadi, shuning uchun ovqat berish faqat
+tegilgan lotlar soniga bog'liq - yopilgan kirimlar tarixi o'qilmaydi. Hisobotlar tayyor
+LotAllocation yozuvlarini jamlaydi, tarix qayta o'ynalmaydi.
+
+Taqsimot butun milli-birliklarda (units.to_milli) hisoblanadi: lot qoldig'i va olingan bo'laklar
+yig'indisi aynan sarflangan miqdorga teng, float qoldiqlari uchun chegaralar kerak emas.
+
+Lotlar qoldig'i yetmasa (masalan, lotlar joriy etilishidan oldingi qoldiq), qolgan miqdor
+delivery_id=None bilan yoziladi va uncosted_grams'ga tushadi.
+"""
+import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+import crud, database, http_cache, lots, schemas, units
+
+LOT_BATCH_SIZE = 8  # Zaxira yo'lida bir so'rovda o'qiladigan ochiq lotlar soni
+
+
+def lot_cost(grams: float, unit_price: Optional[float]) -> Optional[float]:
+    return grams * unit_price / 1000.0 if unit_price is not None else None
+
+
+def _open_lots(db: Session, product_id: int) -> List[database.ProductDelivery]:
+    return db.query(database.ProductDelivery).filter(
+        database.ProductDelivery.product_id == product_id,
+        database.ProductDelivery.remaining_grams > 0,
+    ).order_by(
+        database.ProductDelivery.expiry_date.is_(None), database.ProductDelivery.expiry_date,
+        database.ProductDelivery.delivery_date, database.ProductDelivery.id,
+    ).limit(LOT_BATCH_SIZE).all()
+
+
+def _take(db: Session, log_entry: database.MealServingLog, lot: database.ProductDelivery, left: int) -> int:
+    """Lotdan 'left' (milli-birlik) gacha oladi, taqsimotni yozadi va olingan miqdorni qaytaradi."""
+    remaining = units.to_milli(lot.remaining_grams)
+    taken = min(remaining, left)
+    lot.remaining_grams = units.from_milli(remaining - taken)
+    lots.track(db, lot)
+    crud.record_change(db, http_cache.DELIVERIES, lot.id)
+    grams = units.from_milli(taken)
+    db.add(database.LotAllocation(
+        serving_log_id=log_entry.id, delivery_id=lot.id, product_id=lot.product_id, meal_id=log_entry.meal_id,
+        served_at=log_entry.serving_time, allocated_grams=grams, cost=lot_cost(grams, lot.unit_price),
+    ))
+    return taken
+
+
+def allocate_product(db: Session, log_entry: database.MealServingLog, product_id: int, amount: int) -> None:
+    """Mahsulotning 'amount' (milli-birlik) miqdorini lotlardan FEFO tartibida oladi (chaqiruvchi commit qiladi)."""
+    left = amount
+    for lot_id in lots.ordered_lot_ids(db, product_id):
+        if left <= 0:
+            break
+        lot = db.get(database.ProductDelivery, lot_id)
+        if lot is None or lot.remaining_grams <= 0:
+            continue  # Indeks yozuvi eskirgan (boshqa worker yopgan); commit'dan keyin cache_sync tozalaydi
+        left -= _take(db, log_entry, lot, left)
+
+    # Indeksda yo'q ochiq lot bo'lishi mumkin (boshqa worker'dagi kirim hali sinxronlanmagan) - bazadan tekshiramiz
+    while left > 0:
+        db.flush()  # Sessiya autoflush=False: yuqorida yopilgan lotlar qayta o'qilmasligi uchun
+        open_lots = _open_lots(db, product_id)
+        if not open_lots:
+            break
+        lots.unload_product(product_id)
+        for lot in open_lots:
+            left -= _take(db, log_entry, lot, left)
+            if left <= 0:
+                break
+    if left > 0:
+        db.add(database.LotAllocation(
+            serving_log_id=log_entry.id, delivery_id=None, product_id=product_id, meal_id=log_entry.meal_id,
+            served_at=log_entry.serving_time, allocated_grams=units.from_milli(left), cost=None,
+        ))
+
+
+def allocate_serving(db: Session, log_entry: database.MealServingLog, amounts: Dict[int, int]) -> None:
+    """
+    Ovqat berish logi uchun barcha ingredientlarni lotlarga taqsimlaydi. amounts: product_id -> milli-birlik.
+    log_entry flush qilingan bo'lishi kerak.
+    """
+    for product_id, amount in amounts.items():
+        allocate_product(db, log_entry, product_id, amount)
+
+
+# --- Hisobotlar ---
+def _per_portion(total_cost: float, portions: int) -> Optional[float]:
+    return round(total_cost / portions, 2) if portions else None
+
+
+def _as_date_string(value) -> str:
+    # SQLite'da func.date() satr qaytaradi, PostgreSQL'da esa date
+    return value[:10] if isinstance(value, str) else value.isoformat()
+
+
+def get_meal_costs(db: Session, start: datetime.datetime, end: datetime.datetime) -> List[schemas.MealCost]:
+    """[start, end) davridagi har bir taomning tannarxi."""
+    allocation = database.LotAllocation
+    costs = {
+        meal_id: (float(total_cost or 0.0), float(uncosted or 0.0))
+        for meal_id, total_cost, uncosted in db.query(
+            allocation.meal_id,
+            func.sum(allocation.cost),
+            func.sum(case((allocation.cost.is_(None), allocation.allocated_grams), else_=0.0)),
+        ).filter(allocation.served_at >= start, allocation.served_at < end).group_by(allocation.meal_id)
+    }
+    serving_log = database.MealServingLog
+    portions = dict(db.query(serving_log.meal_id, func.sum(serving_log.portions_served)).filter(
+        serving_log.serving_time >= start, serving_log.serving_time < end
+    ).group_by(serving_log.meal_id).all())
+    meal_ids = set(costs) | set(portions)
+    names = dict(db.query(database.Meal.id, database.Meal.name).filter(database.Meal.id.in_(meal_ids)).all()) if meal_ids else {}
+
+    result = []
+    for meal_id in sorted(meal_ids, key=lambda meal_id: (names.get(meal_id) or "", meal_id)):
+        total_cost, uncosted = costs.get(meal_id, (0.0, 0.0))
+        meal_portions = int(portions.get(meal_id) or 0)
+        result.append(schemas.MealCost(
+            meal_id=meal_id,
+            meal_name=names.get(meal_id),
+            portions_served=meal_portions,
+            total_cost=round(total_cost, 2),
+            cost_per_portion=_per_portion(total_cost, meal_portions),
+            uncosted_grams=round(uncosted, 2),
+        ))
+    return result
+
+
+def get_daily_costs(db: Session, start: datetime.datetime, end: datetime.datetime) -> List[schemas.DailyCost]:
+    """[start, end) davridagi har bir kun xarajati (ovqat berilmagan kunlar qaytmaydi)."""
+    allocation = database.LotAllocation
+    allocation_day = func.date(allocation.served_at)
+    costs = {
+        _as_date_string(day): (float(total_cost or 0.0), float(uncosted or 0.0))
+        for day, total_cost, uncosted in db.query(
+            allocation_day,
+            func.sum(allocation.cost),
+            func.sum(case((allocation.cost.is_(None), allocation.allocated_grams), else_=0.0)),
+        ).filter(allocation.served_at >= start, allocation.served_at < end).group_by(allocation_day)
+    }
+    serving_log = database.MealServingLog
+    serving_day = func.date(serving_log.serving_time)
+    portions = {
+        _as_date_string(day): int(total or 0)
+        for day, total in db.query(serving_day, func.sum(serving_log.portions_served)).filter(
+            serving_log.serving_time >= start, serving_log.serving_time < end
+        ).group_by(serving_day)
+    }
+
+    result = []
+    for day in sorted(set(costs) | set(portions)):
+        total_cost, uncosted = costs.get(day, (0.0, 0.0))
+        day_portions = portions.get(day, 0)
+        result.append(schemas.DailyCost(
+            date=day,
+            portions_served=day_portions,
+            total_cost=round(total_cost, 2),
+            cost_per_portion=_per_portion(total_cost, day_portions),
+            uncosted_grams=round(uncosted, 2),
+        ))
+    return result
+
+
+def get_monthly_cost_report(db: Session, year: int, month: int) -> schemas.MonthlyCostReport:
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    meals = get_meal_costs(db, start, end)
+    total_cost = sum(meal.total_cost for meal in meals)
+    portions = sum(meal.portions_served for meal in meals)
+    return schemas.MonthlyCostReport(
+        month=f"{year}-{str(month).zfill(2)}",
+        portions_served=portions,
+        total_cost=round(total_cost, 2),
+        cost_per_portion=_per_portion(total_cost, portions),
+        uncosted_grams=round(sum(meal.uncosted_grams for meal in meals), 2),
+        meals=meals,
+    )
@@ -1,9 +1,28 @@
 from sqlalchemy.orm import Session,selectinload
 from sqlalchemy import func, extract
-import database, schemas, security
+import database, schemas, security, stock_cache, events, http_cache, lots, units
 import datetime
+import logging
 from typing import List, Optional
-from sqlalchemy import select
+from sqlalchemy import select, delete, inspect
+
+logger = logging.getLogger(__name__)
+
+# --- Change Log ---
+def record_change(db: Session, entity: str, entity_id: int, op: database.ChangeOp = database.ChangeOp.upsert) -> None:
+    """
+    O'zgarishni change_log'ga yozadi. Commit'dan OLDIN chaqiriladi, shunda jurnal qatori
+    o'zgarishning o'zi bilan bitta tranzaksiyada saqlanadi (yoki u bilan birga bekor qilinadi).
+    """
+    database.lock_change_log(db)
+    db.add(database.ChangeLog(entity=entity, entity_id=entity_id, op=op, changed_at=datetime.datetime.utcnow()))
+
+def get_changes_since(db: Session, since: int, limit: int) -> List[database.ChangeLog]:
+    return db.query(database.ChangeLog).filter(database.ChangeLog.seq > since).order_by(database.ChangeLog.seq).limit(limit).all()
+
+def get_change_log_bounds(db: Session):
+    """(eng eski saqlangan seq, eng oxirgi seq). Jurnal bo'sh bo'lsa (None, None)."""
+    return db.query(func.min(database.ChangeLog.seq), func.max(database.ChangeLog.seq)).one()
 
 # --- User CRUD (o'zgarmagan, faqat database.User ni to'g'ri ishlatish) ---
 def get_user(db: Session, user_id: int) -> Optional[database.User]:
@@ -20,11 +39,15 @@ def create_user(db: Session, user: schemas.UserCreate) -> database.User:
     db_user = database.User(
         username=user.username,
         hashed_password=hashed_password,
-        role=user.role
+        role=user.role,
+        is_platform=user.is_platform,
     )
     db.add(db_user)
+    db.flush()
+    record_change(db, http_cache.USERS, db_user.id)
     db.commit()
     db.refresh(db_user)
+    http_cache.bump(http_cache.USERS)
     return db_user
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> Optional[database.User]:
@@ -38,18 +61,40 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> O
         del update_data["password"]
     for key, value in update_data.items():
         setattr(db_user, key, value)
+    record_change(db, http_cache.USERS, db_user.id)
     db.commit()
     db.refresh(db_user)
+    http_cache.bump(http_cache.USERS)
     return db_user
 
 def delete_user(db: Session, user_id: int) -> Optional[database.User]:
     db_user = get_user(db, user_id)
     if db_user:
         db.delete(db_user)
+        record_change(db, http_cache.USERS, db_user.id, database.ChangeOp.delete)
         db.commit()
+        http_cache.bump(http_cache.USERS)
     return db_user
 
 # --- Product CRUD (O'zgartirilgan) ---
+def notify_stock_changed(products: List[database.Product]) -> None:
+    """Commit qilingan qoldiq o'zgarishlarini keshga yozadi va SSE obunachilariga e'lon qiladi."""
+    http_cache.bump(http_cache.PRODUCTS)
+    transitions = dict(stock_cache.update_products(products))
+    for product in products:
+        events.publish("stock_changed", {
+            "product_id": product.id,
+            "product_name": product.name,
+            "quantity_grams": product.quantity_grams,
+        })
+        if product.id in transitions:
+            events.publish("low_stock", {
+                "product_id": product.id,
+                "product_name": product.name,
+                "quantity_grams": product.quantity_grams,
+                "is_low": transitions[product.id],
+            })
+
 def get_product(db: Session, product_id: int) -> Optional[database.Product]:
     return db.query(database.Product).filter(database.Product.id == product_id).first()
 
@@ -68,11 +113,14 @@ def create_product_type(db: Session, product_in: schemas.ProductCreate) -> datab
     db_product = database.Product(
         name=product_in.name,
         quantity_grams=0, # Boshlang'ich miqdor 0, ProductDelivery orqali qo'shiladi
-        delivery_date=product_in.delivery_date or datetime.datetime.utcnow() # Birinchi kiritilgan sana
+        delivery_date=product_in.delivery_date or datetime.datetime.utcnow(), # Birinchi kiritilgan sana
+        unit=product_in.unit
     )
     if product_in.initial_quantity_grams > 0 :
         # Agar boshlang'ich miqdor berilsa, uni ham ProductDelivery orqali kiritamiz
         db.add(db_product)
+        db.flush()
+        record_change(db, http_cache.PRODUCTS, db_product.id)
         db.commit()
         db.refresh(db_product)
         # Boshlang'ich miqdorni ProductDelivery sifatida qo'shish
@@ -85,8 +133,11 @@ def create_product_type(db: Session, product_in: schemas.ProductCreate) -> datab
         create_product_delivery(db, delivery_in=initial_delivery, product_obj=db_product)
     else:
         db.add(db_product)
+        db.flush()
+        record_change(db, http_cache.PRODUCTS, db_product.id)
         db.commit()
         db.refresh(db_product)
+        notify_stock_changed([db_product])
 
     return db_product
 
@@ -102,8 +153,22 @@ def update_product_name(db: Session, product_id: int, product_update: schemas.Pr
         if existing_product_with_new_name and existing_product_with_new_name.id != product_id:
             raise ValueError(f"Product with name '{product_update.name}' already exists.")
         db_product.name = product_update.name
+        record_change(db, http_cache.PRODUCTS, db_product.id)
         db.commit()
         db.refresh(db_product)
+        notify_stock_changed([db_product])
+    return db_product
+
+def update_product_threshold(db: Session, product_id: int, threshold_update: schemas.ProductThresholdUpdate) -> Optional[database.Product]:
+    """Mahsulotning kam qolganlik chegarasini yangilaydi (None - standart chegara)."""
+    db_product = get_product(db, product_id)
+    if not db_product:
+        return None
+    db_product.min_stock_grams = threshold_update.min_stock_grams
+    record_change(db, http_cache.PRODUCTS, db_product.id)
+    db.commit()
+    db.refresh(db_product)
+    notify_stock_changed([db_product])
     return db_product
 
 def delete_product(db: Session, product_id: int) -> Optional[database.Product]:
@@ -112,35 +177,102 @@ def delete_product(db: Session, product_id: int) -> Optional[database.Product]:
         if db_product.meal_ingredients: # Bu bog'liqlikni tekshirish
             raise ValueError(f"Product '{db_product.name}' is used in meal recipes and cannot be deleted first.")
         # ProductDelivery yozuvlari ham cascade orqali o'chishi kerak (modelda to'g'ri sozlanganda)
+        for delivery in db_product.deliveries:
+            record_change(db, http_cache.DELIVERIES, delivery.id, database.ChangeOp.delete)
         db.delete(db_product)
+        record_change(db, http_cache.PRODUCTS, db_product.id, database.ChangeOp.delete)
         db.commit()
+        stock_cache.remove_product(product_id)
+        lots.unload_product(product_id)
+        http_cache.bump(http_cache.PRODUCTS, http_cache.DELIVERIES)
+    return db_product
+
+
+# --- Birliklar ---
+def unit_factor(product: database.Product, unit: Optional[str]) -> float:
+    """1 'unit' necha asosiy birlik. Mahsulot koeffitsiyentlari faqat unit berilganda o'qiladi."""
+    if unit is None:
+        return 1.0
+    custom_factors = {conversion.unit: conversion.base_units_per_unit for conversion in product.unit_conversions}
+    return units.conversion_factor(product.unit, unit, custom_factors)
+
+def set_product_units(db: Session, product_id: int, conversions: List[schemas.ProductUnitConversion]) -> Optional[database.Product]:
+    """
+    Mahsulotning qo'shimcha birliklarini almashtiradi. Avval kiritilgan kirim va retseptlar
+    yozilgan paytda asosiy birlikka o'tkazilgan, shuning uchun ularga ta'sir qilmaydi.
+    """
+    db_product = get_product(db, product_id)
+    if not db_product:
+        return None
+    factors = {}
+    for conversion in conversions:
+        unit = units.normalize_unit_name(conversion.unit)
+        if unit == db_product.unit:
+            raise ValueError(f"'{unit}' is the base unit of product '{db_product.name}'.")
+        if unit in factors:
+            raise ValueError(f"Unit '{unit}' is listed more than once.")
+        factors[unit] = conversion.base_units_per_unit
+    db_product.unit_conversions = [
+        database.ProductUnitConversion(unit=unit, base_units_per_unit=factor) for unit, factor in factors.items()
+    ]
+    record_change(db, http_cache.PRODUCTS, product_id)
+    db.commit()
+    db.refresh(db_product)
+    http_cache.bump(http_cache.PRODUCTS)
     return db_product
 
 
 # --- ProductDelivery CRUD (Yangi) ---
-def create_product_delivery(db: Session, delivery_in: schemas.ProductDeliveryCreate, product_obj: Optional[database.Product] = None) -> database.ProductDelivery:
+def create_product_delivery(db: Session, delivery_in: schemas.ProductDeliveryCreate, product_obj: Optional[database.Product] = None, commit: bool = True) -> database.ProductDelivery:
+    """
+    Kirimni yozadi va mahsulot qoldig'ini oshiradi. commit=False bo'lsa faqat flush qilinadi
+    (masalan, /sync bitta tranzaksiyada ko'p amal bajarganda); bu holda xabarnomalarni chaqiruvchi yuboradi.
+    """
     if not product_obj:
         product_obj = get_product(db, delivery_in.product_id)
     
     if not product_obj:
         raise ValueError(f"Product with ID {delivery_in.product_id} not found to record delivery.")
 
+    # Miqdor va narx bir marta asosiy birlikka o'tkaziladi; keyingi hisob-kitoblar faqat asosiy birlikda
+    factor = unit_factor(product_obj, delivery_in.unit)
+    quantity = units.to_milli(delivery_in.quantity_received * factor)
+    unit_price = delivery_in.unit_price
+    if unit_price is not None and delivery_in.unit is not None:
+        unit_price = unit_price / factor * 1000.0 # 1 unit narxi -> 1000 asosiy birlik narxi
+
     db_delivery = database.ProductDelivery(
         product_id=delivery_in.product_id,
-        quantity_received=delivery_in.quantity_received,
+        quantity_received=units.from_milli(quantity),
         delivery_date=delivery_in.delivery_date,
-        supplier=delivery_in.supplier
+        supplier=delivery_in.supplier,
+        unit_price=unit_price,
+        expiry_date=delivery_in.expiry_date,
+        remaining_grams=units.from_milli(quantity) # Yangi lot to'liq ochiq
     )
     db.add(db_delivery)
 
-    product_obj.quantity_grams += delivery_in.quantity_received
+    product_obj.quantity_grams = database.milli_add(database.Product.quantity_grams, quantity) # Bazada butun sonlarda
     product_obj.delivery_date = delivery_in.delivery_date 
-
+    db.flush()
+    lots.track(db, db_delivery)
+    record_change(db, http_cache.DELIVERIES, db_delivery.id)
+    record_change(db, http_cache.PRODUCTS, product_obj.id)
+
+    if not commit:
+        db.flush()
+        return db_delivery
     db.commit()
-    db.refresh(db_delivery)
-    db.refresh(product_obj) 
+    notify_delivery_received(db, db_delivery)
     return db_delivery
 
+def notify_delivery_received(db: Session, db_delivery: database.ProductDelivery) -> None:
+    """create_product_delivery natijasi commit qilingandan keyin keshlar va obunachilarni xabardor qiladi."""
+    db.refresh(db_delivery)
+    db.refresh(db_delivery.product)
+    http_cache.bump(http_cache.DELIVERIES)
+    notify_stock_changed([db_delivery.product])
+
 def get_product_deliveries(
     db: Session, 
     product_id: Optional[int] = None, 
@@ -188,6 +320,8 @@ def get_meals(db: Session, skip: int = 0, limit: int = 100) -> List[database.Mea
 def create_meal(db: Session, meal: schemas.MealCreate) -> database.Meal:
     db_meal = database.Meal(name=meal.name)
     db.add(db_meal)
+    db.flush()
+    record_change(db, http_cache.MEALS, db_meal.id)
     db.commit()
     db.refresh(db_meal)
     for ingredient_data in meal.ingredients:
@@ -195,14 +329,21 @@ def create_meal(db: Session, meal: schemas.MealCreate) -> database.Meal:
         if not product:
             db.rollback() # Xatolik bo'lsa, o'zgarishlarni qaytarish
             raise ValueError(f"Product with ID {ingredient_data.product_id} not found for meal '{meal.name}'.")
+        try:
+            required = ingredient_data.required_grams * unit_factor(product, ingredient_data.unit)
+        except ValueError:
+            db.rollback()
+            raise
         db_ingredient = database.MealIngredient(
             meal_id=db_meal.id,
             product_id=ingredient_data.product_id,
-            required_grams=ingredient_data.required_grams
+            required_grams=required # Asosiy birlikda
         )
         db.add(db_ingredient)
+    record_change(db, http_cache.MEALS, db_meal.id)
     db.commit() # Ingredientlar qo'shilgandan keyin yana commit
     db.refresh(db_meal) # Ingredientlar bilan to'liq yuklash uchun
+    http_cache.bump(http_cache.MEALS)
     return db_meal
 
 def update_meal(db: Session, meal_id: int, meal_update: schemas.MealUpdate) -> Optional[database.Meal]:
@@ -223,16 +364,23 @@ def update_meal(db: Session, meal_id: int, meal_update: schemas.MealUpdate) -> O
             if not product:
                 db.rollback()
                 raise ValueError(f"Product with ID {ingredient_schema.product_id} not found for meal '{db_meal.name}'.")
-            
+            try:
+                required = ingredient_schema.required_grams * unit_factor(product, ingredient_schema.unit)
+            except ValueError:
+                db.rollback()
+                raise
+
             db_ingredient = database.MealIngredient(
                 meal_id=db_meal.id,
                 product_id=ingredient_schema.product_id,
-                required_grams=ingredient_schema.required_grams
+                required_grams=required # Asosiy birlikda
             )
             db.add(db_ingredient)
             
+    record_change(db, http_cache.MEALS, db_meal.id)
     db.commit()
     db.refresh(db_meal)
+    http_cache.bump(http_cache.MEALS)
     return db_meal
 
 def delete_meal(db: Session, meal_id: int) -> Optional[database.Meal]:
@@ -240,20 +388,28 @@ def delete_meal(db: Session, meal_id: int) -> Optional[database.Meal]:
     if db_meal:
         # MealIngredient lar cascade orqali o'chishi kerak (modelda to'g'ri sozlanganda)
         db.delete(db_meal)
+        record_change(db, http_cache.MEALS, db_meal.id, database.ChangeOp.delete)
         db.commit()
+        http_cache.bump(http_cache.MEALS)
     return db_meal
 
 # --- Meal Serving Log CRUD (create o'zgartirilgan) ---
-def create_meal_serving_log(db: Session, meal_id: int, user_id: int, portions_served: int) -> database.MealServingLog:
+def create_meal_serving_log(db: Session, meal_id: int, user_id: int, portions_served: int,
+                            serving_time: Optional[datetime.datetime] = None, commit: bool = True) -> database.MealServingLog:
+    """serving_time berilmasa, joriy vaqt yoziladi (oflayn qurilmalar o'z vaqtini yuboradi)."""
     db_log = database.MealServingLog(
         meal_id=meal_id,
         served_by_user_id=user_id,
         portions_served=portions_served, # Berilgan porsiyalar soni
-        serving_time=datetime.datetime.utcnow()
+        serving_time=serving_time or datetime.datetime.utcnow()
     )
     db.add(db_log)
+    if not commit:
+        db.flush()
+        return db_log
     db.commit()
     db.refresh(db_log)
+    http_cache.bump(http_cache.SERVING_LOGS)
     return db_log
 
 def get_meal_serving_logs(db: Session, skip: int = 0, limit: int = 100,
@@ -286,7 +442,7 @@ def get_total_prepared_portions_for_month(db: Session, year: int, month: int, me
     return total_portions if total_portions is not None else 0
 
 def get_ingredient_consumption_for_period(db: Session, product_id: int, start_date: datetime.datetime, end_date: datetime.datetime) -> float:
-    total_consumed = 0.0
+    total_consumed = 0 # Milli-birliklarda (aniq yig'indi)
     # Har bir berilgan ovqat uchun logni va uning retseptini olamiz
     logs_with_recipes = db.query(database.MealServingLog, database.MealIngredient).\
         join(database.Meal, database.MealServingLog.meal_id == database.Meal.id).\
@@ -298,9 +454,9 @@ def get_ingredient_consumption_for_period(db: Session, product_id: int, start_da
     
     for serving_log, ingredient_recipe in logs_with_recipes:
         # Har bir berishda qancha porsiya berilganini hisobga olamiz
-        total_consumed += (ingredient_recipe.required_grams * serving_log.portions_served)
+        total_consumed += units.to_milli(ingredient_recipe.required_grams) * serving_log.portions_served
         
-    return total_consumed
+    return units.from_milli(total_consumed)
 def create_audit_log(db: Session, log_entry: schemas.AuditLogCreate) -> database.AuditLog:
     try:
         db_log = database.AuditLog(
@@ -317,7 +473,7 @@ def create_audit_log(db: Session, log_entry: schemas.AuditLogCreate) -> database
         db.refresh(db_log)
         return db_log
     except Exception as e:
-        print(f"CRUD_AUDIT_LOG: Error creating ultra-simplified audit log: {e}")
+        logger.error("Audit logni bazaga yozib bo'lmadi: %s", e)
         db.rollback()
         raise
 
@@ -387,21 +543,18 @@ def get_meal_name_for_log(db: Session, meal_id: int) -> Optional[str]:
     stmt = select(database.Meal.name).filter_by(id=meal_id)
     return db.execute(stmt).scalar_one_or_none()
 
-def delete_old_audit_logs(db: Session, days_to_keep: int = 30) -> int:
+def delete_rows_older_than(db: Session, model, timestamp_column, cutoff_date: datetime.datetime, chunk_size: int) -> int:
     """
-    Belgilangan 'days_to_keep' dan eski bo'lgan audit loglarini o'chiradi.
-    O'chirilgan yozuvlar sonini qaytaradi.
+    'cutoff_date' dan eski bo'lgan yozuvlardan eng ko'pi bilan 'chunk_size' tasini
+    bitta tranzaksiyada o'chiradi. O'chirilgan yozuvlar sonini qaytaradi.
+    Xatolik bo'lsa, rollback qilib xatolikni qayta ko'taradi.
     """
-    if days_to_keep <= 0:
-        return 0
-    
-
-    cutoff_date = datetime.datetime.utcnow() - datetime.timedelta(days=days_to_keep)
-    
+    pk_column = inspect(model).primary_key[0]  # Odatda id, change_log uchun seq
+    ids_subquery = select(pk_column).where(timestamp_column < cutoff_date).order_by(pk_column).limit(chunk_size)
     try:
-        num_deleted_rows = db.query(database.AuditLog).filter(database.AuditLog.timestamp < cutoff_date).delete(synchronize_session=False)
+        result = db.execute(delete(model).where(pk_column.in_(ids_subquery)).execution_options(synchronize_session=False))
         db.commit()
-        return num_deleted_rows
-    except Exception as e:
+        return result.rowcount or 0
+    except Exception:
         db.rollback()
-        return 0
\ No newline at end of file
+        raise
@@ -1,60 +1,398 @@
-from sqlalchemy import Text, create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLAlchemyEnum, Boolean
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import event, func, select, literal, text, type_coerce, Text, Date, Index, UniqueConstraint, create_engine, Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Enum as SQLAlchemyEnum, Boolean, TypeDecorator
+from sqlalchemy.orm import Session, sessionmaker, relationship, with_loader_criteria
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+import contextlib
+import contextvars
 import datetime
 import enum
+import logging
+import os
+import random
+import threading
+import time
+import metrics
+import units
 
-DATABASE_URL = "sqlite:///./bogcha_app.db" 
+# Benchmark va sinov bazalari uchun BOGCHA_DATABASE_URL orqali almashtirish mumkin
+DATABASE_URL = os.getenv("BOGCHA_DATABASE_URL", "sqlite:///./bogcha_app.db")
+# Har bir bog'cha (tenant) uchun alohida baza: URL'dagi {tenant} o'rniga tenant id qo'yiladi, masalan
+# sqlite:///./tenants/bogcha_{tenant}.db. Berilmasa, barcha tenantlar DATABASE_URL bazasida tenant_id bilan ajratiladi.
+# Ikkala holatda ham tenantlar ro'yxati (tenants jadvali) DATABASE_URL bazasida saqlanadi.
+TENANT_DATABASE_URL = os.getenv("BOGCHA_TENANT_DATABASE_URL") or None
+# Bir vaqtda ochiq turadigan tenant engine'lari (har birida o'z ulanishlar pool'i) soni
+MAX_OPEN_TENANT_ENGINES = int(os.getenv("BOGCHA_MAX_TENANT_ENGINES", "64"))
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} 
-)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """Pool'dan ulanish olishni kutish vaqtini metrikaga yozadi."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+logger = logging.getLogger(__name__)
+
+# --- SQL so'rovlar instrumentatsiyasi ---
+# BOGCHA_DEBUG yoqilgan bo'lsa, javoblarga X-DB-Queries / X-DB-Time sarlavhalari qo'shiladi.
+DEBUG = os.getenv("BOGCHA_DEBUG", "").lower() in ("1", "true", "yes")
+# Shundan uzoq bajarilgan so'rovlar sekin so'rovlar jurnaliga yoziladi (0 - o'chirilgan)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("BOGCHA_SLOW_QUERY_MS", "200"))
+# Sekin SELECT'larning qanchasi uchun EXPLAIN rejasi olinadi (0..1, 0 - hech qachon)
+EXPLAIN_SAMPLE_RATE = float(os.getenv("BOGCHA_EXPLAIN_SAMPLE_RATE", "0"))
+MAX_SLOW_QUERIES = 200
+MAX_LOGGED_PARAMETERS_LENGTH = 500
+
+
+class QueryStats:
+    """Bitta so'rov (HTTP request yoki fon vazifasi) davomidagi SQL statistikasi."""
+
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.count = 0
+        self.seconds = 0.0
+        self.timeline: Optional[list] = None  # Profiler yoqqanda: [(boshlanish, davomiylik, so'rov matni)]
+
+
+# Middleware har bir so'rov uchun yangi QueryStats o'rnatadi. Sinxron endpoint'lar threadpool'da
+# kontekst nusxasi bilan ishlaydi, lekin nusxa ham shu obyektga ishora qiladi.
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+_slow_queries: Deque[dict] = deque(maxlen=MAX_SLOW_QUERIES)
+_slow_queries_lock = threading.Lock()
+
+
+def start_query_stats(route: Optional[str] = None):
+    """Joriy kontekst uchun hisoblagichni boshlaydi. Qaytgan token stop_query_stats() ga beriladi."""
+    stats = QueryStats(route)
+    return stats, _query_stats.set(stats)
+
+
+def stop_query_stats(token) -> None:
+    _query_stats.reset(token)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def get_slow_queries(limit: int = 50) -> List[dict]:
+    """Oxirgi sekin so'rovlar (eng yangisi birinchi)."""
+    with _slow_queries_lock:
+        return list(reversed(_slow_queries))[:limit]
+
+
+def _explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """Alohida kursorda so'rov rejasini oladi; asosiy kursor natijalariga tegmaydi."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" | ".join(str(value) for value in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN bajarilmadi: {type(e).__name__}: {e}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _handle_cursor_error(context):
+    # Xatolik bilan tugagan so'rov uchun after_cursor_execute chaqirilmaydi
+    if context.connection is not None and context.connection.info.get("query_start_times"):
+        context.connection.info["query_start_times"].pop()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_times"].pop()
+    elapsed = time.perf_counter() - started
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        if stats.timeline is not None:
+            stats.timeline.append((started, elapsed, statement))
+    if SLOW_QUERY_THRESHOLD_MS <= 0 or elapsed * 1000.0 < SLOW_QUERY_THRESHOLD_MS:
+        return
+    entry = {
+        "logged_at": datetime.datetime.utcnow(),
+        "duration_ms": round(elapsed * 1000.0, 3),
+        "route": stats.route if stats is not None else None,
+        "statement": statement,
+        "parameters": repr(parameters)[:MAX_LOGGED_PARAMETERS_LENGTH],
+        "executemany": executemany,
+        "plan": None,
+    }
+    if (not executemany and EXPLAIN_SAMPLE_RATE > 0 and statement.lstrip()[:6].upper() == "SELECT"
+            and random.random() < EXPLAIN_SAMPLE_RATE):
+        entry["plan"] = _explain(conn, statement, parameters)
+    with _slow_queries_lock:
+        _slow_queries.append(entry)
+    logger.warning(
+        "Sekin SQL so'rov: %sms %s", entry["duration_ms"], statement[:200],
+        extra={"duration_ms": entry["duration_ms"], "route": entry["route"], "parameters": entry["parameters"]},
+    )
+
+
+def create_database_engine(url: str) -> Engine:
+    """SQL instrumentatsiyasi va (fayl bazalar uchun) o'lchanadigan pool bilan engine yaratadi."""
+    # Xotiradagi SQLite bitta ulanishli pool talab qiladi, unda kutish bo'lmaydi
+    pool_kwargs = {} if make_url(url).database in (None, "", ":memory:") else {"poolclass": InstrumentedQueuePool}
+    new_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_kwargs)
+    event.listen(new_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(new_engine, "handle_error", _handle_cursor_error)
+    event.listen(new_engine, "after_cursor_execute", _after_cursor_execute)
+    return new_engine
+
+
+engine = create_database_engine(DATABASE_URL)
+if isinstance(engine.pool, QueuePool):
+    metrics.DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# --- Tenantlar (bog'chalar) ---
+DEFAULT_TENANT_ID = 1
+
+# So'rovning tenant'i (TenantMiddleware o'rnatadi). None - tizim konteksti (fon vazifalari, migratsiyalar):
+# ORM so'rovlari cheklanmaydi, yangi yozuvlar standart tenant'ga tushadi.
+_tenant_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("tenant_id", default=None)
+
+
+def current_tenant_id() -> int:
+    tenant_id = _tenant_id.get()
+    return DEFAULT_TENANT_ID if tenant_id is None else tenant_id
+
+
+def set_tenant(tenant_id: Optional[int]):
+    return _tenant_id.set(tenant_id)
+
+
+def reset_tenant(token) -> None:
+    _tenant_id.reset(token)
+
+
+@contextlib.contextmanager
+def tenant_scope(tenant_id: Optional[int]):
+    """Fon vazifalari va skriptlar uchun: blok ichidagi ORM so'rovlari shu tenant bilan cheklanadi."""
+    token = _tenant_id.set(tenant_id)
+    try:
+        yield
+    finally:
+        _tenant_id.reset(token)
+
+
+class TenantScoped:
+    """
+    Bog'chaga tegishli jadvallar uchun mixin. Shu modellarga ORM so'rovlari (SELECT, UPDATE, DELETE)
+    _scope_to_tenant tomonidan joriy tenant bilan avtomatik cheklanadi; yangi yozuvlarga joriy tenant yoziladi.
+    Indekslar tenant_id bilan boshlanadi, shuning uchun bitta bog'cha so'rovi boshqalarini skanerlamaydi.
+    """
+    tenant_id = Column(Integer, nullable=False, default=current_tenant_id)
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _scope_to_tenant(execute_state) -> None:
+    tenant_id = _tenant_id.get()
+    if tenant_id is None or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.execution_options.get("all_tenants"):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+    )
+
+
+def tenant_database_url(tenant_id: int) -> Optional[str]:
+    """
+    Bog'chaning alohida bazasi URL'i. Umumiy baza rejimida va standart bog'cha uchun None:
+    standart bog'cha ma'lumotlari doim umumiy bazada qoladi (mavjud deploy'lar ko'chirilmaydi).
+    """
+    if TENANT_DATABASE_URL is None or tenant_id == DEFAULT_TENANT_ID:
+        return None
+    return TENANT_DATABASE_URL.replace("{tenant}", str(tenant_id))
+
+
+_tenant_engines: "OrderedDict[int, Engine]" = OrderedDict()
+_tenant_engines_lock = threading.Lock()
+
+
+def get_engine(tenant_id: Optional[int] = None) -> Engine:
+    """
+    Tenant ma'lumotlari joylashgan engine. TENANT_DATABASE_URL berilmagan bo'lsa - umumiy engine.
+    Aks holda tenant engine'i birinchi murojaatda yaratiladi (kerak bo'lsa sxemasi migratsiya qilinadi)
+    va LRU bo'yicha eng ko'pi MAX_OPEN_TENANT_ENGINES tasi ochiq saqlanadi.
+    """
+    tenant_id = current_tenant_id() if tenant_id is None else tenant_id
+    if tenant_database_url(tenant_id or DEFAULT_TENANT_ID) is None:
+        return engine
+    with _tenant_engines_lock:
+        tenant_engine = _tenant_engines.get(tenant_id)
+        if tenant_engine is not None:
+            _tenant_engines.move_to_end(tenant_id)
+            return tenant_engine
+
+    import migrations  # migrations database'ni import qiladi
+    tenant_engine = create_database_engine(tenant_database_url(tenant_id))
+    migrations.check_schema(tenant_engine, tenant_database=True)
+    evicted = []
+    with _tenant_engines_lock:
+        existing = _tenant_engines.get(tenant_id)
+        if existing is not None:
+            evicted.append(tenant_engine)  # Boshqa thread ulgurdi
+            tenant_engine = existing
+        else:
+            _tenant_engines[tenant_id] = tenant_engine
+            while len(_tenant_engines) > MAX_OPEN_TENANT_ENGINES:
+                evicted.append(_tenant_engines.popitem(last=False)[1])
+    for old_engine in evicted:
+        old_engine.dispose()  # Band ulanishlar qaytarilganda yopiladi
+    return tenant_engine
+
+
+def open_tenant_engines() -> Dict[Optional[int], Engine]:
+    """Umumiy engine (kalit None) va hozir ochiq alohida tenant engine'lari."""
+    with _tenant_engines_lock:
+        return {None: engine, **_tenant_engines}
+
+
+def new_session(tenant_id: Optional[int] = None) -> Session:
+    return SessionLocal(bind=get_engine(tenant_id))
+
 Base = declarative_base()
 
+
+class MilliUnits(TypeDecorator):
+    """
+    Miqdor ustuni: bazada butun son (asosiy birlikning mingdan biri, g uchun mg), Python va API'da
+    asosiy birlikdagi float. Har bir yozishda butunga yaxlitlanadi, shuning uchun qoldiq float
+    xatoliklarini to'plamaydi, SUM esa aniq. Ustunni to'g'ridan-to'g'ri ko'paytirish (masalan,
+    required_grams * portions_served) natijasi oddiy butun son bo'ladi - type_coerce(..., MilliUnits) kerak.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else units.to_milli(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else units.from_milli(value)
+
+
+def milli_add(column, amount: int):
+    """
+    MilliUnits ustuniga 'amount' (milli-birlik) qo'shadigan SQL ifodasi. ORM atributiga berilsa,
+    UPDATE bazada butun sonlarda bajariladi (float orqali qayta yaxlitlanmaydi) va atribut flush'dan
+    keyin eskirgan deb belgilanadi - keyingi o'qishda bazadan olinadi.
+    """
+    return type_coerce(column, BigInteger) + type_coerce(amount, BigInteger)
+
+
 # Foydalanuvchi rollari uchun Enum
 class UserRole(str, enum.Enum):
     admin = "admin"
     chef = "chef"
     manager = "manager"
 
-class User(Base):
+# O'zgarishlar jurnali (change_log) amallari
+class ChangeOp(str, enum.Enum):
+    upsert = "upsert"
+    delete = "delete"
+
+class Tenant(Base):
+    """Bog'cha. Ro'yxat doim umumiy bazada (DATABASE_URL) saqlanadi."""
+    __tablename__ = "tenants"
+
+    id = Column(Integer, primary_key=True)
+    slug = Column(String, unique=True, nullable=False)  # X-Tenant sarlavhasida ishlatiladi
+    name = Column(String, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class User(TenantScoped, Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_tenant_username", "tenant_id", "username", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True, nullable=False)
+    username = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
     role = Column(SQLAlchemyEnum(UserRole), nullable=False)
     is_active = Column(Boolean, default=True)
+    is_platform = Column(Boolean, nullable=False, default=False) # Barcha bog'chalar bo'yicha huquq: admin - bog'chalarni boshqaradi, menejer - mintaqaviy hisobot
 
     served_meals = relationship("MealServingLog", back_populates="served_by")
 
-class Product(Base):
+class Product(TenantScoped, Base):
     __tablename__ = "products"
+    __table_args__ = (Index("ix_products_tenant_name", "tenant_id", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True, nullable=False)
-    quantity_grams = Column(Float, nullable=False, default=0.0)
+    name = Column(String, nullable=False)
+    quantity_grams = Column(MilliUnits, nullable=False, default=0.0, index=True)
+    min_stock_grams = Column(MilliUnits, nullable=True) # Kam qolganlik chegarasi (None bo'lsa standart chegara ishlatiladi)
     delivery_date = Column(DateTime, default=datetime.datetime.utcnow)
+    unit = Column(String, nullable=False, default="g") # Asosiy birlik (units.py): g, ml yoki dona; *_grams miqdorlari shu birlikda
 
     meal_ingredients = relationship("MealIngredient", back_populates="product")
     deliveries = relationship("ProductDelivery", back_populates="product", cascade="all, delete-orphan")
+    unit_conversions = relationship("ProductUnitConversion", back_populates="product", cascade="all, delete-orphan")
+
+
+class ProductUnitConversion(TenantScoped, Base):
+    """Mahsulotning qo'shimcha birligi: 1 'unit' = base_units_per_unit asosiy birlik (masalan, 1 quti = 30 dona)."""
+    __tablename__ = "product_unit_conversions"
+    __table_args__ = (UniqueConstraint("product_id", "unit", name="uq_product_unit_conversions_product_unit"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    unit = Column(String, nullable=False)
+    base_units_per_unit = Column(Float, nullable=False)
+
+    product = relationship("Product", back_populates="unit_conversions")
 
 
-class ProductDelivery(Base):
+class ProductDelivery(TenantScoped, Base):
+    """Kirim. Har bir kirim alohida lot: ovqat berishda mahsulot avval muddati yaqin lotlardan olinadi (costing.py, FEFO)."""
     __tablename__ = "product_deliveries"
+    __table_args__ = (
+        Index("ix_product_deliveries_tenant_date", "tenant_id", "delivery_date"),
+        # Faqat ochiq lotlar: navbatdagi lotni topish yopilgan kirimlar tarixiga bog'liq emas
+        Index(
+            "ix_product_deliveries_open_lots", "product_id", "delivery_date", "id",
+            sqlite_where=text("remaining_grams > 0"), postgresql_where=text("remaining_grams > 0"),
+        ),
+        # /alerts/expiring: faqat muddati ko'rsatilgan ochiq lotlar
+        Index(
+            "ix_product_deliveries_expiring", "tenant_id", "expiry_date",
+            sqlite_where=text("remaining_grams > 0 AND expiry_date IS NOT NULL"),
+            postgresql_where=text("remaining_grams > 0 AND expiry_date IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
-    quantity_received = Column(Float, nullable=False) # Qabul qilingan miqdor
+    quantity_received = Column(MilliUnits, nullable=False) # Qabul qilingan miqdor
     delivery_date = Column(DateTime, default=datetime.datetime.utcnow) # Yetkazib berilgan sana
     supplier = Column(String, nullable=True) # Yetkazib beruvchi (ixtiyoriy)
+    unit_price = Column(Float, nullable=True) # 1000 asosiy birlik (1 kg, 1 l yoki 1000 dona) narxi; None - narx kiritilmagan
+    remaining_grams = Column(MilliUnits, nullable=False, default=0.0) # Lotning hali sarflanmagan qismi
+    expiry_date = Column(Date, nullable=True) # Yaroqlilik muddati (shu kun ham yaroqli); None - cheklanmagan
     # Masalan, hisob-faktura raqami yoki boshqa ma'lumotlar uchun maydon qo'shish mumkin
 
     product = relationship("Product", back_populates="deliveries")
-class AuditLog(Base):
+class AuditLog(TenantScoped, Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (Index("ix_audit_logs_tenant_timestamp", "tenant_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
@@ -66,49 +404,196 @@ class AuditLog(Base):
     user_agent = Column(String, nullable=True)
     details = Column(Text, nullable=False)
 
-class Meal(Base):
+class Meal(TenantScoped, Base):
     __tablename__ = "meals"
+    __table_args__ = (Index("ix_meals_tenant_name", "tenant_id", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
 
     ingredients = relationship("MealIngredient", back_populates="meal", cascade="all, delete-orphan")
     serving_logs = relationship("MealServingLog", back_populates="meal")
 
 
-class MealIngredient(Base):
+class MealIngredient(TenantScoped, Base):
     __tablename__ = "meal_ingredients"
+    __table_args__ = (Index("ix_meal_ingredients_tenant_meal", "tenant_id", "meal_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
-    required_grams = Column(Float, nullable=False) # Bir porsiya uchun kerakli miqdor
+    required_grams = Column(MilliUnits, nullable=False) # Bir porsiya uchun kerakli miqdor
 
     meal = relationship("Meal", back_populates="ingredients")
     product = relationship("Product", back_populates="meal_ingredients")
 
 
-class MealServingLog(Base):
+class MealServingLog(TenantScoped, Base):
     __tablename__ = "meal_serving_logs"
+    __table_args__ = (
+        Index("ix_meal_serving_logs_tenant_time", "tenant_id", "serving_time"),
+        # Kunlik sarfga hali qo'shilmagan loglar (forecast.refresh_daily_rollups); qayta ishlanganlari indeksdan chiqadi
+        Index(
+            "ix_meal_serving_logs_pending_rollup", "tenant_id", "id",
+            sqlite_where=text("consumption_rolled_up = 0"), postgresql_where=text("NOT consumption_rolled_up"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False)
     served_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     serving_time = Column(DateTime, default=datetime.datetime.utcnow)
     portions_served = Column(Integer, nullable=False, default=1) # YANGI USTUN: Berilgan porsiyalar soni
+    consumption_rolled_up = Column(Boolean, nullable=False, default=False) # Sarfi DailyProductConsumption'ga qo'shilganmi
 
     meal = relationship("Meal", back_populates="serving_logs")
     served_by = relationship("User", back_populates="served_meals")
 
 
-def create_db_and_tables():
-    print("DATABASE.PY: `create_db_and_tables` chaqirildi. Jadvallar yaratilmoqda (agar mavjud bo'lmasa)...")
-    Base.metadata.create_all(bind=engine)
-    print("DATABASE.PY: Jadvallarni yaratish jarayoni tugadi.")
+class LotAllocation(TenantScoped, Base):
+    """Ovqat berishda mahsulot qaysi lotdan qancha olingani va uning tannarxi. Xarajat hisobotlari shu jadvaldan."""
+    __tablename__ = "lot_allocations"
+    __table_args__ = (Index("ix_lot_allocations_tenant_served_at", "tenant_id", "served_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    serving_log_id = Column(Integer, ForeignKey("meal_serving_logs.id", ondelete="CASCADE"), nullable=False, index=True)
+    delivery_id = Column(Integer, ForeignKey("product_deliveries.id", ondelete="SET NULL"), nullable=True, index=True) # None - lotga tegishli bo'lmagan qoldiqdan
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False) # Hisobotlar uchun takrorlangan (log'dan)
+    served_at = Column(DateTime, nullable=False) # Hisobotlar uchun takrorlangan (log'dan)
+    allocated_grams = Column(MilliUnits, nullable=False)
+    cost = Column(Float, nullable=True) # None - lot narxi noma'lum
+
+
+class DailyProductConsumption(TenantScoped, Base):
+    """Kunlik mahsulot sarfi (ovqat berishda yozilgan LotAllocation'lardan yig'ilgan). Prognoz shu jadvaldan hisoblanadi."""
+    __tablename__ = "daily_product_consumption"
+    __table_args__ = (
+        UniqueConstraint("product_id", "day", name="uq_daily_product_consumption_product_day"),
+        Index("ix_daily_product_consumption_tenant_day", "tenant_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    consumed_grams = Column(MilliUnits, nullable=False, default=0.0)
+
+
+class RollupState(Base):
+    """
+    Inkremental yig'ish jarayonlari qayergacha yetib kelganini saqlaydi (oxirgi qayta ishlangan log ID).
+    Kunlik sarf endi MealServingLog.consumption_rolled_up bayrog'i bilan yig'iladi; jadval 9-migratsiya uchun qoldirilgan.
+    """
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_processed_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """Idempotency-Key sarlavhasi bilan kelgan yozish so'rovlarining saqlangan javoblari."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    request_fingerprint = Column(String, nullable=False) # So'rov tanasining xeshi
+    status_code = Column(Integer, nullable=True) # None - so'rov hali bajarilmoqda
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ChangeLog(TenantScoped, Base):
+    """
+    Yozish amallari jurnali: crud har bir yaratish/yangilash/o'chirishda shu tranzaksiya ichida bitta qator qo'shadi.
+    seq monoton o'sadi (AUTOINCREMENT - o'chirilgan qatorlarning raqami qayta ishlatilmaydi), /changes?since=<seq> shu bo'yicha ishlaydi.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (Index("ix_change_log_tenant_seq", "tenant_id", "seq"), {"sqlite_autoincrement": True})
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False) # http_cache obyekt turlari: "products", "deliveries", "meals", "users"
+    entity_id = Column(Integer, nullable=False)
+    op = Column(SQLAlchemyEnum(ChangeOp), nullable=False)
+    changed_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)
+
+
+class SchedulerLease(Base):
+    """
+    Rejalashtirilgan vazifalar uchun yetakchilik ijarasi (lease): bir nechta worker ishlaganda
+    faqat ijarani ushlab turgan worker vazifalarni bajaradi (leadership.py).
+    """
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # "<host>:<pid>:<tasodifiy>" - worker identifikatori
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+# Sxemani yaratish va o'zgartirish migrations.py da (schema_version bilan)
+
+def seed_change_log(bind=None):
+    """
+    change_log yangi yaratilganda mavjud yozuvlar uchun 'upsert' qatorlarini qo'shadi, shunda since=0 to'liq holatni beradi.
+    bind - Engine (o'z tranzaksiyasi ochiladi) yoki tranzaksiya ichidagi Connection.
+    """
+    if isinstance(bind, Connection):
+        _insert_change_log_seed(bind)
+        return
+    with (bind or engine).begin() as conn:
+        _insert_change_log_seed(conn)
+
+def _insert_change_log_seed(conn) -> None:
+    now = datetime.datetime.utcnow()
+    for entity, table in (("products", Product.__table__), ("deliveries", ProductDelivery.__table__),
+                          ("meals", Meal.__table__), ("users", User.__table__)):
+        conn.execute(
+            ChangeLog.__table__.insert().from_select(
+                ["entity", "entity_id", "op", "changed_at", "tenant_id"],
+                select(
+                    literal(entity), table.c.id, literal(ChangeOp.upsert.name), literal(now, DateTime),
+                    func.coalesce(table.c.tenant_id, DEFAULT_TENANT_ID),
+                ).order_by(table.c.id),
+            )
+        )
 
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+def begin_write_transaction(db) -> None:
+    """
+    SQLite'da sessiya uchun yozish tranzaksiyasini darhol (BEGIN IMMEDIATE) ochadi.
+    pysqlite tranzaksiyani faqat birinchi DML'da boshlaydi, shuning uchun undan oldin ochilgan
+    SAVEPOINT (db.begin_nested()) tashqi tranzaksiyasiz qoladi va uning RELEASE'i darhol commit bo'ladi.
+    Sessiyada hali yozish bo'lmagan paytda chaqirilishi kerak. Boshqa bazalarda hech narsa qilmaydi.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+# change_log'ga yozuvchi tranzaksiyalarni ketma-ket qiladigan advisory lock kaliti (PostgreSQL)
+CHANGE_LOG_LOCK_KEY = 0x626F6763
+
+def lock_change_log(db) -> None:
+    """
+    change_log seq tartibi commit tartibiga mos kelishi uchun: PostgreSQL'da tranzaksiya oxirigacha
+    (commit/rollback) ushlanadigan advisory lock oladi. Aks holda kichikroq seq olgan tranzaksiya kattaroq
+    seq'dan keyin commit qilinishi va o'quvchilar (changes, sync, cache_sync) uni o'tkazib yuborishi mumkin.
+    Lock seq qiymati olinishidan (INSERT) oldin olinadi; bir tranzaksiyada bir marta. SQLite'da yozishlar
+    baribir ketma-ket - hech narsa qilmaydi.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    transaction = db.get_transaction()
+    if transaction is not None and db.info.get("change_log_locked") is transaction:
+        return
+    db.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_KEY)))
+    db.info["change_log_locked"] = db.get_transaction()
@@ -0,0 +1,88 @@
+"""
+Jarayon ichidagi oddiy pub/sub: qoldiq o'zgarishlari, ovqat berish loglari va
+kam qolganlik holati o'zgarishlarini /events/stream (SSE) mijozlariga tarqatadi.
+
+Hodisa bir marta SSE formatiga o'giriladi va barcha obunachilarga shu tayyor
+satr yuboriladi. Har bir obunachining navbati cheklangan: sekin mijoz navbatni
+to'ldirib qo'ysa, eng eski hodisalar tashlab yuboriladi (boshqalarni sekinlashtirmaydi).
+publish() istalgan thread'dan (masalan, sync endpoint'lar ishlaydigan threadpool'dan) chaqirilishi mumkin.
+Hodisa faqat joriy bog'cha (tenant) obunachilariga yuboriladi.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from typing import Any, Dict, Optional, Set
+
+import database
+
+DEFAULT_SUBSCRIBER_BUFFER = 100
+
+_event_ids = itertools.count(1)
+_subscribers: Set["Subscriber"] = set()
+_subscribers_lock = threading.Lock()
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int, tenant_id: int):
+        self.loop = loop
+        self.tenant_id = tenant_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def _offer(self, message: str) -> None:
+        # Faqat obunachining event loop'ida chaqiriladi
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def next_message(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def subscribe(buffer_size: int = DEFAULT_SUBSCRIBER_BUFFER) -> Subscriber:
+    """Joriy event loop uchun yangi obunachi yaratadi (async kontekstda chaqirilishi kerak)."""
+    subscriber = Subscriber(asyncio.get_running_loop(), buffer_size, database.current_tenant_id())
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber: Subscriber) -> None:
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+
+def subscriber_count() -> int:
+    return len(_subscribers)
+
+
+def format_sse(event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def publish(event_type: str, data: Dict[str, Any]) -> None:
+    """Hodisani joriy tenant obunachilariga yuboradi. Obunachi bo'lmasa, hech narsa qilmaydi."""
+    if not _subscribers:
+        return
+    tenant_id = database.current_tenant_id()
+    with _subscribers_lock:
+        subscribers = [subscriber for subscriber in _subscribers if subscriber.tenant_id == tenant_id]
+    if not subscribers:
+        return
+    message = format_sse(event_type, data, event_id=next(_event_ids))
+    for subscriber in subscribers:
+        try:
+            subscriber.loop.call_soon_threadsafe(subscriber._offer, message)
+        except RuntimeError:
+            # Obunachining event loop'i yopilgan
+            unsubscribe(subscriber)
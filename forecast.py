@@ -0,0 +1,223 @@
+"""
+Mahsulot sarfini prognoz qilish va qayta buyurtma nuqtasini hisoblash.
+
+Sarf ovqat berish paytida yozilgan LotAllocation'lardan kunlik yig'indilar
+(DailyProductConsumption) ko'rinishida inkremental yig'iladi: faqat hali yig'ilmagan
+loglar (MealServingLog.consumption_rolled_up = false, qisman indeks bo'yicha) o'qiladi,
+shuning uchun yillar davomidagi tarix qayta o'qilmaydi. Retsept keyinroq o'zgartirilsa
+ham o'tgan kunlar sarfi o'zgarmaydi, kechikib commit qilingan loglar ham tushib qolmaydi.
+Yig'ish faqat yetakchi worker'dagi scheduler vazifasida (refresh_all_daily_rollups) bajariladi;
+hisobotlar bazaga yozmaydi - hali yig'ilmagan loglar sarfi o'qishda xotirada qo'shiladi
+(daily_consumption).
+Prognozning o'zi oxirgi 'window_days' kunlik matritsa ustida NumPy bilan
+vektorlashtirilgan holda hisoblanadi.
+"""
+import datetime
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, func, select, type_coerce, union_all, update
+from sqlalchemy.orm import Session
+
+import database, schemas, tenancy, units
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = 5000  # Bitta tranzaksiyada yig'iladigan loglar soni
+ROLLUP_INTERVAL_SECONDS = 300  # Scheduler vazifasi oralig'i; yig'ilmagan loglar hisobotlarda baribir ko'rinadi
+
+
+def _as_date(value) -> datetime.date:
+    # SQLite'da func.date() satr qaytaradi, PostgreSQL'da esa date
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def _add_increments(db: Session, increments: Dict[tuple, int]) -> None:
+    product_ids = {product_id for product_id, _ in increments}
+    days = {day for _, day in increments}
+    existing = {
+        (row.product_id, row.day): row
+        for row in db.query(database.DailyProductConsumption).filter(
+            database.DailyProductConsumption.product_id.in_(product_ids),
+            database.DailyProductConsumption.day.in_(days),
+        )
+    }
+    for key, consumed in increments.items():
+        row = existing.get(key)
+        # Milli-birliklar bazaga to'g'ridan-to'g'ri yoziladi (float orqali o'tmaydi)
+        if row is not None:
+            row.consumed_grams = database.milli_add(database.DailyProductConsumption.consumed_grams, consumed)
+        else:
+            db.add(database.DailyProductConsumption(product_id=key[0], day=key[1], consumed_grams=type_coerce(consumed, BigInteger)))
+
+
+def refresh_daily_rollups(db: Session) -> int:
+    """
+    Hali yig'ilmagan ovqat berish loglarining sarfini (LotAllocation) kunlik sarf jadvaliga qo'shadi.
+    Qayta ishlangan (mahsulot, kun) juftliklari sonini qaytaradi.
+    Loglar bo'laklab olinadi va bayroq shu tranzaksiyada qo'yiladi: bir nechta jarayon bir vaqtda
+    chaqirsa, bayroqni birinchi qo'ygani yig'adi, qolganlari rollback qiladi (ikki marta qo'shilmaydi).
+    """
+    processed = 0
+    while True:
+        log_ids = [
+            log_id for (log_id,) in db.query(database.MealServingLog.id)
+            .filter(database.MealServingLog.consumption_rolled_up == False)  # Qisman indeks sharti bilan bir xil (= 0)
+            .order_by(database.MealServingLog.id)
+            .limit(ROLLUP_BATCH_SIZE)
+        ]
+        if not log_ids:
+            return processed
+
+        day_column = func.date(database.LotAllocation.served_at)
+        rows = db.query(
+            day_column,
+            database.LotAllocation.product_id,
+            # Xom milli-birliklarda (butun sonlar) yig'iladi - natija aniq
+            func.sum(type_coerce(database.LotAllocation.allocated_grams, BigInteger)),
+        ).filter(
+            database.LotAllocation.serving_log_id.in_(log_ids),
+        ).group_by(day_column, database.LotAllocation.product_id).all()
+
+        increments: Dict[tuple, int] = {}  # Milli-birliklarda
+        for day_value, product_id, consumed in rows:
+            key = (product_id, _as_date(day_value))
+            increments[key] = increments.get(key, 0) + int(consumed or 0)
+
+        try:
+            claimed = db.execute(
+                update(database.MealServingLog)
+                .where(database.MealServingLog.id.in_(log_ids), database.MealServingLog.consumption_rolled_up == False)
+                .values(consumption_rolled_up=True)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed != len(log_ids):
+                db.rollback()  # Boshqa jarayon shu loglarning bir qismini allaqachon yig'di
+                return processed
+            if increments:
+                _add_increments(db, increments)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        processed += len(increments)
+        if len(log_ids) < ROLLUP_BATCH_SIZE:
+            return processed
+
+
+def refresh_all_daily_rollups() -> int:
+    """Barcha bog'chalar uchun refresh_daily_rollups (scheduler vazifasi, worker thread'da)."""
+    processed = 0
+    # Umumiy bazada ham har bir bog'cha alohida: yangi kunlik qatorlar joriy tenant_id bilan yoziladi
+    for tenant_id in tenancy.all_tenant_ids():
+        with database.tenant_scope(tenant_id):
+            db = database.new_session()
+            try:
+                processed += refresh_daily_rollups(db)
+            except Exception:
+                logger.exception("Bog'cha (ID: %s) kunlik sarfini yig'ishda xatolik", tenant_id)
+            finally:
+                db.close()
+    return processed
+
+
+def daily_consumption(db: Session, start_day: datetime.date, end_day: datetime.date) -> List[Tuple[int, datetime.date, int]]:
+    """
+    [start_day, end_day] kunlaridagi sarf: (product_id, kun, milli-birlik) qatorlari. Kunlik yig'indilarga
+    hali yig'ilmagan loglarning LotAllocation'lari qo'shiladi (bazaga yozilmaydi). Ikkala qism bitta
+    so'rovda o'qiladi, shuning uchun bir vaqtda ishlayotgan yig'ish vazifasi sarfni ikki marta sanatmaydi.
+    Bir (mahsulot, kun) uchun bir nechta qator bo'lishi mumkin - chaqiruvchi qo'shadi.
+    """
+    consumption = database.DailyProductConsumption
+    allocation = database.LotAllocation
+    rolled_up = select(
+        consumption.product_id, consumption.day, type_coerce(consumption.consumed_grams, BigInteger),
+    ).where(consumption.day >= start_day, consumption.day <= end_day)
+    day_column = func.date(allocation.served_at)
+    pending = select(
+        allocation.product_id, day_column, func.sum(type_coerce(allocation.allocated_grams, BigInteger)),
+    ).join(
+        database.MealServingLog, database.MealServingLog.id == allocation.serving_log_id,
+    ).where(
+        database.MealServingLog.consumption_rolled_up == False,  # Qisman indeks sharti bilan bir xil (= 0)
+        allocation.served_at >= datetime.datetime.combine(start_day, datetime.time.min),
+        allocation.served_at < datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time.min),
+    ).group_by(day_column, allocation.product_id)
+    return [
+        (product_id, _as_date(day), int(consumed or 0))
+        for product_id, day, consumed in db.execute(union_all(rolled_up, pending))
+    ]
+
+
+def compute_forecast(
+    db: Session,
+    window_days: int = 28,
+    method: str = "ewma",
+    alpha: float = 0.2,
+    lead_time_days: float = 3.0,
+    cover_days: float = 7.0,
+    safety_factor: float = 1.65,
+    as_of: Optional[datetime.date] = None,
+) -> List[schemas.ProductForecast]:
+    """
+    Har bir mahsulot uchun kunlik sarf tezligi, tugashigacha qolgan kunlar va tavsiya etilgan buyurtma miqdori.
+    Oyna 'as_of' (standart: bugun) dan oldingi to'liq kunlarni qamraydi. Bazaga hech narsa yozmaydi.
+    """
+    end_day = (as_of or datetime.datetime.utcnow().date()) - datetime.timedelta(days=1)
+    start_day = end_day - datetime.timedelta(days=window_days - 1)
+
+    products = db.query(
+        database.Product.id, database.Product.name, database.Product.quantity_grams
+    ).order_by(database.Product.name).all()
+    if not products:
+        return []
+    index_by_product = {product_id: i for i, (product_id, _, _) in enumerate(products)}
+
+    rollups = daily_consumption(db, start_day, end_day)
+
+    # (mahsulot x kun) sarf matritsasi; ma'lumot bo'lmagan kunlar 0
+    usage = np.zeros((len(products), window_days), dtype=np.float64)
+    if rollups:
+        row_idx = np.fromiter((index_by_product.get(r[0], -1) for r in rollups), dtype=np.int64, count=len(rollups))
+        col_idx = np.fromiter(((r[1] - start_day).days for r in rollups), dtype=np.int64, count=len(rollups))
+        values = np.fromiter((units.from_milli(r[2]) for r in rollups), dtype=np.float64, count=len(rollups))
+        valid = row_idx >= 0
+        np.add.at(usage, (row_idx[valid], col_idx[valid]), values[valid])
+
+    if method == "sma":
+        weights = np.ones(window_days)
+    else:
+        # Eksponensial silliqlash: eng yangi kun eng katta vaznga ega
+        weights = alpha * np.power(1.0 - alpha, np.arange(window_days - 1, -1, -1, dtype=np.float64))
+    weights = weights / weights.sum()
+
+    rate = usage @ weights
+    std = np.sqrt(np.maximum((usage - rate[:, None]) ** 2 @ weights, 0.0))
+    stock = np.fromiter((p[2] for p in products), dtype=np.float64, count=len(products))
+
+    safety_stock = safety_factor * std * math.sqrt(max(lead_time_days, 0.0))
+    reorder_point = rate * lead_time_days + safety_stock
+    target_level = rate * (lead_time_days + cover_days) + safety_stock
+    suggested = np.maximum(target_level - stock, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(rate > 0, np.maximum(stock, 0.0) / rate, np.inf)
+
+    result = []
+    for i, (product_id, name, quantity_grams) in enumerate(products):
+        result.append(schemas.ProductForecast(
+            product_id=product_id,
+            product_name=name,
+            current_quantity_grams=quantity_grams,
+            daily_consumption_grams=round(float(rate[i]), 2),
+            days_until_stockout=round(float(days_left[i]), 1) if np.isfinite(days_left[i]) else None,
+            reorder_point_grams=round(float(reorder_point[i]), 2),
+            suggested_reorder_grams=round(float(suggested[i]), 2),
+            needs_reorder=bool(rate[i] > 0 and stock[i] <= reorder_point[i]),
+        ))
+    return result
@@ -0,0 +1,123 @@
+"""
+O'qish endpoint'lari uchun HTTP kesh qatlami.
+
+Har bir bog'cha (tenant) va obyekt turi ("products", "meals", ...) uchun versiya hisoblagichi bor.
+crud'dagi yozish funksiyalari commit'dan keyin bump() ni chaqiradi. Endpoint
+javobining ETag'i (yo'l, parametrlar, tegishli versiyalar) dan hosil qilinadi:
+hech narsa o'zgarmagan bo'lsa, If-None-Match bilan kelgan so'rovga 304 qaytadi.
+Ixtiyoriy server tomonidagi kesh tayyor JSON baytlarini shu kalit bo'yicha
+saqlaydi, shunda takroriy so'rovlar na bazaga, na Pydantic serializatsiyasiga tushadi.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+
+import database
+
+PRODUCTS = "products"
+DELIVERIES = "deliveries"
+MEALS = "meals"
+SERVING_LOGS = "serving_logs"
+USERS = "users"
+
+RESPONSE_CACHE_ENABLED = os.getenv("BOGCHA_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+_boot_id = uuid.uuid4().hex  # Boshqa jarayon yoki qayta ishga tushishdan keyingi versiyalar bilan to'qnashmasligi uchun
+_versions: Dict[Tuple[int, str], int] = {}  # (tenant_id, obyekt turi) -> versiya
+_versions_lock = threading.Lock()
+
+_cache: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_type_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def bump(*entities: str, tenant_id: Optional[int] = None) -> None:
+    """Joriy (yoki berilgan) tenant'ning obyekt turlari versiyasini oshiradi (commit'dan keyin chaqiriladi)."""
+    tenant_id = database.current_tenant_id() if tenant_id is None else tenant_id
+    with _versions_lock:
+        for entity in entities:
+            _versions[(tenant_id, entity)] = _versions.get((tenant_id, entity), 0) + 1
+
+
+def current_versions(entities: Tuple[str, ...], tenant_id: Optional[int] = None) -> Tuple[int, ...]:
+    tenant_id = database.current_tenant_id() if tenant_id is None else tenant_id
+    return tuple(_versions.get((tenant_id, entity), 0) for entity in entities)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def serialize(data: Any, response_type: Any) -> bytes:
+    """Ma'lumotni response_type bo'yicha JSON baytlarga o'giradi (ORM obyektlari ham qabul qilinadi)."""
+    adapter = _type_adapters.get(response_type)
+    if adapter is None:
+        adapter = _type_adapters[response_type] = TypeAdapter(response_type)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def _cache_get(key: tuple):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+        return entry
+
+
+def _cache_put(key: tuple, entry: Tuple[str, bytes]) -> None:
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def clear() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def reset() -> None:
+    """Javob keshini tozalaydi va barcha eski ETag'larni yaroqsiz qiladi."""
+    global _boot_id
+    _boot_id = uuid.uuid4().hex
+    clear()
+
+
+def cached_json_response(
+    request: Request,
+    entities: Tuple[str, ...],
+    response_type: Any,
+    build: Callable[[], Any],
+) -> Response:
+    """
+    'entities' versiyalariga bog'liq bo'lgan GET javobini qaytaradi.
+    build() faqat kesh bo'sh bo'lganda chaqiriladi va response_type bo'yicha serializatsiya qilinadi.
+    """
+    # Versiyalar build() dan OLDIN o'qiladi: agar build paytida yozish bo'lsa, keyingi so'rov yangi kalit oladi
+    tenant_id = database.current_tenant_id()
+    versions = current_versions(entities, tenant_id)
+    key = (tenant_id, request.url.path, tuple(sorted(request.query_params.multi_items())), entities, versions)
+    etag = '"' + hashlib.sha1(f"{_boot_id}:{key!r}".encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    entry = _cache_get(key) if RESPONSE_CACHE_ENABLED else None
+    if entry is None:
+        entry = (etag, serialize(build(), response_type))
+        if RESPONSE_CACHE_ENABLED:
+            _cache_put(key, entry)
+    return Response(content=entry[1], media_type="application/json", headers=headers)
@@ -0,0 +1,161 @@
+"""
+Yozish so'rovlari uchun Idempotency-Key qo'llab-quvvatlash.
+
+Planshetlar beqaror Wi-Fi'da POST /serve/{meal_id} va
+POST /products/{id}/receive_stock so'rovlarini qayta yuboradi. Kalit bilan
+kelgan so'rov birinchi marta bajarilganda javobi idempotency_keys jadvaliga
+(TTL bilan) saqlanadi; xuddi shu kalit bilan qayta kelgan so'rovga saqlangan
+javob qaytariladi va amal qayta bajarilmaydi. Yaqinda ishlatilgan kalitlar
+uchun xotirada kichik LRU kesh bor, shunda takroriy so'rovlar bazaga tushmaydi.
+
+Kalit, amal va saqlangan javob bitta tranzaksiyada commit qilinadi: amal
+commit=False bilan bajariladi, shuning uchun jarayon o'rtada to'xtasa ham
+"bajarilgan, lekin javobi yo'q" kalit qolmaydi. Bir vaqtda kelgan ikki bir xil
+so'rovdan ikkinchisi kalitni yozishda birinchisining commit'ini kutadi
+(unikal indeks) va uning saqlangan javobini oladi.
+"""
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database, http_cache
+
+KEY_TTL = datetime.timedelta(hours=24)
+FRONT_CACHE_MAX_ENTRIES = 2048
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# (tenant_id, user_id, key) -> (expires_at, method, path, fingerprint, status_code, body).
+# Alohida bazalar rejimida user_id bog'chalar orasida takrorlanishi mumkin, shuning uchun tenant ham kalitda.
+_front_cache: "OrderedDict[Tuple[int, int, str], tuple]" = OrderedDict()
+_front_cache_lock = threading.Lock()
+
+
+def request_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _remember(user_id: int, key: str, entry: tuple) -> None:
+    cache_key = (database.current_tenant_id(), user_id, key)
+    with _front_cache_lock:
+        _front_cache[cache_key] = entry
+        _front_cache.move_to_end(cache_key)
+        while len(_front_cache) > FRONT_CACHE_MAX_ENTRIES:
+            _front_cache.popitem(last=False)
+
+
+def _recall(user_id: int, key: str) -> Optional[tuple]:
+    cache_key = (database.current_tenant_id(), user_id, key)
+    with _front_cache_lock:
+        entry = _front_cache.get(cache_key)
+        if entry is None:
+            return None
+        if entry[0] <= datetime.datetime.utcnow():
+            del _front_cache[cache_key]
+            return None
+        _front_cache.move_to_end(cache_key)
+        return entry
+
+
+def _replay(entry: tuple, method: str, path: str, fingerprint: str) -> Response:
+    _, stored_method, stored_path, stored_fingerprint, status_code, body = entry
+    if (stored_method, stored_path, stored_fingerprint) != (method, path, fingerprint):
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request."
+        )
+    return Response(content=body, status_code=status_code, media_type="application/json", headers={REPLAY_HEADER: "true"})
+
+
+def _find(db: Session, user_id: int, key: str) -> Optional[database.IdempotencyKey]:
+    return db.query(database.IdempotencyKey).filter(
+        database.IdempotencyKey.user_id == user_id, database.IdempotencyKey.key == key
+    ).first()
+
+
+def _reserve(db: Session, user_id: int, key: str, method: str, path: str,
+             fingerprint: str) -> Tuple[Optional[database.IdempotencyKey], Optional[database.IdempotencyKey]]:
+    """
+    Kalitni joriy tranzaksiyada band qiladi (commit qilinmaydi): (yangi yozuv, None). Kalit allaqachon
+    mavjud bo'lsa (None, mavjud yozuv) - tranzaksiya rollback qilingan bo'ladi.
+    """
+    now = datetime.datetime.utcnow()
+    database.begin_write_transaction(db)
+    existing = _find(db, user_id, key)
+    if existing is not None:
+        if existing.expires_at > now:
+            db.rollback()
+            return None, existing
+        db.delete(existing)  # Muddati o'tgan kalitni qayta ishlatish mumkin
+    record = database.IdempotencyKey(
+        key=key, user_id=user_id, method=method, path=path, request_fingerprint=fingerprint,
+        created_at=now, expires_at=now + KEY_TTL,
+    )
+    try:
+        db.flush()  # O'chirish yangi yozuvdan oldin bajarilishi uchun
+        db.add(record)
+        db.flush()
+    except IntegrityError:
+        db.rollback()  # Parallel so'rov kalitni birinchi bo'lib yozdi va commit qildi
+        return None, _find(db, user_id, key)
+    return record, None
+
+
+def run_idempotent(
+    db: Session,
+    idempotency_key: Optional[str],
+    user_id: int,
+    method: str,
+    path: str,
+    payload: Any,
+    success_status: int,
+    response_type: Any,
+    action: Callable[[bool], Any],
+    after_commit: Optional[Callable[[Any], None]] = None,
+):
+    """
+    action(commit) amalni bajaradi; commit=False bo'lsa faqat flush qiladi. Kalit berilmagan bo'lsa,
+    action(True) natijasini o'zgarishsiz qaytaradi. Aks holda saqlangan javobni qaytaradi yoki
+    action(False) ni bajarib, kalit, amal va javobni bitta commit bilan yozadi, so'ng after_commit(natija)
+    ni chaqiradi (keshlar, xabarnomalar). action() xatolik ko'tarsa, hammasi rollback qilinadi va kalit
+    band qilinmaydi (muvaffaqiyatsiz so'rovni shu kalit bilan qayta yuborish mumkin).
+    """
+    if not idempotency_key:
+        return action(True)
+
+    fingerprint = request_fingerprint(payload)
+    cached = _recall(user_id, idempotency_key)
+    if cached is not None:
+        return _replay(cached, method, path, fingerprint)
+
+    record, existing = _reserve(db, user_id, idempotency_key, method, path, fingerprint)
+    if existing is not None:
+        if existing.status_code is None:  # Avvalgi versiyalar kalitni javobsiz commit qilgan bo'lishi mumkin
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed."
+            )
+        entry = (existing.expires_at, existing.method, existing.path, existing.request_fingerprint,
+                 existing.status_code, existing.response_body.encode())
+        _remember(user_id, idempotency_key, entry)
+        return _replay(entry, method, path, fingerprint)
+
+    try:
+        result = action(False)
+        body = http_cache.serialize(result, response_type)
+        record.status_code = success_status
+        record.response_body = body.decode()
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if after_commit is not None:
+        after_commit(result)
+    _remember(user_id, idempotency_key, (record.expires_at, method, path, fingerprint, success_status, body))
+    return Response(content=body, status_code=success_status, media_type="application/json")
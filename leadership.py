@@ -0,0 +1,137 @@
+"""
+Bir nechta worker (`uvicorn main:app --workers N` yoki serve.py) ishlaganda rejalashtirilgan
+vazifalar yetakchisini tanlash.
+
+Har bir worker o'z scheduler'ini ishga tushiradi, lekin retention kabi vazifalar faqat
+yetakchi worker'da bajariladi. Yetakchilik bazadagi ijara (lease) bilan belgilanadi:
+scheduler_leases jadvalidagi qator egasi (holder) va muddati (expires_at). Har bir worker
+har RENEW_INTERVAL_SECONDS soniyada try_acquire() ni chaqiradi:
+
+  * ijara o'ziniki bo'lsa - muddatini uzaytiradi;
+  * ijara muddati o'tgan bo'lsa (yetakchi to'xtagan yoki osilib qolgan) - o'ziga oladi;
+  * aks holda - kutib turadi.
+
+Ikkala holat ham bitta shartli UPDATE bilan bajariladi, shuning uchun ikki worker bir vaqtda
+yetakchi bo'lib qolmaydi. Worker to'xtaganda ijarani bo'shatadi (release), shunda boshqasi
+darhol egallaydi; jarayon kutilmaganda o'lsa, ijara LEASE_SECONDS dan keyin bo'shaydi.
+Baza umumiy bo'lgani uchun bir nechta hostda ham ishlaydi (hostlar soati sinxron bo'lishi kerak).
+"""
+import datetime
+import functools
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Callable, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import database, metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE_NAME = "scheduler"
+LEASE_SECONDS = float(os.getenv("BOGCHA_LEADER_LEASE_SECONDS", "30"))
+RENEW_INTERVAL_SECONDS = max(1.0, LEASE_SECONDS / 3)
+
+
+def _new_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    def __init__(self, name: str, lease_seconds: float = LEASE_SECONDS, engine=None):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder = _new_holder_id()
+        self._engine = engine
+        self._is_leader = False
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        return self._engine or database.engine
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def _set_leader(self, is_leader: bool) -> None:
+        if is_leader != self._is_leader:
+            logger.info(
+                "'%s' yetakchiligi %s: %s", self.name, "olindi" if is_leader else "yo'qotildi", self.holder,
+                extra={"lease": self.name, "holder": self.holder},
+            )
+        self._is_leader = is_leader
+
+    def try_acquire(self) -> bool:
+        """Ijarani oladi yoki uzaytiradi. Shu worker yetakchi bo'lsa True qaytaradi."""
+        table = database.SchedulerLease.__table__
+        with self._lock:
+            now = datetime.datetime.utcnow()
+            expires_at = now + datetime.timedelta(seconds=self.lease_seconds)
+            try:
+                with self.engine.begin() as conn:
+                    values = {"holder": self.holder, "expires_at": expires_at}
+                    if not self._is_leader:
+                        values["acquired_at"] = now
+                    result = conn.execute(
+                        update(table)
+                        .where(table.c.name == self.name)
+                        .where((table.c.holder == self.holder) | (table.c.expires_at < now))
+                        .values(**values)
+                    )
+                    acquired = result.rowcount == 1
+                if not acquired:
+                    # Qator hali yo'q bo'lishi mumkin (birinchi ishga tushish)
+                    try:
+                        with self.engine.begin() as conn:
+                            conn.execute(insert(table).values(
+                                name=self.name, holder=self.holder, acquired_at=now, expires_at=expires_at,
+                            ))
+                        acquired = True
+                    except IntegrityError:
+                        acquired = False  # Qator bor va ijara boshqa worker'da
+            except SQLAlchemyError:
+                # Bazaga ulanib bo'lmasa ijarani uzaytira olmaymiz - xavfsiz tomonga o'tamiz
+                logger.exception("'%s' ijarasini yangilashda xatolik", self.name)
+                acquired = False
+            self._set_leader(acquired)
+            return acquired
+
+    def release(self) -> None:
+        """Worker to'xtaganda ijarani bo'shatadi, shunda boshqa worker kutmasdan egallaydi."""
+        table = database.SchedulerLease.__table__
+        with self._lock:
+            if not self._is_leader:
+                return
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        update(table)
+                        .where(table.c.name == self.name, table.c.holder == self.holder)
+                        .values(expires_at=datetime.datetime.utcnow())
+                    )
+            except SQLAlchemyError:
+                logger.exception("'%s' ijarasini bo'shatishda xatolik", self.name)
+            self._set_leader(False)
+
+
+scheduler_lease = LeaderLease(SCHEDULER_LEASE_NAME)
+metrics.SCHEDULER_LEADER.set_function(lambda: 1.0 if scheduler_lease.is_leader else 0.0)
+
+
+def leader_only(job: Callable, lease: Optional[LeaderLease] = None) -> Callable:
+    """Rejalashtirilgan vazifani faqat yetakchi worker'da bajaradigan qilib o'raydi."""
+    lease = lease or scheduler_lease
+
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        # Vazifa oldidan ijarani yangilaymiz: yetakchi yaqinda o'zgargan bo'lsa ham ikki marta bajarilmaydi
+        if not lease.try_acquire():
+            logger.info("'%s' o'tkazib yuborildi: bu worker yetakchi emas.", job.__name__)
+            return None
+        return job(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,146 @@
+"""
+Ilova loglarini sozlash: JSON formatdagi, bloklamaydigan loglar.
+
+Barcha modullar `logging.getLogger(__name__)` dan foydalanadi. Root logger'ga faqat
+QueueHandler ulanadi: so'rovni bajarayotgan thread yozuvni navbatga qo'yadi xolos,
+formatlash va stderr'ga yozish alohida QueueListener thread'ida bajariladi.
+
+Har bir yozuvga joriy so'rov id'si (request_id) qo'shiladi. Id RequestIdMiddleware'da
+o'rnatiladi (X-Request-ID sarlavhasidan yoki yangi yaratiladi) va contextvar orqali
+crud/utils funksiyalariga, threadpool'dagi endpoint'larga ham yetib boradi.
+
+Sozlamalar (muhit o'zgaruvchilari):
+    BOGCHA_LOG_LEVEL=INFO                          - umumiy daraja
+    BOGCHA_LOG_LEVELS=main=DEBUG,sqlalchemy=WARNING - modullar bo'yicha darajalar
+    BOGCHA_LOG_FORMAT=json                         - "json" yoki "text" (lokal ishlash uchun)
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from typing import Dict, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# LogRecord'ning standart atributlari; qolganlari (extra=...) JSON'ga alohida maydon bo'lib tushadi
+_STANDARD_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+# Uchinchi tomon kutubxonalarining DEBUG loglari juda ko'p; BOGCHA_LOG_LEVELS bilan o'zgartirish mumkin
+DEFAULT_MODULE_LEVELS = {
+    "sqlalchemy": "WARNING",
+    "database.InstrumentedQueuePool": "WARNING",  # SQLAlchemy pool logger'i pool klassi moduli nomida
+    "passlib": "WARNING",
+    "apscheduler": "INFO",
+    "httpx": "WARNING",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id: str):
+    return request_id_var.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    request_id_var.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Xabar va traceback'ni navbatga qo'yishdan oldin matnga aylantiradi, extra maydonlarni saqlab qoladi."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, module_levels: Optional[str] = None, log_format: Optional[str] = None) -> None:
+    """Root logger'ni navbatli handler bilan sozlaydi. Qayta chaqirilsa, hech narsa qilmaydi."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    level = (level or os.getenv("BOGCHA_LOG_LEVEL", "INFO")).upper()
+    module_levels = module_levels if module_levels is not None else os.getenv("BOGCHA_LOG_LEVELS", "")
+    log_format = (log_format or os.getenv("BOGCHA_LOG_FORMAT", "json")).lower()
+
+    output = logging.StreamHandler(sys.stderr)
+    if log_format == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())  # Filtr so'rov thread'ida ishlaydi, shuning uchun contextvar ko'rinadi
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for name, module_level in {**DEFAULT_MODULE_LEVELS, **_parse_levels(module_levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Navbatdagi yozuvlarni yozib tugatadi va listener thread'ini to'xtatadi."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
@@ -0,0 +1,185 @@
+"""
+Ochiq lotlar (qoldig'i bor kirimlar) uchun xotiradagi FEFO indeksi.
+
+Ovqat berishda mahsulot avval muddati eng yaqin tugaydigan lotdan olinadi (FEFO), muddati
+ko'rsatilmagan lotlar ulardan keyin, kirim sanasi bo'yicha (FIFO). Har bir mahsulotning ochiq
+lotlari tartiblangan ro'yxatda saqlanadi: (yaroqlilik muddati, kirim sanasi, lot id). Ro'yxat
+mahsulotga birinchi murojaatda bazadan bir marta yuklanadi, keyin faqat o'zgargan lotlar
+qo'shiladi yoki olib tashlanadi - ovqat berish narxi kirimlar tarixiga bog'liq emas.
+
+Indeks faqat commit qilingan holatni aks ettiradi. Sessiyada tegilgan lotlar db.info'ga
+yoziladi va after_commit'da indeksga qo'llanadi; tranzaksiya bekor qilinsa, tashlab yuboriladi
+(savepoint bekor qilinsa, tegilgan mahsulotlar indeksi qayta yuklanadi). Boshqa worker'lardagi
+o'zgarishlar cache_sync orqali keladi. Indeksdagi lot baribir bazadan o'qiladi, shuning uchun
+eskirgan yozuv faqat o'tkazib yuboriladi.
+"""
+import bisect
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import database
+
+_lock = threading.Lock()
+
+_NO_EXPIRY = datetime.date.max  # Muddati yo'q lotlar muddatlilaridan keyin
+_NO_DATE = datetime.datetime.min
+
+LotKey = Tuple[datetime.date, datetime.datetime, int]
+
+
+def lot_key(lot_id: int, expiry_date: Optional[datetime.date], delivery_date: Optional[datetime.datetime]) -> LotKey:
+    return (expiry_date or _NO_EXPIRY, delivery_date or _NO_DATE, lot_id)
+
+
+class _TenantLots:
+    def __init__(self):
+        # product_id -> FEFO tartibidagi ochiq lotlar kalitlari
+        self.products: Dict[int, List[LotKey]] = {}
+        # lot id -> (product_id, kalit); faqat yuklangan mahsulotlar lotlari
+        self.lots: Dict[int, Tuple[int, LotKey]] = {}
+
+
+_tenants: Dict[int, _TenantLots] = {}
+
+
+def _state(tenant_id: Optional[int] = None) -> _TenantLots:
+    tenant_id = database.current_tenant_id() if tenant_id is None else tenant_id
+    state = _tenants.get(tenant_id)
+    if state is None:
+        with _lock:
+            state = _tenants.setdefault(tenant_id, _TenantLots())
+    return state
+
+
+def _remove(state: _TenantLots, lot_id: int) -> None:
+    entry = state.lots.pop(lot_id, None)
+    if entry is None:
+        return
+    product_id, key = entry
+    keys = state.products.get(product_id)
+    if keys is not None:
+        position = bisect.bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            keys.pop(position)
+
+
+def _upsert(state: _TenantLots, product_id: int, key: LotKey) -> None:
+    keys = state.products.get(product_id)
+    if keys is None:
+        return  # Mahsulot hali yuklanmagan - birinchi murojaatda bazadan o'qiladi
+    _remove(state, key[2])
+    bisect.insort(keys, key)
+    state.lots[key[2]] = (product_id, key)
+
+
+def _unload(state: _TenantLots, product_id: int) -> None:
+    for key in state.products.pop(product_id, ()):
+        state.lots.pop(key[2], None)
+
+
+def _load(db: Session, product_id: int) -> List[LotKey]:
+    deliveries = database.ProductDelivery.__table__
+    # Alohida ulanish: sessiyadagi commit qilinmagan o'zgarishlar indeksga tushmasligi kerak
+    with db.get_bind().connect() as conn:
+        rows = conn.execute(
+            select(deliveries.c.id, deliveries.c.expiry_date, deliveries.c.delivery_date)
+            .where(deliveries.c.product_id == product_id, deliveries.c.remaining_grams > 0)
+        ).all()
+    return sorted(lot_key(row.id, row.expiry_date, row.delivery_date) for row in rows)
+
+
+def ordered_lot_ids(db: Session, product_id: int) -> List[int]:
+    """Mahsulotning ochiq lotlari FEFO tartibida, shu sessiyada yaratilgan (hali commit qilinmagan) lotlar bilan."""
+    state = _state()
+    with _lock:
+        keys = state.products.get(product_id)
+    if keys is None:
+        loaded = _load(db, product_id)
+        with _lock:
+            keys = state.products.get(product_id)
+            if keys is None:
+                keys = state.products[product_id] = loaded
+                for key in loaded:
+                    state.lots[key[2]] = (product_id, key)
+    with _lock:
+        keys = list(keys)
+    pending = [
+        key for (tenant_id, lot_id), (lot_product_id, key, remaining) in db.info.get("lots", {}).items()
+        if lot_product_id == product_id and remaining > 0 and tenant_id == database.current_tenant_id()
+    ]
+    if pending:
+        keys = sorted(set(keys) | set(pending))
+    return [key[2] for key in keys]
+
+
+def track(db: Session, lot: database.ProductDelivery) -> None:
+    """Lot yaratildi yoki qoldig'i o'zgardi; indeks commit'dan keyin yangilanadi."""
+    db.info.setdefault("lots", {})[(database.current_tenant_id(), lot.id)] = (
+        lot.product_id, lot_key(lot.id, lot.expiry_date, lot.delivery_date), lot.remaining_grams,
+    )
+
+
+def apply_committed(tenant_id: int, rows: Iterable, removed_ids: Iterable[int] = ()) -> None:
+    """
+    Boshqa worker commit qilgan lotlar holatini qo'llaydi (cache_sync).
+    rows: (id, product_id, expiry_date, delivery_date, remaining_grams).
+    """
+    state = _state(tenant_id)
+    with _lock:
+        for lot_id, product_id, expiry_date, delivery_date, remaining_grams in rows:
+            if remaining_grams > 0:
+                _upsert(state, product_id, lot_key(lot_id, expiry_date, delivery_date))
+            else:
+                _remove(state, lot_id)
+        for lot_id in removed_ids:
+            _remove(state, lot_id)
+
+
+def unload_product(product_id: int, tenant_id: Optional[int] = None) -> None:
+    state = _state(tenant_id)
+    with _lock:
+        _unload(state, product_id)
+
+
+def invalidate() -> None:
+    """Barcha tenantlar indeksini tashlab yuboradi, keyingi murojaatda bazadan qayta yuklanadi."""
+    with _lock:
+        for state in _tenants.values():
+            state.products.clear()
+            state.lots.clear()
+
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _apply_session_lots(session: Session) -> None:
+    changes = session.info.pop("lots", None)
+    reload = session.info.pop("lots_reload", None)
+    if not changes and not reload:
+        return
+    with _lock:
+        for (tenant_id, lot_id), (product_id, key, remaining) in (changes or {}).items():
+            state = _tenants.setdefault(tenant_id, _TenantLots())
+            if reload and (tenant_id, product_id) in reload:
+                continue
+            if remaining > 0:
+                _upsert(state, product_id, key)
+            else:
+                _remove(state, lot_id)
+        for tenant_id, product_id in reload or ():
+            if tenant_id in _tenants:
+                _unload(_tenants[tenant_id], product_id)
+
+
+@event.listens_for(database.SessionLocal, "after_soft_rollback")
+def _discard_session_lots(session: Session, previous_transaction) -> None:
+    if previous_transaction.nested:
+        # Savepoint ichidagi o'zgarishlarni ajratib bo'lmaydi: tegilgan mahsulotlar indeksi qayta yuklanadi
+        reload = session.info.setdefault("lots_reload", set())
+        for (tenant_id, _), (product_id, _, _) in session.info.get("lots", {}).items():
+            reload.add((tenant_id, product_id))
+    else:
+        session.info.pop("lots", None)
+        session.info.pop("lots_reload", None)
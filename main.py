@@ -1,31 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body, Query, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, status, Body, Query, APIRouter, Header
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import List, Annotated, Optional,Tuple 
 import datetime
 from fastapi import Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.concurrency import run_in_threadpool
 import json
 import datetime
-import crud, schemas, security, utils, database
-from database import engine, get_db, create_db_and_tables, UserRole
+import crud, schemas, security, utils, database, stock_cache, events, http_cache, forecast, planning, idempotency, sync, changes, metrics, profiling, logging_setup, leadership, cache_sync, tenancy, regional, costing, units
+from starlette.routing import Match
+import logging
+import time
+from database import engine, get_db, UserRole
+from tenancy import UnknownTenantError
+import migrations
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import html
-scheduler = AsyncIOScheduler(timezone="Asia/Tashkent")
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.pool import ThreadPoolExecutor
+import retention
+
+logging_setup.configure_logging()
+logger = logging.getLogger(__name__)
+# Retention kabi og'ir vazifalar event loop'ni bloklamasligi uchun alohida worker thread'da ishlaydi.
+# "cluster" - yetakchilik ijarasi va keshlarni sinxronlash (retention uzoq ishlasa ham ijara yangilanib turadi)
+scheduler = AsyncIOScheduler(
+    timezone="Asia/Tashkent",
+    executors={
+        "default": AsyncIOExecutor(),
+        "retention": ThreadPoolExecutor(max_workers=1),
+        "cluster": ThreadPoolExecutor(max_workers=2),
+    },
+)
 def run_scheduled_log_deletion():
-    print(f"SCHEDULER: Eski audit loglarini o'chirish vazifasi ishga tushdi - {datetime.datetime.now(scheduler.timezone)}")
-    db: Optional[Session] = None
+    logger.info("Retention vazifalari ishga tushdi - %s", datetime.datetime.now(scheduler.timezone))
+    start = time.perf_counter()
+    success = True
+    try:
+        for run in retention.run_all_policies():
+            success = success and run.success
+            logger.log(
+                logging.INFO if run.success else logging.ERROR,
+                "'%s': %s ta yozuv o'chirildi, %s bo'lak, %ss (qulf kutish: %ss, o'chirish: %ss)%s", run.policy, run.rows_deleted,
+                run.chunks, run.duration_seconds, run.lock_wait_seconds, run.delete_seconds, "" if run.success else f", XATOLIK: {run.error}",
+                extra={"policy": run.policy, "rows_deleted": run.rows_deleted, "duration_seconds": run.duration_seconds},
+            )
+    except Exception:
+        success = False
+        raise
+    finally:
+        metrics.SCHEDULER_JOB_DURATION.observe(time.perf_counter() - start, "delete_old_logs_job", str(success).lower())
+def run_scheduled_rollups():
+    # Kunlik sarfni yig'ish so'rov yo'lidan tashqarida: GET /reports/forecast bazaga yozmaydi
+    start = time.perf_counter()
+    success = False
     try:
-        db = next(database.get_db()) 
-        deleted_count = crud.delete_old_audit_logs(db, days_to_keep=30) 
-    except Exception as e:
-        print(f"SCHEDULER: Eski loglarni o'chirishda xatolik yuz berdi: {e}")
+        processed = forecast.refresh_all_daily_rollups()
+        logger.info("Kunlik sarf yig'ildi: %s ta (mahsulot, kun) juftligi", processed, extra={"rows_processed": processed})
+        success = True
     finally:
-        if db:
-            db.close()
+        metrics.SCHEDULER_JOB_DURATION.observe(time.perf_counter() - start, "daily_rollup_job", str(success).lower())
 app = FastAPI(title="Bog'cha Ovqatlar va Ombor Hisoboti Dasturi Rev.2")
 def mask_sensitive_data(data: dict) -> dict:
     if not isinstance(data, dict):
@@ -85,8 +124,8 @@ def get_resource_type_from_path(path: str) -> Tuple[Optional[str], Optional[str]
         "meals": "Taom",
         "serve": "Taom berish amali", 
         "auth": "Autentifikatsiya",
-        "audit-logs": "Audit Log"
-       
+        "audit-logs": "Audit Log",
+        "sync": "Oflayn sinxronlash"
     }
     resource_type_display = type_map.get(main_entity_key)
 
@@ -132,6 +171,41 @@ def get_resource_info_from_path(path: str) -> Tuple[Optional[str], Optional[str]
     return res_type_display, res_id_from_path, sub_action_or_type
 
 
+def _prefetch_resource_name_for_log(path_resource_type: str, path_resource_id: str) -> Optional[str]:
+    fetched_resource_name: Optional[str] = None
+    db_for_prefetch: Optional[Session] = None
+    try:
+        db_for_prefetch = next(database.get_db())
+        if path_resource_type == "Foydalanuvchi":
+            fetched_resource_name = crud.get_user_name_for_log(db_for_prefetch, int(path_resource_id))
+        elif path_resource_type == "Mahsulot":
+            fetched_resource_name = crud.get_product_name_for_log(db_for_prefetch, int(path_resource_id))
+        elif path_resource_type == "Taom": 
+            fetched_resource_name = crud.get_meal_name_for_log(db_for_prefetch, int(path_resource_id))
+        
+        if fetched_resource_name:
+             logger.debug("Operatsiyadan oldin resurs nomi olindi: '%s'", fetched_resource_name)
+        else:
+             logger.debug("Resurs (ID: %s, Turi: %s) uchun nom topilmadi.", path_resource_id, path_resource_type)
+
+    except ValueError:
+         logger.debug("Prefetch uchun yaroqsiz resurs IDsi: %s", path_resource_id)
+    except Exception as e_prefetch:
+        logger.warning("Log uchun resurs nomini oldindan olishda xatolik: %s", e_prefetch)
+    finally:
+        if db_for_prefetch: db_for_prefetch.close()
+    return fetched_resource_name
+
+def _save_audit_log(log_entry_data: schemas.AuditLogCreate) -> None:
+    db_session_for_log_save: Optional[Session] = None
+    try:
+        db_session_for_log_save = next(database.get_db())
+        crud.create_audit_log(db=db_session_for_log_save, log_entry=log_entry_data)
+    except Exception as log_exc:
+        logger.critical("Audit logni yozishda xatolik: %s", log_exc, exc_info=True)
+    finally:
+        if db_session_for_log_save: db_session_for_log_save.close()
+
 class AuditLogMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
         current_method = request.method.upper()
@@ -160,27 +234,8 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
         path_resource_type, path_resource_id, path_sub_action = get_resource_info_from_path(current_path)
 
         if path_resource_id and path_resource_type:
-            db_for_prefetch: Optional[Session] = None
-            try:
-                db_for_prefetch = next(database.get_db())
-                if path_resource_type == "Foydalanuvchi":
-                    fetched_resource_name = crud.get_user_name_for_log(db_for_prefetch, int(path_resource_id))
-                elif path_resource_type == "Mahsulot":
-                    fetched_resource_name = crud.get_product_name_for_log(db_for_prefetch, int(path_resource_id))
-                elif path_resource_type == "Taom": 
-                    fetched_resource_name = crud.get_meal_name_for_log(db_for_prefetch, int(path_resource_id))
-                
-                if fetched_resource_name:
-                     print(f"AUDIT_MIDDLEWARE: Operatsiyadan oldin resurs nomi olindi: '{fetched_resource_name}'")
-                else:
-                     print(f"AUDIT_MIDDLEWARE: Resurs (ID: {path_resource_id}, Turi: {path_resource_type}) uchun nom topilmadi.")
-
-            except ValueError:
-                 print(f"AUDIT_MIDDLEWARE: Prefetch uchun yaroqsiz resurs IDsi: {path_resource_id}")
-            except Exception as e_prefetch:
-                print(f"AUDIT_MIDDLEWARE: Log uchun resurs nomini oldindan olishda xatolik: {e_prefetch}")
-            finally:
-                if db_for_prefetch: db_for_prefetch.close()
+            # Sinxron baza chaqiruvlari event loop'ni bloklamasligi uchun threadpool'da bajariladi
+            fetched_resource_name = await run_in_threadpool(_prefetch_resource_name_for_log, path_resource_type, path_resource_id)
         
         created_item_name_from_body: Optional[str] = None
         if current_method == "POST" and req_body_bytes:
@@ -256,22 +311,19 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
                 if exception_details_str:
                      final_log_details += f" Tafsilot: {html.escape(exception_details_str[:100])}"
             
-            db_session_for_log_save: Optional[Session] = None
+            log_entry_data = schemas.AuditLogCreate(
+                username=username_for_log,
+                method=request.method,
+                endpoint_path=current_path,
+                client_host=request.client.host if request.client else None,
+                user_agent=request.headers.get("user-agent"),
+                details=final_log_details.strip()
+            )
+            metrics.AUDIT_WRITES_PENDING.inc()
             try:
-                db_session_for_log_save = next(database.get_db())
-                log_entry_data = schemas.AuditLogCreate(
-                    username=username_for_log,
-                    method=request.method,
-                    endpoint_path=current_path,
-                    client_host=request.client.host if request.client else None,
-                    user_agent=request.headers.get("user-agent"),
-                    details=final_log_details.strip()
-                )
-                crud.create_audit_log(db=db_session_for_log_save, log_entry=log_entry_data)
-            except Exception as log_exc:
-                print(f"CRITICAL: Audit logni yozishda xatolik: {log_exc}"); import traceback; traceback.print_exc()
+                await run_in_threadpool(_save_audit_log, log_entry_data)
             finally:
-                if db_session_for_log_save: db_session_for_log_save.close()
+                metrics.AUDIT_WRITES_PENDING.dec()
         
         if response is None: 
              return JSONResponse(status_code=status_code_for_log, content={"detail": exception_details_str or "Middleware error"})
@@ -286,35 +338,166 @@ app.add_middleware(
 app.add_middleware(AuditLogMiddleware)
 
 
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """Har bir so'rov uchun SQL so'rovlar soni va baza vaqtini hisoblaydi (audit log yozish ham kiradi)."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        stats, token = database.start_query_stats(f"{request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            database.stop_query_stats(token)
+        if database.DEBUG:
+            response.headers["X-DB-Queries"] = str(stats.count)
+            response.headers["X-DB-Time"] = f"{stats.seconds * 1000.0:.2f}ms"
+        return response
+app.add_middleware(QueryStatsMiddleware)
+
+
+def _route_template(request: Request) -> str:
+    """Metrika yorlig'i uchun route shabloni (/products/{product_id}), shunda yorliqlar soni cheklangan bo'ladi."""
+    route = request.scope.get("route")
+    if route is None:
+        # Audit middleware yozish so'rovlari uchun scope nusxasini yuboradi, route o'sha nusxada qoladi
+        for candidate in request.app.router.routes:
+            match, _ = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, request.method, _route_template(request), str(status_code)
+            )
+app.add_middleware(MetricsMiddleware)
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """X-Profile sarlavhasi yoki ?profile= bilan kelgan so'rovni @profiled endpoint'lar uchun belgilaydi."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        mode = profiling.parse_mode(
+            request.headers.get(profiling.PROFILE_HEADER) or request.query_params.get(profiling.PROFILE_QUERY_PARAM)
+        )
+        if mode is None:
+            return await call_next(request)
+        profile_request, token = profiling.request_profile(mode, f"{request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            profiling.clear_request(token)
+        if profile_request.profile_id is not None:
+            response.headers[profiling.PROFILE_ID_HEADER] = str(profile_request.profile_id)
+        return response
+app.add_middleware(ProfilingMiddleware)
+
+
+class TenantMiddleware(BaseHTTPMiddleware):
+    """So'rov bog'chasini (token'dagi tid yoki X-Tenant sarlavhasi) aniqlaydi va contextvar'ga o'rnatadi."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        token = request.query_params.get("ticket")  # /events/stream chiptasi
+        auth_header = request.headers.get("Authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header.split(" ", 1)[1]
+        try:
+            # Ro'yxat kesh'i bo'sh bo'lsa bazaga murojaat qilinadi
+            tenant_id = await run_in_threadpool(tenancy.resolve_tenant, token, request.headers.get(tenancy.TENANT_HEADER))
+        except UnknownTenantError:
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Unknown or inactive tenant"})
+        tenant_token = database.set_tenant(tenant_id)
+        try:
+            return await call_next(request)
+        finally:
+            database.reset_tenant(tenant_token)
+app.add_middleware(TenantMiddleware)
+
+
+class RequestIdMiddleware(BaseHTTPMiddleware):
+    """Eng tashqi middleware: so'rov id'sini loglar uchun contextvar'ga o'rnatadi va javobda qaytaradi."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        request_id = request.headers.get(logging_setup.REQUEST_ID_HEADER) or logging_setup.new_request_id()
+        token = logging_setup.set_request_id(request_id[:64])
+        try:
+            response = await call_next(request)
+        finally:
+            logging_setup.reset_request_id(token)
+        response.headers[logging_setup.REQUEST_ID_HEADER] = request_id[:64]
+        return response
+app.add_middleware(RequestIdMiddleware)
+
+
 # --- Startup event ---
 @app.on_event("startup")
 def on_startup_event(): 
-    create_db_and_tables()
-    db = next(get_db())
-    try:
-        # Admin
-        if not crud.get_user_by_username(db, username="admin"):
-            crud.create_user(db, schemas.UserCreate(username="admin", password="adminpassword", role=UserRole.admin))
-        # Chef
-        if not crud.get_user_by_username(db, username="chef"):
-            crud.create_user(db, schemas.UserCreate(username="chef", password="chefpassword", role=UserRole.chef))
-        # Manager
-        if not crud.get_user_by_username(db, username="manager"):
-            crud.create_user(db, schemas.UserCreate(username="manager", password="managerpassword", role=UserRole.manager))
-    finally:
-        db.close()
+    # Bitta so'rov bilan sxema versiyasini tekshirish; jadvallar va standart foydalanuvchilar migratsiyalarda yaratiladi
+    version = migrations.check_schema()
+    logger.info("Baza sxemasi versiyasi: %s", version)
     try:
+        # Bir nechta worker ishlasa, vazifalar faqat yetakchi worker'da bajariladi (leadership.py)
+        leadership.scheduler_lease.try_acquire()
+        scheduler.add_job(
+            leadership.scheduler_lease.try_acquire,
+            IntervalTrigger(seconds=leadership.RENEW_INTERVAL_SECONDS),
+            id="scheduler_lease_job",
+            executor="cluster",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
         scheduler.add_job(
-            run_scheduled_log_deletion, 
+            leadership.leader_only(run_scheduled_log_deletion), 
             CronTrigger(hour=2, minute=30, timezone="Asia/Tashkent"),
             id="delete_old_logs_job", 
+            executor="retention",
+            max_instances=1,
             replace_existing=True 
         )
+        scheduler.add_job(
+            leadership.leader_only(run_scheduled_rollups),
+            IntervalTrigger(seconds=forecast.ROLLUP_INTERVAL_SECONDS),
+            id="daily_rollup_job",
+            executor="retention",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        if cache_sync.ENABLED:
+            cache_sync.run_poll()  # Boshlang'ich seq
+            scheduler.add_job(
+                cache_sync.run_poll,
+                IntervalTrigger(seconds=cache_sync.POLL_INTERVAL_SECONDS),
+                id="cache_sync_job",
+                executor="cluster",
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True
+            )
         if not scheduler.running:
             scheduler.start()
     except Exception as e_scheduler:
-        print(f"MAIN.PY (Startup): Scheduler'ni sozlashda xatolik: {e_scheduler}")
-    print("MAIN.PY: Startup event tugadi.")
+        logger.error("Scheduler'ni sozlashda xatolik: %s", e_scheduler, exc_info=True)
+    logger.info("Startup event tugadi.")
+
+
+@app.on_event("shutdown")
+def on_shutdown_event():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    leadership.scheduler_lease.release()  # Boshqa worker ijara muddatini kutmasdan yetakchi bo'ladi
 
 class CommonQueryParams:
     def __init__(self, skip: int = 0, limit: int = 100):
@@ -330,6 +513,13 @@ serving_router = APIRouter(prefix="/serve", tags=["Meal Serving System"])
 portions_router = APIRouter(prefix="/portions", tags=["Portion Calculation"])
 reports_router = APIRouter(prefix="/reports", tags=["Reports & Visualization"])
 alerts_router = APIRouter(prefix="/alerts", tags=["Alerts"])
+events_router = APIRouter(prefix="/events", tags=["Live Events"])
+sync_router = APIRouter(prefix="/sync", tags=["Offline Sync"])
+changes_router = APIRouter(prefix="/changes", tags=["Change Feed"])
+metrics_router = APIRouter(prefix="/metrics", tags=["Monitoring"])
+# Profillar, sekin so'rovlar va retention natijalari barcha bog'chalarga tegishli - faqat platforma admini
+debug_router = APIRouter(prefix="/debug", tags=["Monitoring"], dependencies=[Depends(security.get_current_platform_admin_user)])
+tenants_router = APIRouter(prefix="/tenants", tags=["Tenant Management"], dependencies=[Depends(security.get_current_platform_admin_user)])
 
 
 # --- Authentication Endpoints ---
@@ -350,17 +540,24 @@ async def login_for_access_token_route(
     
     access_token_expires = datetime.timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.username, "role": user.role.value}, expires_delta=access_token_expires
+        data={"sub": user.username, "role": user.role.value, security.TENANT_CLAIM: user.tenant_id},
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 # --- User Management Endpoints ---
+def _check_platform_grant(current_user: database.User, changes_platform_access: bool) -> None:
+    """Platforma huquqini faqat o'zida shu huquq bor admin beradi yoki oladi (bog'cha admini o'ziga bera olmaydi)."""
+    if changes_platform_access and not current_user.is_platform:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only a platform admin can change platform access.")
+
 @users_router.post("/", response_model=schemas.UserSchema, status_code=status.HTTP_201_CREATED)
 def create_user_route( 
     user: schemas.UserCreate, 
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_admin_user)
 ):
+    _check_platform_grant(current_user, user.is_platform)
     return crud.create_user(db=db, user=user) 
 
 @users_router.get("/", response_model=List[schemas.UserSchema])
@@ -395,6 +592,7 @@ def update_user_route(
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_admin_user)
 ):
+    _check_platform_grant(current_user, user_update.is_platform is not None)
     updated_user = crud.update_user(db, user_id=user_id, user_update=user_update)
     if not updated_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or update failed")
@@ -428,26 +626,41 @@ def create_new_product_type_route(
 
 @products_router.post("/{product_id}/receive_stock", response_model=schemas.ProductDelivery, status_code=status.HTTP_201_CREATED)
 def receive_product_stock_route( 
+    request: Request,
     product_id: int,
     delivery_in: schemas.ProductDeliveryCreate, 
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_manager_user)
 ):
     if delivery_in.product_id != product_id:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Product ID in path and body do not match.")
-    try:
-        return crud.create_product_delivery(db=db, delivery_in=delivery_in)
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    def receive_stock(commit: bool):
+        try:
+            return crud.create_product_delivery(db=db, delivery_in=delivery_in, commit=commit)
+        except units.UnitConversionError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return idempotency.run_idempotent(
+        db, idempotency_key, current_user.id, request.method, request.url.path,
+        # exclude_unset: delivery_date berilmasa har safar yangi vaqt oladi, takroriy so'rov barmoq izi o'zgarmasligi kerak
+        delivery_in.model_dump(mode="json", exclude_unset=True), status.HTTP_201_CREATED, schemas.ProductDelivery, receive_stock,
+        after_commit=lambda delivery: crud.notify_delivery_received(db, delivery)
+    )
 
 
 @products_router.get("/", response_model=List[schemas.Product])
 def read_products_route(
+    request: Request,
     commons: Annotated[CommonQueryParams, Depends()],
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_authenticated_user)
 ):
-    return crud.get_products(db, skip=commons.skip, limit=commons.limit)
+    return http_cache.cached_json_response(
+        request, (http_cache.PRODUCTS,), List[schemas.Product],
+        lambda: crud.get_products(db, skip=commons.skip, limit=commons.limit)
+    )
 
 @products_router.get("/{product_id}", response_model=schemas.Product)
 def read_product_route(
@@ -475,6 +688,45 @@ def update_product_info_route(
     except ValueError as e: 
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+@products_router.put("/{product_id}/threshold", response_model=schemas.Product)
+def update_product_threshold_route(
+    product_id: int,
+    threshold_update: schemas.ProductThresholdUpdate,
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    updated_product = crud.update_product_threshold(db, product_id=product_id, threshold_update=threshold_update)
+    if updated_product is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return updated_product
+
+
+@products_router.get("/{product_id}/units", response_model=List[schemas.ProductUnitConversion])
+def read_product_units_route(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_authenticated_user)
+):
+    db_product = crud.get_product(db, product_id=product_id)
+    if db_product is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return db_product.unit_conversions
+
+@products_router.put("/{product_id}/units", response_model=List[schemas.ProductUnitConversion])
+def update_product_units_route(
+    product_id: int,
+    conversions: List[schemas.ProductUnitConversion],
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    try:
+        updated_product = crud.set_product_units(db, product_id=product_id, conversions=conversions)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if updated_product is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return updated_product.unit_conversions
+
 
 @products_router.delete("/{product_id}", response_model=schemas.Product)
 def delete_product_route(
@@ -516,24 +768,34 @@ def create_meal_route(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+# Taom javoblarida ingredient mahsulotlarining qoldig'i ham bor, shuning uchun mahsulotlar versiyasiga ham bog'liq
+MEAL_CACHE_ENTITIES = (http_cache.MEALS, http_cache.PRODUCTS)
+
 @meals_router.get("/", response_model=List[schemas.Meal])
 def read_meals_route(
+    request: Request,
     commons: Annotated[CommonQueryParams, Depends()],
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_authenticated_user)
 ):
-    return crud.get_meals(db, skip=commons.skip, limit=commons.limit)
+    return http_cache.cached_json_response(
+        request, MEAL_CACHE_ENTITIES, List[schemas.Meal],
+        lambda: crud.get_meals(db, skip=commons.skip, limit=commons.limit)
+    )
 
 @meals_router.get("/{meal_id}", response_model=schemas.Meal)
 def read_meal_route(
+    request: Request,
     meal_id: int,
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_authenticated_user)
 ):
-    db_meal = crud.get_meal(db, meal_id=meal_id)
-    if db_meal is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Meal not found")
-    return db_meal
+    def build():
+        db_meal = crud.get_meal(db, meal_id=meal_id)
+        if db_meal is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Meal not found")
+        return db_meal
+    return http_cache.cached_json_response(request, MEAL_CACHE_ENTITIES, schemas.Meal, build)
 
 @meals_router.put("/{meal_id}", response_model=schemas.Meal)
 def update_meal_route(
@@ -564,23 +826,113 @@ def delete_meal_route(
 # --- Meal Serving System ---
 @serving_router.post("/{meal_id}", response_model=schemas.MealServingLogSchema)
 def serve_meal_route(
+    request: Request,
     meal_id: int,
     serve_request: schemas.ServeMealRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_chef_user)
 ):
-    success, message, log_entry = utils.serve_meal_action(
-        db, 
-        meal_id=meal_id, 
-        user_id=current_user.id, 
-        portions_to_serve=serve_request.portions_to_serve 
+    def serve(commit: bool):
+        success, message, log_entry = utils.serve_meal_action(
+            db, 
+            meal_id=meal_id, 
+            user_id=current_user.id, 
+            portions_to_serve=serve_request.portions_to_serve,
+            commit=commit
+        )
+        if not success or not log_entry:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
+        return log_entry
+    def after_serve(log_entry: database.MealServingLog):
+        utils.notify_meal_served(db, log_entry, [ingredient.product_id for ingredient in log_entry.meal.ingredients])
+    return idempotency.run_idempotent(
+        db, idempotency_key, current_user.id, request.method, request.url.path,
+        serve_request.model_dump(mode="json"), status.HTTP_200_OK, schemas.MealServingLogSchema, serve,
+        after_commit=after_serve
     )
-    if not success or not log_entry:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
-    return log_entry
+
+# --- Offline Sync ---
+@sync_router.post("", response_model=schemas.SyncResponse)
+def sync_operations_route(
+    sync_request: schemas.SyncRequest,
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_authenticated_user)
+):
+    """
+    Oflayn qurilmada navbatga yozilgan amallarni (serve, receive_stock) tartib bilan bitta tranzaksiyada qo'llaydi.
+    Har bir amal uchun natija (applied/duplicate/conflict/rejected/skipped) va since_version'dan
+    keyin o'zgargan mahsulotlar qaytadi. Ruxsatlar har bir amal turi uchun alohida tekshiriladi.
+    """
+    return sync.apply_sync_batch(db, current_user, sync_request)
+
+# --- Change Feed ---
+@changes_router.get("", response_model=schemas.ChangesResponse)
+def read_changes_route(
+    since: int = Query(0, ge=0, description="Oxirgi olingan next_since qiymati (birinchi marta 0)"),
+    limit: int = Query(changes.DEFAULT_PAGE_SIZE, ge=1, le=changes.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_authenticated_user)
+):
+    """
+    since'dan keyin o'zgargan mahsulotlar, kirimlar, taomlar (va admin uchun foydalanuvchilar) hamda
+    o'chirilganlar ro'yxati. has_more=True bo'lsa, next_since bilan yana so'rang.
+    """
+    return changes.get_changes(db, since, limit, include_users=current_user.role == UserRole.admin)
+
+# --- Tenant Management ---
+@tenants_router.get("/", response_model=List[schemas.TenantSchema])
+def read_tenants_route():
+    return tenancy.get_tenants()
+
+@tenants_router.post("/", response_model=schemas.TenantSchema, status_code=status.HTTP_201_CREATED)
+def create_tenant_route(tenant_in: schemas.TenantCreate):
+    """Yangi bog'cha va uning birinchi admini. Keyingi so'rovlar X-Tenant: <slug> bilan login qilinadi."""
+    try:
+        return tenancy.create_tenant(tenant_in)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# --- Monitoring ---
+@metrics_router.get("", response_class=Response)
+def read_metrics_route():
+    """Prometheus matn formatidagi metrikalar. Autentifikatsiyasiz - faqat ichki tarmoqdan scrape qilinishi kerak."""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+def _get_profile_or_404(profile_id: int) -> dict:
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile with ID {profile_id} not found (or already evicted).")
+    return profile
+
+@debug_router.get("/profiles", response_model=List[schemas.ProfileSummary])
+def read_profiles_route():
+    return profiling.list_profiles()
+
+@debug_router.get("/profiles/{profile_id}", response_model=schemas.ProfileDetail)
+def read_profile_route(profile_id: int):
+    return _get_profile_or_404(profile_id)
+
+@debug_router.get("/profiles/{profile_id}/folded", response_class=Response)
+def read_profile_folded_route(profile_id: int):
+    """Flamegraph uchun "folded stacks" (faqat sample rejimi)."""
+    profile = _get_profile_or_404(profile_id)
+    if profile["folded"] is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folded stacks exist only for 'sample' profiles.")
+    return Response(content=profile["folded"], media_type="text/plain; charset=utf-8")
+
+@debug_router.get("/profiles/{profile_id}/pstats", response_class=Response)
+def read_profile_pstats_route(profile_id: int):
+    """cProfile natijasi (.prof) - snakeviz yoki flameprof bilan ochiladi (faqat cprofile rejimi)."""
+    profile = _get_profile_or_404(profile_id)
+    if profile["pstats"] is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="pstats exist only for 'cprofile' profiles.")
+    return Response(content=profile["pstats"], media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.prof"'})
 
 # --- Portion Calculation ---
 @portions_router.get("/{meal_id}/calculate", response_model=schemas.PortionCalculationResponse)
+@profiling.profiled
 def calculate_portions_for_meal_route(
     meal_id: int,
     db: Session = Depends(get_db),
@@ -593,14 +945,40 @@ def calculate_portions_for_meal_route(
     return schemas.PortionCalculationResponse(meal_id=meal.id, meal_name=meal.name, calculable_portions=portions)
 
 @portions_router.get("/all/all/calculate", response_model=List[schemas.PortionCalculationResponse])
+@profiling.profiled
 def calculate_portions_for_all_meals_route(
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_authenticated_user)
 ):
     return utils.calculate_portions_for_all_meals(db)
 
+@portions_router.post("/plan", response_model=schemas.MenuPlanResponse)
+def plan_menu_route(
+    plan_request: schemas.MenuPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    """Taomlar umumiy mahsulotlar uchun raqobatlashishini hisobga olgan holda eng ko'p porsiyali rejani tuzadi."""
+    try:
+        return planning.plan_menu(db, plan_request)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@portions_router.post("/simulate", response_model=schemas.SimulationResponse)
+def simulate_portions_route(
+    simulation: schemas.SimulationRequest,
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    """Taxminiy kirim, retsept o'zgarishi va ovqat berishlarning ta'sirini bazaga yozmasdan hisoblaydi."""
+    try:
+        return planning.simulate(db, simulation)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 # --- Reports and Visualization Data Endpoints ---
 @reports_router.get("/ingredient_consumption", response_model=List[schemas.DailyConsumptionDataPoint]) 
+@profiling.profiled
 def ingredient_consumption_report_route(
     product_id: int,
     start_date: datetime.date = Query(...),
@@ -608,7 +986,6 @@ def ingredient_consumption_report_route(
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_manager_user)
 ):
-    consumption_data_list = utils.get_ingredient_consumption_data(db, product_id, start_date, end_date)
     product = crud.get_product(db, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with ID {product_id} not found.")
@@ -643,6 +1020,14 @@ async def read_audit_logs(
     )
     return logs
 
+@audit_logs_router.get("/retention/runs", response_model=List[schemas.RetentionRunMetrics], dependencies=[Depends(security.get_current_platform_admin_user)])
+def read_retention_runs(limit: int = Query(20, ge=1, le=retention.MAX_STORED_RUNS)):
+    return retention.get_recent_runs(limit=limit)
+
+@audit_logs_router.get("/slow_queries", response_model=List[schemas.SlowQuery], dependencies=[Depends(security.get_current_platform_admin_user)])
+def read_slow_queries(limit: int = Query(50, ge=1, le=database.MAX_SLOW_QUERIES)):
+    return database.get_slow_queries(limit=limit)
+
 @reports_router.get("/product_delivery_history/{product_id}", response_model=List[schemas.ProductDelivery]) # product_id ni path ga o'tkazdim
 def product_delivery_history_route(
     product_id: int,
@@ -658,12 +1043,82 @@ def product_delivery_history_route(
 
 @reports_router.get("/monthly_summary", response_model=schemas.MonthlyReportSchema)
 def monthly_summary_report_route(
+    request: Request,
+    year: int = Query(..., ge=2020),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    return http_cache.cached_json_response(
+        request, (http_cache.SERVING_LOGS, http_cache.PRODUCTS, http_cache.MEALS), schemas.MonthlyReportSchema,
+        lambda: utils.generate_monthly_report_data(db, year, month)
+    )
+
+@reports_router.get("/costs/meals", response_model=List[schemas.MealCost])
+def meal_costs_report_route(
+    request: Request,
+    start_date: datetime.date = Query(...),
+    end_date: datetime.date = Query(...),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    """Davrdagi har bir taom tannarxi (kirim narxlari bo'yicha, FIFO). end_date ham kiradi."""
+    start, end = datetime.datetime.combine(start_date, datetime.time.min), datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+    return http_cache.cached_json_response(
+        request, (http_cache.SERVING_LOGS, http_cache.MEALS), List[schemas.MealCost],
+        lambda: costing.get_meal_costs(db, start, end)
+    )
+
+@reports_router.get("/costs/daily", response_model=List[schemas.DailyCost])
+def daily_costs_report_route(
+    request: Request,
+    start_date: datetime.date = Query(...),
+    end_date: datetime.date = Query(...),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    start, end = datetime.datetime.combine(start_date, datetime.time.min), datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+    return http_cache.cached_json_response(
+        request, (http_cache.SERVING_LOGS,), List[schemas.DailyCost],
+        lambda: costing.get_daily_costs(db, start, end)
+    )
+
+@reports_router.get("/costs/monthly", response_model=schemas.MonthlyCostReport)
+def monthly_costs_report_route(
+    request: Request,
+    year: int = Query(..., ge=2020),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    return http_cache.cached_json_response(
+        request, (http_cache.SERVING_LOGS, http_cache.MEALS), schemas.MonthlyCostReport,
+        lambda: costing.get_monthly_cost_report(db, year, month)
+    )
+
+@reports_router.get("/regional/monthly_summary", response_model=schemas.RegionalMonthlyReport)
+def regional_monthly_summary_route(
     year: int = Query(..., ge=2020),
     month: int = Query(..., ge=1, le=12),
+    current_user: database.User = Depends(security.get_current_regional_manager_user)
+):
+    """Barcha faol bog'chalar bo'yicha jami porsiyalar va mahsulot sarfi (bog'chalar parallel hisoblanadi)."""
+    return regional.generate_regional_monthly_report(year, month)
+
+@reports_router.get("/forecast", response_model=List[schemas.ProductForecast])
+def product_forecast_route(
+    window_days: int = Query(28, ge=7, le=365, description="Sarf tezligi hisoblanadigan oxirgi kunlar soni"),
+    method: str = Query("ewma", pattern="^(ewma|sma)$", description="ewma - eksponensial silliqlash, sma - oddiy o'rtacha"),
+    alpha: float = Query(0.2, gt=0, le=1),
+    lead_time_days: float = Query(3.0, ge=0, description="Buyurtmadan yetkazib berishgacha kunlar"),
+    cover_days: float = Query(7.0, ge=0, description="Buyurtma necha kunlik sarfni qoplashi kerak"),
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_manager_user)
 ):
-    return utils.generate_monthly_report_data(db, year, month)
+    return forecast.compute_forecast(
+        db, window_days=window_days, method=method, alpha=alpha,
+        lead_time_days=lead_time_days, cover_days=cover_days
+    )
 
 @reports_router.get("/meal_serving_logs", response_model=List[schemas.MealServingLogSchema])
 def get_all_meal_serving_logs_route(
@@ -690,11 +1145,25 @@ def get_all_meal_serving_logs_route(
 # --- Alerts Endpoints ---
 @alerts_router.get("/low_stock", response_model=List[schemas.LowStockAlert])
 def low_stock_alerts_route(
-    minimum_threshold: Optional[int] = Query(utils.MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS, ge=0),
+    request: Request,
+    response: Response,
+    minimum_threshold: Optional[int] = Query(None, ge=0, description="Berilmasa, har bir mahsulotning o'z chegarasi ishlatiladi"),
+    db: Session = Depends(get_db),
+    current_user: database.User = Depends(security.get_current_manager_user)
+):
+    etag, alerts = stock_cache.get_low_stock_alerts(db, minimum_threshold_grams=minimum_threshold)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return alerts
+@alerts_router.get("/expiring", response_model=List[schemas.ExpiringLotAlert])
+def expiring_lots_alerts_route(
+    within_days: int = Query(3, ge=0, le=365, description="Muddati shuncha kun ichida tugaydigan lotlar; o'tganlari ham qaytadi"),
     db: Session = Depends(get_db),
     current_user: database.User = Depends(security.get_current_manager_user)
 ):
-    return utils.check_low_stock_alerts(db, minimum_threshold_grams=minimum_threshold)
+    return utils.get_expiring_lot_alerts(db, within_days)
+
 @alerts_router.get("/potential_abuse", 
                    response_model=Optional[schemas.PotentialAbuseAlert],
                    responses={
@@ -722,6 +1191,7 @@ def low_stock_alerts_route(
                            }
                        }
                    })
+@profiling.profiled
 def potential_abuse_alert_route(
     year: int = Query(..., description="Tekshirish uchun yil", ge=2020),
     month: int = Query(..., description="Tekshirish uchun oy", ge=1, le=12),
@@ -748,6 +1218,64 @@ async def read_all_product_deliveries(
         limit=commons.limit
     )
     return deliveries
+# --- Live Events (Server-Sent Events) ---
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+
+@events_router.post("/ticket", response_model=schemas.EventStreamTicket)
+def event_stream_ticket_route(current_user: database.User = Depends(security.get_authenticated_user)):
+    """EventSource uchun qisqa muddatli chipta: GET /events/stream?ticket=..."""
+    return {"ticket": security.create_event_stream_ticket(current_user), "expires_in": security.EVENT_STREAM_TICKET_EXPIRE_SECONDS}
+
+def _open_event_stream(ticket: Optional[str], auth_header: Optional[str]) -> List[dict]:
+    """Foydalanuvchini tekshiradi va boshlang'ich qoldiqlarni qaytaradi. Sinxron baza ishi - threadpool'da chaqiriladi."""
+    if ticket:
+        token, scope = ticket, security.EVENT_STREAM_SCOPE
+    elif auth_header and auth_header.startswith("Bearer "):
+        token, scope = auth_header.split(" ", 1)[1], None
+    else:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    # Sessiya oqim davomida ochiq qolmasligi uchun faqat autentifikatsiya va boshlang'ich holat uchun ishlatiladi
+    db = database.new_session()
+    try:
+        user = security.get_user_from_token(db, token, scope=scope)
+        if not user.is_active:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+        return stock_cache.get_stock_levels(db)
+    finally:
+        db.close()
+
+@events_router.get("/stream")
+async def event_stream_route(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="POST /events/ticket dan olingan chipta (EventSource sarlavha yubora olmaydi)"),
+):
+    """
+    Qoldiq o'zgarishlari (stock_changed), ovqat berish (meal_served) va kam qolganlik
+    holati o'zgarishlari (low_stock) oqimi. Ulanganda joriy qoldiqlar 'snapshot' hodisasi bilan yuboriladi.
+    Autentifikatsiya: ?ticket= yoki Authorization: Bearer sarlavhasi.
+    """
+    initial_stock = await run_in_threadpool(_open_event_stream, ticket, request.headers.get("Authorization"))
+    subscriber = events.subscribe()
+
+    async def event_generator():
+        try:
+            yield "retry: 3000\n\n"
+            yield events.format_sse("snapshot", {"products": initial_stock})
+            while True:
+                message = await subscriber.next_message(timeout=EVENT_STREAM_KEEPALIVE_SECONDS)
+                if await request.is_disconnected():
+                    break
+                yield message if message is not None else ": keepalive\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --- Routers ni asosiy app ga qo'shish ---
 app.include_router(auth_router)
 app.include_router(users_router)
@@ -758,8 +1286,14 @@ app.include_router(portions_router)
 app.include_router(reports_router)
 app.include_router(alerts_router)
 app.include_router(audit_logs_router)
+app.include_router(events_router)
+app.include_router(sync_router)
+app.include_router(changes_router)
+app.include_router(metrics_router)
+app.include_router(debug_router)
+app.include_router(tenants_router)
 
 if __name__ == "__main__":
     import uvicorn
-    print("MAIN.PY: Uvicorn ishga tushirilmoqda http://127.0.0.1:8000")
+    logger.info("Uvicorn ishga tushirilmoqda http://127.0.0.1:8000")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Prometheus matn formatidagi operatsion metrikalar (GET /metrics).
+
+Hisoblagichlar jarayon ichida saqlanadi va yozish paytida qulf olinmaydi: har bir
+thread o'z "shard"iga (oddiy dict) yozadi, /metrics so'ralganda esa barcha
+shardlar yig'iladi. Qulf faqat thread birinchi marta metrikaga yozganda (shard
+ro'yxatga olinadi) va yig'ish paytida ishlatiladi, shuning uchun issiq yo'lda
+narxi - bitta dict yangilash.
+
+Bir nechta uvicorn worker ishlasa, har bir worker o'z qiymatlarini qaytaradi.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshot_shards(self) -> List[dict]:
+        with self._shards_lock:
+            return [dict(shard) for shard in self._shards]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshot_shards():
+            for labelvalues, value in shard.items():
+                totals[labelvalues] = totals.get(labelvalues, 0.0) + value
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(totals.items())
+        ]
+
+
+class Gauge(Counter):
+    """Oshib-kamayuvchi qiymat (shardlar yig'indisi). Funksiyadan o'qiladigan gauge uchun set_function()."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        shard = self._shard()
+        entry = shard.get(labelvalues)
+        if entry is None:
+            entry = shard[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Bucket'lar o'zaro kesishmaydi, yig'ishda kumulyativ qilinadi
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        return _Timer(self, labelvalues)
+
+    def _samples(self) -> List[str]:
+        totals: Dict[LabelValues, list] = {}
+        for shard in self._snapshot_shards():
+            for labelvalues, (counts, value_sum) in shard.items():
+                total = totals.setdefault(labelvalues, [[0] * (len(self.buckets) + 1), 0.0])
+                total[0] = [a + b for a, b in zip(total[0], counts)]
+                total[1] += value_sum
+        lines = []
+        for labelvalues, (counts, value_sum) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(value_sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labelvalues: LabelValues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+_registry: List[_Metric] = []
+
+
+def register(metric: _Metric) -> _Metric:
+    _registry.append(metric)
+    return metric
+
+
+def render_latest() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Ilova metrikalari ---
+HTTP_REQUEST_DURATION = register(Histogram(
+    "bogcha_http_request_duration_seconds", "HTTP so'rovlarni bajarish vaqti (route shabloni bo'yicha).",
+    ("method", "route", "status"),
+))
+HTTP_REQUESTS_IN_FLIGHT = register(Gauge(
+    "bogcha_http_requests_in_flight", "Hozir bajarilayotgan HTTP so'rovlar soni.",
+))
+DB_POOL_CHECKOUT_WAIT = register(Histogram(
+    "bogcha_db_pool_checkout_wait_seconds", "Ulanishlar pool'idan ulanish olishni kutish vaqti.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+))
+DB_POOL_CHECKED_OUT = register(Gauge(
+    "bogcha_db_pool_connections_checked_out", "Pool'dan olingan (band) ulanishlar soni.",
+))
+AUDIT_WRITES_PENDING = register(Gauge(
+    "bogcha_audit_log_writes_pending", "Navbatda turgan yoki yozilayotgan audit log yozuvlari soni.",
+))
+SCHEDULER_JOB_DURATION = register(Histogram(
+    "bogcha_scheduler_job_duration_seconds", "Rejalashtirilgan vazifalarning bajarilish vaqti.",
+    ("job", "success"), buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+))
+MEAL_SERVINGS = register(Counter(
+    "bogcha_meal_servings_total", "Muvaffaqiyatli ovqat berishlar soni.", ("source",),
+))
+MEAL_PORTIONS_SERVED = register(Counter(
+    "bogcha_meal_portions_served_total", "Berilgan porsiyalar soni.", ("source",),
+))
+STOCK_DEDUCTION_FAILURES = register(Counter(
+    "bogcha_stock_deduction_failures_total", "Ovqat berishda ingredientlarni ayrish muvaffaqiyatsiz bo'lgan holatlar.",
+    ("reason",),
+))
+SCHEDULER_LEADER = register(Gauge(
+    "bogcha_scheduler_leader", "Shu worker rejalashtirilgan vazifalar yetakchisi bo'lsa 1, aks holda 0.",
+))
@@ -0,0 +1,584 @@
+"""
+Ma'lumotlar bazasi sxemasi migratsiyalari.
+
+Har bir migratsiya tartib raqami (version) bilan ro'yxatga olinadi va bir marta, o'z
+tranzaksiyasida bajariladi; bajarilganlari schema_version jadvaliga yoziladi. Ilova
+ishga tushganda faqat bitta so'rov bilan joriy versiya tekshiriladi (check_schema):
+sxema eng so'nggi bo'lsa, hech narsa qilinmaydi - jadval yaratish, standart
+foydalanuvchilarni qidirish va bcrypt xeshlash har bir ishga tushishda takrorlanmaydi.
+
+Migratsiyalar alohida buyruq bilan qo'llanadi:
+    python migrations.py upgrade     # Barcha kutilayotgan migratsiyalarni qo'llash
+    python migrations.py current     # Joriy versiya
+    python migrations.py history     # Migratsiyalar ro'yxati va holati
+
+BOGCHA_AUTO_MIGRATE=1 (standart) bo'lsa, ilova ishga tushganda kutilayotgan migratsiyalarni
+o'zi qo'llaydi (lokal ishlash uchun qulay). Production'da 0 qo'yib, deploy paytida
+`python migrations.py upgrade` ni bir marta bajarish tavsiya etiladi; shunda sxema eski
+bo'lsa worker ishga tushmaydi.
+
+Yangi migratsiya qo'shish: funksiyani @migration(<keyingi raqam>, "<nom>") bilan belgilang.
+Funksiya SQLAlchemy Connection oladi. Runner uni schema_version yozuvi bilan bitta
+tranzaksiyada bajaradi, shuning uchun migratsiya bir marta qo'llanadi; shunga qaramay
+qayta bajarilganda ma'lumotni buzmasligi kerak: jadval, ustun va indekslar mavjudligi
+tekshiriladi, qiymatlarni o'zgartirish esa belgi bilan himoyalanadi (8-migratsiyaga qarang).
+Migratsiya joriy modellarni (database.py) ishlatmaydi: kerakli jadval, ustun va indekslarni
+o'zi aniq ko'rsatadi (pastdagi "muzlatilgan jadvallar"), aks holda keyinroq qo'shilgan
+ustunlar eski migratsiyalarga ham tushib qoladi.
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, UniqueConstraint,
+    bindparam, column, func, inspect, literal, select, table, text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+import database
+import units
+
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv("BOGCHA_AUTO_MIGRATE", "1").lower() in ("1", "true", "yes")
+
+# schema_version modellar metadata'sidan tashqarida: create_all uni yaratmaydi va o'chirmaydi
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+Migration = Tuple[int, str, Callable[[Connection], None]]
+_migrations: List[Migration] = []
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+def migration(version: int, name: str):
+    def register(function: Callable[[Connection], None]):
+        if _migrations and version != _migrations[-1][0] + 1:
+            raise ValueError(f"Migration versions must be sequential: expected {_migrations[-1][0] + 1}, got {version}.")
+        _migrations.append((version, name, function))
+        return function
+    return register
+
+
+def latest_version() -> int:
+    return _migrations[-1][0] if _migrations else 0
+
+
+def get_migrations() -> List[Migration]:
+    return list(_migrations)
+
+
+# --- Yordamchi funksiyalar ---
+def add_column_if_missing(conn: Connection, table_name: str, column: Column) -> bool:
+    existing_columns = {col["name"] for col in inspect(conn).get_columns(table_name)}
+    if column.name in existing_columns:
+        return False
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+    logger.info("'%s.%s' ustuni qo'shildi.", table_name, column.name)
+    return True
+
+
+def create_indexes(conn: Connection, table) -> None:
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def create_index(conn: Connection, table_name: str, index_name: str, *column_names: str, unique: bool = False, **dialect_kwargs) -> None:
+    """Bitta indeks (mavjud bo'lsa o'tkazib yuboriladi). dialect_kwargs - masalan, sqlite_where / postgresql_where."""
+    index_table = Table(table_name, MetaData(), *(Column(name) for name in column_names))
+    Index(index_name, *(index_table.c[name] for name in column_names), unique=unique, **dialect_kwargs).create(bind=conn, checkfirst=True)
+
+
+# --- Muzlatilgan jadvallar ---
+# Migratsiya jadvalni o'z versiyasidagi ta'rif bilan yaratadi: modellar (database.py) keyin o'zgarsa ham,
+# eski bazada uni qayta bajarish natijasi o'zgarmaydi. Bu yerdagi ta'riflar o'zgartirilmaydi - o'zgarish yangi migratsiyada.
+_frozen = MetaData()
+
+# 1-migratsiya: schema_version joriy qilingan paytdagi sxema (miqdorlar gramm, float; tenant_id yo'q)
+_v1_users = Table(
+    "users", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("role", Enum("admin", "chef", "manager", name="userrole"), nullable=False),
+    Column("is_active", Boolean, default=True),
+)
+_v1_products = Table(
+    "products", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True, nullable=False),
+    Column("quantity_grams", Float, nullable=False, default=0.0, index=True),
+    Column("min_stock_grams", Float, nullable=True),
+    Column("delivery_date", DateTime),
+)
+_v1_product_deliveries = Table(
+    "product_deliveries", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
+    Column("quantity_received", Float, nullable=False),
+    Column("delivery_date", DateTime),
+    Column("supplier", String, nullable=True),
+)
+_v1_audit_logs = Table(
+    "audit_logs", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("timestamp", DateTime),
+    Column("username", String, nullable=True, index=True),
+    Column("method", String, index=True),
+    Column("endpoint_path", String, index=True),
+    Column("client_host", String, nullable=True),
+    Column("user_agent", String, nullable=True),
+    Column("details", Text, nullable=False),
+)
+_v1_meals = Table(
+    "meals", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True, nullable=False),
+)
+_v1_meal_ingredients = Table(
+    "meal_ingredients", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("meal_id", Integer, ForeignKey("meals.id"), nullable=False),
+    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
+    Column("required_grams", Float, nullable=False),
+)
+_v1_meal_serving_logs = Table(
+    "meal_serving_logs", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("meal_id", Integer, ForeignKey("meals.id"), nullable=False),
+    Column("served_by_user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("serving_time", DateTime),
+    Column("portions_served", Integer, nullable=False, default=1),
+)
+_v1_daily_product_consumption = Table(
+    "daily_product_consumption", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("day", Date, nullable=False, index=True),
+    Column("consumed_grams", Float, nullable=False, default=0.0),
+    UniqueConstraint("product_id", "day", name="uq_daily_product_consumption_product_day"),
+)
+_v1_rollup_state = Table(
+    "rollup_state", _frozen,
+    Column("name", String, primary_key=True),
+    Column("last_processed_id", Integer, nullable=False, default=0),
+    Column("updated_at", DateTime),
+)
+_v1_idempotency_keys = Table(
+    "idempotency_keys", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("key", String, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("method", String, nullable=False),
+    Column("path", String, nullable=False),
+    Column("request_fingerprint", String, nullable=False),
+    Column("status_code", Integer, nullable=True),
+    Column("response_body", Text, nullable=True),
+    Column("created_at", DateTime, index=True),
+    Column("expires_at", DateTime, nullable=False, index=True),
+    UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+)
+_v1_change_log = Table(
+    "change_log", _frozen,
+    Column("seq", Integer, primary_key=True),
+    Column("entity", String, nullable=False),
+    Column("entity_id", Integer, nullable=False),
+    Column("op", Enum("upsert", "delete", name="changeop"), nullable=False),
+    Column("changed_at", DateTime, nullable=False, index=True),
+    sqlite_autoincrement=True,
+)
+_V1_TABLES = (
+    _v1_users, _v1_products, _v1_product_deliveries, _v1_audit_logs, _v1_meals, _v1_meal_ingredients,
+    _v1_meal_serving_logs, _v1_daily_product_consumption, _v1_rollup_state, _v1_idempotency_keys, _v1_change_log,
+)
+
+_v3_scheduler_leases = Table(
+    "scheduler_leases", _frozen,
+    Column("name", String, primary_key=True),
+    Column("holder", String, nullable=False),
+    Column("acquired_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+)
+_v4_tenants = Table(
+    "tenants", _frozen,
+    Column("id", Integer, primary_key=True),
+    Column("slug", String, unique=True, nullable=False),
+    Column("name", String, nullable=False),
+    Column("is_active", Boolean, default=True, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+_v5_lot_allocations = Table(
+    "lot_allocations", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("serving_log_id", Integer, ForeignKey("meal_serving_logs.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("delivery_id", Integer, ForeignKey("product_deliveries.id", ondelete="SET NULL"), nullable=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+    Column("meal_id", Integer, ForeignKey("meals.id"), nullable=False),
+    Column("served_at", DateTime, nullable=False),
+    Column("allocated_grams", Float, nullable=False),
+    Column("cost", Float, nullable=True),
+    Column("tenant_id", Integer, nullable=False),
+    Index("ix_lot_allocations_tenant_served_at", "tenant_id", "served_at"),
+)
+_v7_product_unit_conversions = Table(
+    "product_unit_conversions", _frozen,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+    Column("unit", String, nullable=False),
+    Column("base_units_per_unit", Float, nullable=False),
+    Column("tenant_id", Integer, nullable=False),
+    UniqueConstraint("product_id", "unit", name="uq_product_unit_conversions_product_unit"),
+)
+_v8_milli_unit_columns = Table(
+    "milli_unit_columns", _frozen,
+    Column("table_name", String, primary_key=True),
+    Column("column_name", String, primary_key=True),
+)
+
+
+# --- Migratsiyalar ---
+@migration(1, "baseline_schema")
+def _baseline_schema(conn: Connection) -> None:
+    """Boshlang'ich jadvallarni yaratadi; schema_version'dan oldingi bazalarga yetishmagan ustun va indekslarni qo'shadi."""
+    change_log_existed = inspect(conn).has_table(_v1_change_log.name)
+    existing_tables = set(inspect(conn).get_table_names())
+    _frozen.create_all(bind=conn, tables=list(_V1_TABLES))
+    for table in _V1_TABLES:
+        if table.name not in existing_tables:
+            continue
+        for column in table.columns:
+            add_column_if_missing(conn, table.name, column)
+        create_indexes(conn, table)
+    if not change_log_existed:
+        # Mavjud yozuvlar uchun 'upsert' qatorlari - since=0 to'liq holatni beradi
+        now = datetime.datetime.utcnow()
+        for entity, table in (("products", _v1_products), ("deliveries", _v1_product_deliveries),
+                              ("meals", _v1_meals), ("users", _v1_users)):
+            conn.execute(_v1_change_log.insert().from_select(
+                ["entity", "entity_id", "op", "changed_at"],
+                select(literal(entity), table.c.id, literal("upsert"), literal(now, DateTime)).order_by(table.c.id),
+            ))
+        logger.info("change_log jadvali mavjud yozuvlar bilan to'ldirildi.")
+
+
+@migration(2, "seed_default_users")
+def _seed_default_users(conn: Connection) -> None:
+    if conn.get_execution_options().get("tenant_database"):
+        return  # Alohida tenant bazasi: foydalanuvchilar tenant yaratilganda qo'shiladi (tenancy.create_tenant)
+    import security
+
+    existing = {row[0] for row in conn.execute(select(_v1_users.c.username))}
+    for username, password, role in (
+        ("admin", "adminpassword", "admin"),
+        ("chef", "chefpassword", "chef"),
+        ("manager", "managerpassword", "manager"),
+    ):
+        if username in existing:
+            continue
+        result = conn.execute(_v1_users.insert().values(
+            username=username, hashed_password=security.get_password_hash(password), role=role, is_active=True,
+        ))
+        conn.execute(_v1_change_log.insert().values(
+            entity="users", entity_id=result.inserted_primary_key[0], op="upsert", changed_at=datetime.datetime.utcnow(),
+        ))
+        logger.info("Standart foydalanuvchi yaratildi: %s", username)
+
+
+@migration(3, "scheduler_leases")
+def _scheduler_leases(conn: Connection) -> None:
+    _v3_scheduler_leases.create(bind=conn, checkfirst=True)
+
+
+@migration(4, "tenants")
+def _tenants(conn: Connection) -> None:
+    """Bog'chalar jadvali, tenant_id ustunlari va tenant bo'yicha indekslar; mavjud yozuvlar standart bog'chaga."""
+    _v4_tenants.create(bind=conn, checkfirst=True)
+    if conn.execute(select(_v4_tenants.c.id).where(_v4_tenants.c.id == database.DEFAULT_TENANT_ID)).first() is None:
+        conn.execute(_v4_tenants.insert().values(
+            id=database.DEFAULT_TENANT_ID, slug="default", name="Bog'cha", is_active=True,
+            created_at=datetime.datetime.utcnow(),
+        ))
+    for table_name in ("users", "products", "product_deliveries", "audit_logs", "meals", "meal_ingredients",
+                       "meal_serving_logs", "daily_product_consumption", "change_log"):
+        add_column_if_missing(conn, table_name, Column("tenant_id", Integer))
+        conn.execute(
+            text(f"UPDATE {table_name} SET tenant_id = :tenant_id WHERE tenant_id IS NULL"),
+            {"tenant_id": database.DEFAULT_TENANT_ID},
+        )
+    # Nomlar endi faqat bitta bog'cha ichida noyob: eski global unique indekslar o'rniga (tenant_id, nom)
+    for index_name in ("ix_users_username", "ix_products_name", "ix_meals_name"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    create_index(conn, "users", "ix_users_tenant_username", "tenant_id", "username", unique=True)
+    create_index(conn, "products", "ix_products_tenant_name", "tenant_id", "name", unique=True)
+    create_index(conn, "meals", "ix_meals_tenant_name", "tenant_id", "name", unique=True)
+    create_index(conn, "product_deliveries", "ix_product_deliveries_tenant_date", "tenant_id", "delivery_date")
+    create_index(conn, "audit_logs", "ix_audit_logs_tenant_timestamp", "tenant_id", "timestamp")
+    create_index(conn, "meal_ingredients", "ix_meal_ingredients_tenant_meal", "tenant_id", "meal_id")
+    create_index(conn, "meal_serving_logs", "ix_meal_serving_logs_tenant_time", "tenant_id", "serving_time")
+    create_index(conn, "daily_product_consumption", "ix_daily_product_consumption_tenant_day", "tenant_id", "day")
+    create_index(conn, "change_log", "ix_change_log_tenant_seq", "tenant_id", "seq")
+
+
+
+@migration(5, "delivery_lots")
+def _delivery_lots(conn: Connection) -> None:
+    """
+    Kirim narxi va lot qoldig'i, lot_allocations jadvali. Mavjud qoldiq FIFO bo'yicha eng yangi
+    kirimlarga taqsimlanadi (eskilari allaqachon sarflangan deb hisoblanadi).
+    """
+    add_column_if_missing(conn, "product_deliveries", Column("unit_price", Float))
+    add_column_if_missing(conn, "product_deliveries", Column("remaining_grams", Float))
+    _v5_lot_allocations.create(bind=conn, checkfirst=True)
+
+    # Bu paytda miqdorlar hali gramm (float); milli-birliklarga 8-migratsiya o'tkazadi
+    deliveries = table("product_deliveries", column("id"), column("product_id"), column("quantity_received"),
+                       column("delivery_date"), column("remaining_grams"))
+    stock = dict(conn.execute(text("SELECT id, quantity_grams FROM products")).all())
+    rows = conn.execute(
+        select(deliveries.c.id, deliveries.c.product_id, deliveries.c.quantity_received)
+        .where(deliveries.c.remaining_grams.is_(None))
+        .order_by(deliveries.c.product_id, deliveries.c.delivery_date.desc(), deliveries.c.id.desc())
+    ).all()
+    updates = []
+    for delivery_id, product_id, quantity_received in rows:
+        left = max(stock.get(product_id) or 0.0, 0.0)
+        remaining = min(quantity_received, left)
+        stock[product_id] = left - remaining
+        updates.append({"delivery_id": delivery_id, "remaining": remaining})
+    if updates:
+        conn.execute(
+            deliveries.update().where(deliveries.c.id == bindparam("delivery_id")).values(remaining_grams=bindparam("remaining", type_=Float)),
+            updates,
+        )
+    create_index(
+        conn, "product_deliveries", "ix_product_deliveries_open_lots", "product_id", "delivery_date", "id",
+        sqlite_where=text("remaining_grams > 0"), postgresql_where=text("remaining_grams > 0"),
+    )
+
+
+
+@migration(6, "delivery_expiry")
+def _delivery_expiry(conn: Connection) -> None:
+    """Kirim (lot) yaroqlilik muddati va muddati yaqin ochiq lotlar uchun qisman indeks."""
+    add_column_if_missing(conn, "product_deliveries", Column("expiry_date", Date))
+    create_index(
+        conn, "product_deliveries", "ix_product_deliveries_expiring", "tenant_id", "expiry_date",
+        sqlite_where=text("remaining_grams > 0 AND expiry_date IS NOT NULL"),
+        postgresql_where=text("remaining_grams > 0 AND expiry_date IS NOT NULL"),
+    )
+
+
+@migration(7, "product_units")
+def _product_units(conn: Connection) -> None:
+    """Mahsulot asosiy birligi (mavjud mahsulotlar - gramm) va qo'shimcha birliklar jadvali."""
+    add_column_if_missing(conn, "products", Column("unit", String))
+    conn.execute(text("UPDATE products SET unit = 'g' WHERE unit IS NULL"))
+    _v7_product_unit_conversions.create(bind=conn, checkfirst=True)
+
+
+# 8-migratsiya paytidagi miqdor ustunlari (database.MilliUnits)
+_V8_MILLI_COLUMNS = (
+    ("products", "quantity_grams"), ("products", "min_stock_grams"),
+    ("product_deliveries", "quantity_received"), ("product_deliveries", "remaining_grams"),
+    ("meal_ingredients", "required_grams"), ("lot_allocations", "allocated_grams"),
+    ("daily_product_consumption", "consumed_grams"),
+)
+
+
+@migration(8, "integer_quantities")
+def _integer_quantities(conn: Connection) -> None:
+    """
+    Miqdorlar gramm (float) o'rniga butun milli-birlikda (database.MilliUnits). Mavjud qiymatlar
+    1000 ga ko'paytirilib yaxlitlanadi. PostgreSQL'da ustun turi BIGINT'ga o'zgartiriladi; SQLite
+    ustun turini o'zgartira olmaydi - eski REAL ustunlarda butun qiymatlar aniq saqlanadi.
+    O'tkazilgan ustun milli_unit_columns jadvalida belgilanadi: SQLite'da ustun turidan bilib bo'lmaydi,
+    qayta bajarilganda esa qiymatlar ikkinchi marta 1000 ga ko'paytirilmasligi kerak.
+    """
+    _v8_milli_unit_columns.create(bind=conn, checkfirst=True)
+    markers = _v8_milli_unit_columns
+    converted = {tuple(row) for row in conn.execute(select(markers.c.table_name, markers.c.column_name))}
+    for table_name, column_name in _V8_MILLI_COLUMNS:
+        if (table_name, column_name) in converted:
+            continue
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE BIGINT "
+                f"USING ROUND({column_name} * {units.MILLI})"
+            ))
+        else:
+            conn.execute(text(
+                f"UPDATE {table_name} SET {column_name} = ROUND({column_name} * {units.MILLI}) "
+                f"WHERE {column_name} IS NOT NULL"
+            ))
+        conn.execute(markers.insert().values(table_name=table_name, column_name=column_name))
+        logger.info("'%s.%s' milli-birliklarga o'tkazildi.", table_name, column_name)
+
+
+@migration(9, "consumption_rollup_flag")
+def _consumption_rollup_flag(conn: Connection) -> None:
+    """
+    Kunlik sarf watermark (rollup_state) o'rniga har bir logdagi bayroq bilan yig'iladi. Eski watermark'gacha
+    yig'ilgan loglar belgilanadi, qolganlari keyingi forecast.refresh_daily_rollups'da LotAllocation'dan yig'iladi.
+    """
+    add_column_if_missing(conn, "meal_serving_logs", Column("consumption_rolled_up", Boolean))
+    logs = table("meal_serving_logs", column("id"), column("tenant_id"), column("consumption_rolled_up", Boolean))
+    conn.execute(logs.update().where(logs.c.consumption_rolled_up.is_(None)).values(consumption_rolled_up=False))
+    # Nomlar: "daily_product_consumption" (standart bog'cha) va "daily_product_consumption:<tenant_id>"
+    rollup_state = table("rollup_state", column("name"), column("last_processed_id"))
+    for name, last_processed_id in conn.execute(select(rollup_state.c.name, rollup_state.c.last_processed_id)).all():
+        prefix, _, tenant_part = name.partition(":")
+        if prefix != "daily_product_consumption":
+            continue
+        tenant_id = int(tenant_part) if tenant_part else database.DEFAULT_TENANT_ID
+        conn.execute(
+            logs.update()
+            .where(logs.c.tenant_id == tenant_id, logs.c.id <= last_processed_id)
+            .values(consumption_rolled_up=True)
+        )
+    create_index(
+        conn, "meal_serving_logs", "ix_meal_serving_logs_pending_rollup", "tenant_id", "id",
+        sqlite_where=text("consumption_rolled_up = 0"), postgresql_where=text("NOT consumption_rolled_up"),
+    )
+
+
+@migration(10, "platform_users")
+def _platform_users(conn: Connection) -> None:
+    """
+    Platforma (barcha bog'chalar) huquqi endi foydalanuvchidagi aniq bayroq. Avval bu huquq standart
+    bog'chaning admin va menejerlariga berilgan edi - mavjud bazalarda ular belgilanadi.
+    """
+    added = add_column_if_missing(conn, "users", Column("is_platform", Boolean))
+    users = table("users", column("role"), column("tenant_id"), column("is_platform", Boolean))
+    conn.execute(users.update().where(users.c.is_platform.is_(None)).values(is_platform=False))
+    # Faqat ustun qo'shilganda: qayta bajarilsa, keyin olib qo'yilgan huquq qaytarilmaydi
+    if added and not conn.get_execution_options().get("tenant_database"):
+        conn.execute(
+            users.update()
+            .where(users.c.tenant_id == database.DEFAULT_TENANT_ID, users.c.role.in_(["admin", "manager"]))
+            .values(is_platform=True)
+        )
+
+
+# --- Bajarish ---
+def current_version(bind) -> int:
+    """Bitta so'rov. schema_version jadvali bo'lmasa 0 qaytaradi."""
+    try:
+        with bind.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+
+def _lock_for_migration(conn: Connection) -> None:
+    """Bir nechta worker bir vaqtda migratsiya qilmasligi uchun yozish qulfi."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("LOCK TABLE schema_version IN EXCLUSIVE MODE"))
+
+
+def upgrade(engine: Optional[Engine] = None, target: Optional[int] = None, tenant_database: bool = False) -> List[int]:
+    """
+    Kutilayotgan migratsiyalarni tartib bilan qo'llaydi va qo'llanganlar versiyalarini qaytaradi.
+    tenant_database=True - bitta bog'chaning alohida bazasi (database.TENANT_DATABASE_URL).
+    """
+    engine = engine or database.engine
+    target = latest_version() if target is None else target
+    _metadata.create_all(bind=engine)
+    applied = []
+    for version, name, function in _migrations:
+        if version > target:
+            break
+        with engine.begin() as conn:
+            conn.execution_options(tenant_database=tenant_database)
+            _lock_for_migration(conn)
+            done = conn.execute(select(schema_version.c.version).where(schema_version.c.version == version)).first()
+            if done is not None:
+                continue  # Boshqa worker allaqachon qo'llagan
+            logger.info("Migratsiya %s (%s) qo'llanmoqda...", version, name)
+            function(conn)
+            conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+def upgrade_all(target: Optional[int] = None) -> List[int]:
+    """Umumiy bazani, alohida bazalar rejimida esa har bir bog'cha bazasini ham yangilaydi."""
+    applied = upgrade(target=target)
+    if database.TENANT_DATABASE_URL is not None:
+        with database.engine.connect() as conn:
+            tenant_ids = [row[0] for row in conn.execute(select(database.Tenant.id).order_by(database.Tenant.id))]
+        for tenant_id in tenant_ids:
+            if database.tenant_database_url(tenant_id) is None:
+                continue  # Standart bog'cha umumiy bazada
+            tenant_engine = database.create_database_engine(database.tenant_database_url(tenant_id))
+            try:
+                tenant_applied = upgrade(tenant_engine, target=target, tenant_database=True)
+            finally:
+                tenant_engine.dispose()
+            if tenant_applied:
+                logger.info("%s-bog'cha bazasi: %s migratsiya qo'llandi.", tenant_id, tenant_applied)
+    return applied
+
+
+def check_schema(engine: Optional[Engine] = None, auto_migrate: Optional[bool] = None, tenant_database: bool = False) -> int:
+    """
+    Ilova ishga tushganda chaqiriladi: joriy versiyani bitta so'rov bilan tekshiradi. Sxema eski bo'lsa,
+    auto_migrate yoqilgan holda migratsiyalarni qo'llaydi, aks holda SchemaOutOfDateError ko'taradi.
+    """
+    engine = engine or database.engine
+    auto_migrate = AUTO_MIGRATE if auto_migrate is None else auto_migrate
+    version = current_version(engine)
+    if version == latest_version():
+        return version
+    if version > latest_version():
+        raise SchemaOutOfDateError(
+            f"Database schema version {version} is newer than this code ({latest_version()}). Deploy the newer code."
+        )
+    if not auto_migrate:
+        raise SchemaOutOfDateError(
+            f"Database schema version {version} is behind {latest_version()}. Run 'python migrations.py upgrade'."
+        )
+    upgrade(engine, tenant_database=tenant_database)
+    return latest_version()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bog'cha CRM baza sxemasi migratsiyalari.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="Kutilayotgan migratsiyalarni qo'llash")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="Shu versiyagacha (standart: eng so'nggi)")
+    subparsers.add_parser("current", help="Joriy sxema versiyasi")
+    subparsers.add_parser("history", help="Migratsiyalar ro'yxati")
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        applied = upgrade_all(target=args.to)
+        print(f"Qo'llandi: {applied or 'hech narsa'}. Joriy versiya: {current_version(database.engine)}")
+    elif args.command == "current":
+        print(f"{current_version(database.engine)} (eng so'nggi: {latest_version()})")
+    else:
+        version = current_version(database.engine)
+        for number, name, _ in _migrations:
+            state = "qo'llangan" if number <= version else "kutilmoqda"
+            print(f"{number:4d}  {name:30s} {state}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    sys.exit(main())
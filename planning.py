@@ -0,0 +1,288 @@
+"""
+Menyu rejalashtirish: mavjud qoldiq bilan eng ko'p porsiya berish.
+
+utils.calculate_portions_for_all_meals har bir taomni alohida hisoblaydi va
+taomlar bir xil mahsulotlar uchun raqobatlashishini hisobga olmaydi. Bu yerda
+taqsimot chiziqli dastur sifatida yechiladi:
+
+    maksimallashtirish  sum(x_m)
+    shartlar            sum_m(gramm[m, p] * x_m) <= qoldiq[p]   (har bir mahsulot uchun)
+                        0 <= x_m <= so'ralgan[m]
+
+Bir taomning turli kunlardagi so'rovlari bitta o'zgaruvchiga birlashtiriladi
+(ularning ustunlari bir xil), shuning uchun masala hajmi taomlar soniga bog'liq,
+kunlar soniga emas. LP yechimi pastga yaxlitlanadi, so'ng qolgan qoldiq bilan
+kunlar tartibida ochko'z (greedy) to'ldiriladi - natija har doim bajariladigan reja.
+
+Shu yerda "what-if" simulyatsiyasi ham bor: taxminiy kirimlar, retsept o'zgarishlari
+va ovqat berishlar bazaga yozilmasdan, xotiradagi nusxa ustida baholanadi.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import crud, schemas, snapshot, stock_cache, units
+
+_EPS = 1e-9
+
+
+def load_stock_and_recipes(db: Session) -> Tuple[Dict[int, Tuple[str, float, Optional[float], str]], Dict[int, Tuple[str, List[Tuple[int, float]]]]]:
+    """
+    Qoldiq va retseptlarni ustunli nusxadan (snapshot) oladi, o'zgarish bo'lmasa bazaga murojaat qilinmaydi:
+    products: {product_id: (name, quantity_grams, min_stock_grams, unit)}, meals: {meal_id: (name, [(product_id, required_grams), ...])}
+    Miqdorlar mahsulotning asosiy birligida (unit).
+    """
+    current = snapshot.get_snapshot(db)
+    products = {
+        int(product_id): (name, units.from_milli(int(quantity)), None if np.isnan(threshold) else float(threshold), unit)
+        for product_id, name, unit, quantity, threshold in zip(
+            current.product_ids, current.product_names, current.product_units, current.stock, current.thresholds
+        )
+    }
+    meals = {
+        int(meal_id): (meal_name, [(product_id, grams) for product_id, grams in current.recipe(i) if product_id is not None])
+        for i, (meal_id, meal_name) in enumerate(zip(current.meal_ids, current.meal_names))
+    }
+    return products, meals
+
+
+def _solve_max_portions_lp(usage: np.ndarray, stock: np.ndarray, upper: np.ndarray, max_iterations: int = 10000) -> np.ndarray:
+    """
+    max sum(x)  s.t.  usage @ x <= stock,  x <= upper,  x >= 0  masalasini simpleks usulida yechadi.
+    usage: (mahsulotlar x taomlar). stock >= 0 bo'lgani uchun boshlang'ich bazis (x = 0) har doim joiz.
+    """
+    n_products, n_meals = usage.shape
+    n_rows = n_products + n_meals
+    # Jadval: [A | I | b], A = [usage; I_meals], oxirgi qator - maqsad funksiyasi (-c)
+    tableau = np.zeros((n_rows + 1, n_meals + n_rows + 1), dtype=np.float64)
+    tableau[:n_products, :n_meals] = usage
+    tableau[n_products:n_rows, :n_meals] = np.eye(n_meals)
+    tableau[:n_rows, n_meals:n_meals + n_rows] = np.eye(n_rows)
+    tableau[:n_products, -1] = stock
+    tableau[n_products:n_rows, -1] = upper
+    tableau[-1, :n_meals] = -1.0
+    basis = np.arange(n_meals, n_meals + n_rows)
+
+    for iteration in range(max_iterations):
+        costs = tableau[-1, :-1]
+        if iteration < max_iterations // 2:
+            entering = int(np.argmin(costs))  # Dantzig qoidasi
+            if costs[entering] >= -_EPS:
+                break
+        else:
+            candidates = np.nonzero(costs < -_EPS)[0]  # Bland qoidasi (aylanib qolmaslik uchun)
+            if candidates.size == 0:
+                break
+            entering = int(candidates[0])
+        column = tableau[:n_rows, entering]
+        positive = column > _EPS
+        if not positive.any():
+            break  # Cheklanmagan bo'lishi mumkin emas (x <= upper), xavfsizlik uchun
+        ratios = np.full(n_rows, np.inf)
+        ratios[positive] = tableau[:n_rows, -1][positive] / column[positive]
+        leaving = int(np.argmin(ratios))
+        tableau[leaving] /= tableau[leaving, entering]
+        factors = tableau[:, entering].copy()
+        factors[leaving] = 0.0
+        tableau -= np.outer(factors, tableau[leaving])
+        basis[leaving] = entering
+
+    solution = np.zeros(n_meals + n_rows)
+    solution[basis] = tableau[:n_rows, -1]
+    return np.clip(solution[:n_meals], 0.0, upper)
+
+
+def plan_menu(db: Session, plan_request: schemas.MenuPlanRequest) -> schemas.MenuPlanResponse:
+    products, meals = load_stock_and_recipes(db)
+
+    for item in plan_request.items:
+        if item.meal_id not in meals:
+            raise ValueError(f"Meal with ID {item.meal_id} not found.")
+        if not meals[item.meal_id][1]:
+            raise ValueError(f"Meal '{meals[item.meal_id][0]}' has no ingredients defined.")
+
+    # Kunlar tartibida; bir kunda - so'rovdagi tartibda
+    ordered_items = sorted(enumerate(plan_request.items), key=lambda pair: (pair[1].day, pair[0]))
+    meal_ids = sorted({item.meal_id for item in plan_request.items})
+    meal_index = {meal_id: i for i, meal_id in enumerate(meal_ids)}
+    product_ids = sorted({product_id for meal_id in meal_ids for product_id, _ in meals[meal_id][1]})
+    product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+
+    usage = np.zeros((len(product_ids), len(meal_ids)), dtype=np.float64)
+    for meal_id in meal_ids:
+        for product_id, required_grams in meals[meal_id][1]:
+            usage[product_index[product_id], meal_index[meal_id]] += required_grams
+    stock = np.array([
+        max(products[product_id][1], 0.0) if product_id in products else 0.0 for product_id in product_ids
+    ], dtype=np.float64)
+    requested = np.zeros(len(meal_ids), dtype=np.float64)
+    for item in plan_request.items:
+        requested[meal_index[item.meal_id]] += item.children
+
+    lp_solution = _solve_max_portions_lp(usage, stock, requested)
+    meal_budget = np.floor(lp_solution + 1e-6).astype(np.int64)
+    # Yaxlitlashdan keyin ham joiz ekanini kafolatlash
+    while np.any(usage @ meal_budget > stock + 1e-6):
+        worst_product = int(np.argmax(usage @ meal_budget - stock))
+        meal_budget[int(np.argmax(np.where(usage[worst_product] > 0, meal_budget, -1)))] -= 1
+
+    # Taom byudjetini uning kunlari bo'yicha kun tartibida taqsimlash
+    planned = [0] * len(plan_request.items)
+    remaining_budget = meal_budget.copy()
+    for original_index, item in ordered_items:
+        i = meal_index[item.meal_id]
+        planned[original_index] = int(min(item.children, remaining_budget[i]))
+        remaining_budget[i] -= planned[original_index]
+
+    # Qolgan qoldiq bilan ochko'z to'ldirish
+    planned_per_meal = np.zeros(len(meal_ids), dtype=np.float64)
+    for i, item in enumerate(plan_request.items):
+        planned_per_meal[meal_index[item.meal_id]] += planned[i]
+    remaining_stock = stock - usage @ planned_per_meal
+    for original_index, item in ordered_items:
+        missing = item.children - planned[original_index]
+        if missing <= 0:
+            continue
+        column = usage[:, meal_index[item.meal_id]]
+        used = column > 0
+        extra = int(min(missing, np.floor((remaining_stock[used] + 1e-6) / column[used]).min()))
+        if extra > 0:
+            planned[original_index] += extra
+            remaining_stock = remaining_stock - column * extra
+
+    planned_items = [
+        schemas.PlannedMealItem(
+            meal_id=item.meal_id,
+            meal_name=meals[item.meal_id][0],
+            day=item.day,
+            requested_portions=item.children,
+            planned_portions=planned[i],
+        )
+        for i, item in sorted(enumerate(plan_request.items), key=lambda pair: (pair[1].day, pair[0]))
+    ]
+
+    required = usage @ requested
+    shortfall = []
+    for product_id in product_ids:
+        j = product_index[product_id]
+        missing_grams = float(required[j] - stock[j])
+        if missing_grams > 1e-6:
+            shortfall.append(schemas.ProductShortfall(
+                product_id=product_id,
+                product_name=products[product_id][0] if product_id in products else f"ID: {product_id}",
+                required_grams=round(float(required[j]), 3),
+                available_grams=round(float(stock[j]), 3),
+                shortfall_grams=round(missing_grams, 3),
+            ))
+
+    total_requested = sum(item.children for item in plan_request.items)
+    total_planned = sum(planned)
+    return schemas.MenuPlanResponse(
+        items=planned_items,
+        shortfall=shortfall,
+        total_requested_portions=total_requested,
+        total_planned_portions=total_planned,
+        fully_feasible=total_planned == total_requested,
+    )
+
+
+def _portions_for_recipe(stock: Dict[int, int], recipe: List[Tuple[int, int]]) -> int:
+    """stock va recipe milli-birliklarda (butun sonlar), shuning uchun bo'lish aniq."""
+    if not recipe:
+        return 0
+    min_portions = None
+    for product_id, required in recipe:
+        available = stock.get(product_id)
+        if available is None or available <= 0 or required <= 0:
+            return 0
+        portions = available // required
+        min_portions = portions if min_portions is None else min(min_portions, portions)
+    return min_portions or 0
+
+
+def simulate(db: Session, simulation: schemas.SimulationRequest) -> schemas.SimulationResponse:
+    """
+    Kirimlar -> retsept o'zgarishlari -> ovqat berishlar (berilgan tartibda) ketma-ketligini
+    xotiradagi nusxaga qo'llaydi. Bazaga hech narsa yozilmaydi. Qoldiq va retseptlar
+    milli-birliklarda (butun sonlar) hisoblanadi.
+    """
+    products, meals = load_stock_and_recipes(db)
+    stock = {product_id: units.to_milli(quantity) for product_id, (_, quantity, _, _) in products.items()}
+    recipes = {
+        meal_id: [(product_id, units.to_milli(grams)) for product_id, grams in recipe]
+        for meal_id, (_, recipe) in meals.items()
+    }
+
+    for delivery in simulation.deliveries:
+        if delivery.product_id not in products:
+            raise ValueError(f"Product with ID {delivery.product_id} not found to record delivery.")
+        stock[delivery.product_id] += units.to_milli(delivery.quantity_received)
+
+    for recipe_change in simulation.recipe_changes:
+        if recipe_change.meal_id not in meals:
+            raise ValueError(f"Meal with ID {recipe_change.meal_id} not found.")
+        recipe = []
+        for ingredient in recipe_change.ingredients:
+            if ingredient.product_id not in products:
+                raise ValueError(f"Product with ID {ingredient.product_id} not found for meal '{meals[recipe_change.meal_id][0]}'.")
+            # crud.create_meal kabi: miqdor asosiy birlikka o'tkaziladi, noma'lum birlik - UnitConversionError (400)
+            factor = crud.unit_factor(crud.get_product(db, ingredient.product_id), ingredient.unit) if ingredient.unit is not None else 1.0
+            recipe.append((ingredient.product_id, units.to_milli(ingredient.required_grams * factor)))
+        recipes[recipe_change.meal_id] = recipe
+
+    serve_results = []
+    for serve in simulation.serves:
+        if serve.meal_id not in meals:
+            raise ValueError(f"Meal with ID {serve.meal_id} not found.")
+        meal_name = meals[serve.meal_id][0]
+        recipe = recipes[serve.meal_id]
+        success, message = True, f"{serve.portions} portions of meal '{meal_name}' can be served."
+        if not recipe:
+            success, message = False, f"Meal '{meal_name}' has no ingredients defined."
+        else:
+            needed: Dict[int, int] = {}
+            for product_id, required in recipe:
+                needed[product_id] = needed.get(product_id, 0) + required * serve.portions
+            for product_id, amount in needed.items():
+                if stock[product_id] < amount:
+                    success = False
+                    unit = products[product_id][3]
+                    message = (f"Not enough '{products[product_id][0]}' for {serve.portions} portions of '{meal_name}'. "
+                               f"Required: {units.from_milli(amount)} {unit}, Available: {units.from_milli(stock[product_id])} {unit}.")
+                    break
+            if success:
+                for product_id, amount in needed.items():
+                    stock[product_id] -= amount
+        serve_results.append(schemas.SimulatedServeResult(
+            meal_id=serve.meal_id, meal_name=meal_name, portions=serve.portions, success=success, message=message
+        ))
+
+    portions = [
+        schemas.PortionCalculationResponse(
+            meal_id=meal_id, meal_name=meals[meal_id][0],
+            calculable_portions=_portions_for_recipe(stock, recipes[meal_id])
+        )
+        for meal_id in sorted(meals, key=lambda meal_id: meals[meal_id][0])
+    ]
+
+    low_stock = []
+    stock_changes = []
+    for product_id in sorted(products, key=lambda product_id: products[product_id][0]):
+        name, quantity_before, min_stock_grams, unit = products[product_id]
+        quantity_after = units.from_milli(stock[product_id])
+        threshold = simulation.minimum_threshold if simulation.minimum_threshold is not None else stock_cache.effective_threshold(min_stock_grams)
+        if quantity_after < threshold:
+            low_stock.append(stock_cache.build_low_stock_alert(product_id, name, quantity_after, threshold, unit))
+        if quantity_after != quantity_before:
+            stock_changes.append(schemas.SimulatedStockChange(
+                product_id=product_id, product_name=name,
+                quantity_before=quantity_before, quantity_after=quantity_after
+            ))
+
+    return schemas.SimulationResponse(
+        serve_results=serve_results,
+        portions=portions,
+        low_stock=low_stock,
+        stock_changes=stock_changes,
+    )
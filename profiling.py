@@ -0,0 +1,227 @@
+"""
+Og'ir endpoint'lar uchun so'rov darajasidagi profiler (faqat admin, ixtiyoriy).
+
+So'rovga "X-Profile: sample" (yoki "cprofile") sarlavhasi yoki ?profile=sample parametri
+qo'shilsa va foydalanuvchi admin bo'lsa, @profiled bilan belgilangan endpoint profiler
+ostida bajariladi:
+
+  * sample   - alohida thread endpoint bajarilayotgan thread stekini har SAMPLE_INTERVAL
+               soniyada o'qiydi; natija "folded stacks" ko'rinishida (flamegraph.pl,
+               speedscope bilan ochiladi). Endpoint sekinlashmaydi.
+  * cprofile - deterministik cProfile; aniq chaqiruvlar soni, lekin sezilarli qo'shimcha xarajat.
+
+Profil SQL vaqt chizig'i (har bir so'rovning boshlanishi, davomiyligi, matni) bilan birga
+xotirada saqlanadi, id'si javobning X-Profile-Id sarlavhasida qaytadi va
+GET /debug/profiles/{id} orqali olinadi.
+"""
+import contextvars
+import cProfile
+import datetime
+import functools
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, List, Optional
+
+import database
+from database import UserRole
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+MODES = ("sample", "cprofile")
+SAMPLE_INTERVAL = 0.001
+MAX_STORED_PROFILES = 50
+TOP_FUNCTIONS = 40
+
+_profile_ids = itertools.count(1)
+_profiles: "OrderedDict[int, dict]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+class ProfileRequest:
+    """Middleware so'rov uchun yaratadi; endpoint profil qilinsa, profile_id to'ldiriladi."""
+
+    def __init__(self, mode: str, route: str):
+        self.mode = mode
+        self.route = route
+        self.profile_id: Optional[int] = None
+
+
+_requested: contextvars.ContextVar[Optional[ProfileRequest]] = contextvars.ContextVar("profile_request", default=None)
+
+
+def parse_mode(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes"):
+        return "sample"
+    return value if value in MODES else None
+
+
+def request_profile(mode: str, route: str):
+    profile_request = ProfileRequest(mode, route)
+    return profile_request, _requested.set(profile_request)
+
+
+def clear_request(token) -> None:
+    _requested.reset(token)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Berilgan thread stekini davriy o'qiydi va bir xil steklarni sanaydi."""
+
+    def __init__(self, target_thread_id: int, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _top_functions(stats: pstats.Stats) -> List[dict]:
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "total_ms": round(total * 1000.0, 3),
+            "cumulative_ms": round(cumulative * 1000.0, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _top_from_samples(stacks: Counter) -> List[dict]:
+    """Namunalardan har bir funksiyaning 'self' va 'cumulative' ulushi (namuna soni * interval)."""
+    self_counts: Counter = Counter()
+    cumulative_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for label in set(frames):
+            cumulative_counts[label] += count
+    return [
+        {
+            "function": label,
+            "calls": None,
+            "total_ms": round(self_counts[label] * SAMPLE_INTERVAL * 1000.0, 3),
+            "cumulative_ms": round(count * SAMPLE_INTERVAL * 1000.0, 3),
+        }
+        for label, count in cumulative_counts.most_common(TOP_FUNCTIONS)
+    ]
+
+
+def _store(profile: dict) -> int:
+    profile_id = next(_profile_ids)
+    profile["id"] = profile_id
+    with _profiles_lock:
+        _profiles[profile_id] = profile
+        while len(_profiles) > MAX_STORED_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: int) -> Optional[dict]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def list_profiles() -> List[dict]:
+    """Saqlangan profillar (eng yangisi birinchi)."""
+    with _profiles_lock:
+        return list(reversed(_profiles.values()))
+
+
+def _run_profiled(profile_request: ProfileRequest, function: Callable, args, kwargs):
+    stats = database.current_query_stats()
+    if stats is not None:
+        stats.timeline = []
+    queries_before = (stats.count, stats.seconds) if stats is not None else (0, 0.0)
+    started_at = datetime.datetime.utcnow()
+    start = time.perf_counter()
+    sampler: Optional[_StackSampler] = None
+    profiler: Optional[cProfile.Profile] = None
+    if profile_request.mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+        sampler.start()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        else:
+            sampler.stop()
+        profile = {
+            "created_at": started_at,
+            "route": profile_request.route,
+            "mode": profile_request.mode,
+            "duration_ms": round(duration * 1000.0, 3),
+            "sql_count": stats.count - queries_before[0] if stats is not None else 0,
+            "sql_time_ms": round((stats.seconds - queries_before[1]) * 1000.0, 3) if stats is not None else 0.0,
+            "sql_timeline": [
+                {"offset_ms": round((query_start - start) * 1000.0, 3), "duration_ms": round(elapsed * 1000.0, 3),
+                 "statement": statement}
+                for query_start, elapsed, statement in (stats.timeline if stats is not None else [])
+            ],
+            "samples": None,
+            "folded": None,
+            "pstats": None,
+        }
+        if stats is not None:
+            stats.timeline = None
+        if profiler is not None:
+            profiler.create_stats()
+            profile_stats = pstats.Stats(profiler, stream=io.StringIO())
+            profile["top_functions"] = _top_functions(profile_stats)
+            profile["pstats"] = marshal.dumps(profiler.stats)  # snakeviz / flameprof bilan ochiladigan .prof
+        else:
+            profile["samples"] = sum(sampler.stacks.values())
+            profile["top_functions"] = _top_from_samples(sampler.stacks)
+            profile["folded"] = "\n".join(f"{stack} {count}" for stack, count in sorted(sampler.stacks.items()))
+        profile_request.profile_id = _store(profile)
+
+
+def profiled(function: Callable) -> Callable:
+    """
+    Endpoint'ni profil qilish mumkin deb belgilaydi. Endpoint current_user parametriga ega bo'lishi kerak:
+    profil faqat admin so'raganda yoziladi, boshqalar uchun sarlavha e'tiborsiz qoldiriladi.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile_request = _requested.get()
+        current_user = kwargs.get("current_user")
+        if profile_request is None or current_user is None or current_user.role != UserRole.admin:
+            return function(*args, **kwargs)
+        return _run_profiled(profile_request, function, args, kwargs)
+    return wrapper
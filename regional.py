@@ -0,0 +1,178 @@
+"""
+Barcha bog'chalar bo'yicha oylik hisobot (viloyat/tuman menejerlari uchun).
+
+Har bir faol bog'cha uchun qisman hisobot (utils.generate_monthly_report_data va oy davomidagi
+mahsulot sarfi) alohida thread'da, o'sha bog'cha konteksti va bazasida hisoblanadi, so'ng
+natijalar birlashtiriladi. So'rovlar asosan bazani kutgani uchun thread'lar yetarli; shu sababli
+butun hisobot taxminan eng sekin bitta bog'cha hisobotichalik vaqt oladi.
+
+Keshlash: har bir bog'chaning qismi o'sha bog'chaning http_cache versiyalari (ovqat berish,
+mahsulotlar, taomlar) bilan saqlanadi - faqat o'zgargan bog'chalar qayta hisoblanadi.
+Birlashtirilgan hisobot ham oy bo'yicha, barcha bog'chalar versiyalari o'zgarmaguncha saqlanadi.
+"""
+import contextvars
+import datetime
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import database, forecast, http_cache, schemas, tenancy, units, utils
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("BOGCHA_REGION_REPORT_WORKERS", "8"))
+CACHE_MAX_ENTRIES = 1024
+
+# Oylik hisobot shu obyektlar o'zgarganda eskiradi (/reports/monthly_summary bilan bir xil)
+_REPORT_ENTITIES = (http_cache.SERVING_LOGS, http_cache.PRODUCTS, http_cache.MEALS)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# (tenant_id, yil, oy) -> (versiyalar, bog'cha xulosasi, mahsulot nomi -> sarf grammda)
+_partials: "OrderedDict[tuple, Tuple[tuple, schemas.RegionalTenantSummary, Dict[str, float]]]" = OrderedDict()
+# (yil, oy) -> (barcha bog'chalar versiyalari, hisobot)
+_merged: "OrderedDict[tuple, Tuple[tuple, schemas.RegionalMonthlyReport]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="regional-report")
+        return _executor
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value) -> None:
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _month_bounds(year: int, month: int) -> Tuple[datetime.date, datetime.date]:
+    first_day = datetime.date(year, month, 1)
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return first_day, next_month - datetime.timedelta(days=1)
+
+
+def _product_consumption(db, year: int, month: int) -> Dict[str, float]:
+    """Oy davomida har bir mahsulot sarfi (kunlik yig'indilar va hali yig'ilmagan loglardan; bazaga yozmaydi)."""
+    first_day, last_day = _month_bounds(year, month)
+    consumed_by_product: Dict[int, int] = {}  # Milli-birliklarda
+    for product_id, _, consumed in forecast.daily_consumption(db, first_day, last_day):
+        consumed_by_product[product_id] = consumed_by_product.get(product_id, 0) + consumed
+    names = dict(db.query(database.Product.id, database.Product.name).filter(
+        database.Product.id.in_(consumed_by_product)
+    ).all()) if consumed_by_product else {}
+    totals: Dict[str, float] = {}
+    for product_id, consumed in consumed_by_product.items():
+        name = names.get(product_id, f"#{product_id}")  # O'chirilgan mahsulot
+        totals[name] = totals.get(name, 0.0) + units.from_milli(consumed)
+    return totals
+
+
+def _tenant_partial(tenant: database.Tenant, year: int, month: int):
+    """Bitta bog'chaning qismi; o'zgarmagan bo'lsa keshdan."""
+    with database.tenant_scope(tenant.id):
+        versions = http_cache.current_versions(_REPORT_ENTITIES)
+        key = (tenant.id, year, month)
+        with _cache_lock:
+            cached = _partials.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached
+
+        db = database.new_session()
+        try:
+            report = utils.generate_monthly_report_data(db, year, month)
+            products = _product_consumption(db, year, month)
+        finally:
+            db.close()
+        summary = schemas.RegionalTenantSummary(
+            tenant_id=tenant.id,
+            tenant_slug=tenant.slug,
+            tenant_name=tenant.name,
+            total_prepared_portions=report.total_prepared_portions,
+            potential_portions=report.average_potential_portions,
+            difference_percentage=report.difference_percentage,
+            potential_abuse_signal=report.potential_abuse_signal,
+        )
+        partial = (versions, summary, products)
+        _cache_put(_partials, key, partial)
+        return partial
+
+
+def _merge(year: int, month: int, partials: List[tuple], failed: List[str]) -> schemas.RegionalMonthlyReport:
+    total_prepared = sum(summary.total_prepared_portions for _, summary, _ in partials)
+    total_potential = sum(summary.potential_portions for _, summary, _ in partials)
+    theoretical_total = total_prepared + total_potential
+    difference_percentage = (total_potential / theoretical_total) * 100 if theoretical_total > 0 else 0.0
+
+    consumed: Dict[str, float] = {}
+    kindergartens: Dict[str, int] = {}
+    for _, _, products in partials:
+        for name, grams in products.items():
+            consumed[name] = consumed.get(name, 0.0) + grams
+            kindergartens[name] = kindergartens.get(name, 0) + 1
+
+    return schemas.RegionalMonthlyReport(
+        month=f"{year}-{str(month).zfill(2)}",
+        kindergarten_count=len(partials),
+        total_prepared_portions=total_prepared,
+        total_potential_portions=total_potential,
+        difference_percentage=round(difference_percentage, 2),
+        kindergartens=[summary for _, summary, _ in partials],
+        product_consumption=[
+            schemas.RegionalProductConsumption(
+                product_name=name, consumed_grams=round(consumed[name], 2), kindergarten_count=kindergartens[name]
+            )
+            for name in sorted(consumed)
+        ],
+        failed_kindergartens=failed,
+    )
+
+
+def generate_regional_monthly_report(year: int, month: int) -> schemas.RegionalMonthlyReport:
+    """
+    Barcha faol bog'chalar bo'yicha oylik hisobot. Bitta bog'cha hisobotida xatolik bo'lsa, u
+    failed_kindergartens ro'yxatiga tushadi, jami qolganlari bo'yicha hisoblanadi (bunday natija keshlanmaydi).
+    """
+    tenants = [tenant for tenant in tenancy.get_tenants() if tenant.is_active]
+    fingerprint = tuple(
+        (tenant.id, http_cache.current_versions(_REPORT_ENTITIES, tenant_id=tenant.id)) for tenant in tenants
+    )
+    with _cache_lock:
+        cached = _merged.get((year, month))
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    executor = _get_executor()
+    # Har bir vazifa so'rov kontekstining nusxasida bajariladi (loglarda request_id saqlanadi)
+    futures = [
+        (tenant, executor.submit(contextvars.copy_context().run, _tenant_partial, tenant, year, month))
+        for tenant in tenants
+    ]
+    partials, failed = [], []
+    for tenant, future in futures:
+        try:
+            partials.append(future.result())
+        except Exception:
+            logger.exception("'%s' bog'chasi hisobotini olishda xatolik", tenant.slug, extra={"tenant_id": tenant.id})
+            failed.append(tenant.slug)
+
+    report = _merge(year, month, partials, failed)
+    if not failed:
+        # Hisoblash paytida o'zgargan bog'cha bo'lsa, keyingi so'rovda qismi qayta hisoblanadi
+        _cache_put(_merged, (year, month), (tuple((summary.tenant_id, versions) for versions, summary, _ in partials), report))
+    return report
+
+
+def clear() -> None:
+    with _cache_lock:
+        _partials.clear()
+        _merged.clear()
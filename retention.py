@@ -0,0 +1,161 @@
+"""
+Eski yozuvlarni saqlash muddati (retention) bo'yicha o'chirish vazifalari.
+
+Har bir siyosat (RetentionPolicy) bitta jadval uchun qancha kun saqlash kerakligini
+belgilaydi. O'chirish katta bitta DELETE bilan emas, balki cheklangan bo'laklar
+(chunk) bilan bajariladi: har bir bo'lak alohida tranzaksiya, bo'laklar orasida
+qisqa pauza qilinadi, shunda boshqa so'rovlar yozish qulfini kutib qolmaydi.
+Har bir ishga tushirish natijalari (metrikalar) xotirada saqlanadi.
+Umumiy bazada barcha bog'chalar yozuvlari bitta o'tishda, alohida bazalar rejimida esa
+har bir bog'cha bazasi navbat bilan tozalanadi (tenancy.maintenance_scopes).
+"""
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import crud, database, schemas, tenancy
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_PAUSE_SECONDS = 0.2
+MAX_STORED_RUNS = 100
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    def __init__(
+        self,
+        name: str,
+        model,
+        timestamp_column,
+        days_to_keep: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.model = model
+        self.timestamp_column = timestamp_column
+        self.days_to_keep = days_to_keep
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+        self.enabled = enabled
+
+
+# Ro'yxatga olingan siyosatlar. Yangi jadval qo'shish uchun register_policy() dan foydalaning.
+_policies: Dict[str, RetentionPolicy] = {}
+_runs: Deque[schemas.RetentionRunMetrics] = deque(maxlen=MAX_STORED_RUNS)
+_run_lock = threading.Lock()  # Bir vaqtning o'zida faqat bitta retention ishlashi uchun
+
+
+def register_policy(policy: RetentionPolicy) -> None:
+    _policies[policy.name] = policy
+
+
+def get_policies() -> List[RetentionPolicy]:
+    return list(_policies.values())
+
+
+def get_recent_runs(limit: int = 20) -> List[schemas.RetentionRunMetrics]:
+    """Oxirgi ishga tushirishlar metrikalari (eng yangisi birinchi)."""
+    return list(reversed(_runs))[:limit]
+
+
+def run_policy(policy: RetentionPolicy) -> schemas.RetentionRunMetrics:
+    """Bitta siyosatni bo'laklab bajaradi va metrikalarni qaytaradi. Xatoliklar yutilmaydi, metrikaga yoziladi."""
+    started_at = datetime.datetime.utcnow()
+    start = time.perf_counter()
+    cutoff_date = started_at - datetime.timedelta(days=policy.days_to_keep)
+    rows_deleted = 0
+    chunks = 0
+    lock_wait_seconds = 0.0  # Yozish qulfini olishni kutish (SQLite: BEGIN IMMEDIATE); boshqa bazalarda 0
+    delete_seconds = 0.0  # DELETE + COMMIT bajarilishi
+    error: Optional[str] = None
+
+    try:
+        for tenant_id in tenancy.maintenance_scopes():
+            with database.tenant_scope(tenant_id):
+                db = database.new_session()
+                try:
+                    while True:
+                        lock_start = time.perf_counter()
+                        database.begin_write_transaction(db)
+                        delete_start = time.perf_counter()
+                        lock_wait_seconds += delete_start - lock_start
+                        deleted = crud.delete_rows_older_than(
+                            db, policy.model, policy.timestamp_column, cutoff_date, policy.chunk_size
+                        )
+                        delete_seconds += time.perf_counter() - delete_start
+                        rows_deleted += deleted
+                        chunks += 1
+                        if deleted < policy.chunk_size:
+                            break
+                        time.sleep(policy.pause_seconds)
+                finally:
+                    db.close()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.exception("'%s' siyosatini bajarishda xatolik", policy.name, extra={"policy": policy.name})
+
+    metrics = schemas.RetentionRunMetrics(
+        policy=policy.name,
+        started_at=started_at,
+        cutoff_date=cutoff_date,
+        rows_deleted=rows_deleted,
+        chunks=chunks,
+        duration_seconds=round(time.perf_counter() - start, 4),
+        lock_wait_seconds=round(lock_wait_seconds, 4),
+        delete_seconds=round(delete_seconds, 4),
+        success=error is None,
+        error=error,
+    )
+    _runs.append(metrics)
+    return metrics
+
+
+def run_all_policies() -> List[schemas.RetentionRunMetrics]:
+    """Barcha yoqilgan siyosatlarni ketma-ket bajaradi. Worker thread ichida chaqirilishi kerak."""
+    if not _run_lock.acquire(blocking=False):
+        logger.warning("Oldingi retention vazifasi hali tugamagan, bu ishga tushirish o'tkazib yuborildi.")
+        return []
+    try:
+        results = []
+        for policy in get_policies():
+            if policy.enabled:
+                results.append(run_policy(policy))
+        return results
+    finally:
+        _run_lock.release()
+
+
+register_policy(RetentionPolicy(
+    name="audit_logs",
+    model=database.AuditLog,
+    timestamp_column=database.AuditLog.timestamp,
+    days_to_keep=30,
+))
+# Ovqat berish loglari hisobotlar uchun kerak, shuning uchun standart holatda o'chirilgan.
+register_policy(RetentionPolicy(
+    name="meal_serving_logs",
+    model=database.MealServingLog,
+    timestamp_column=database.MealServingLog.serving_time,
+    days_to_keep=365 * 3,
+    enabled=False,
+))
+# Idempotency kalitlari 24 soat amal qiladi, ortig'i bilan bir kundan keyin tozalanadi.
+register_policy(RetentionPolicy(
+    name="idempotency_keys",
+    model=database.IdempotencyKey,
+    timestamp_column=database.IdempotencyKey.expires_at,
+    days_to_keep=1,
+))
+# O'zgarishlar jurnali: shundan eski since bilan kelgan mijozlar reset=True oladi.
+register_policy(RetentionPolicy(
+    name="change_log",
+    model=database.ChangeLog,
+    timestamp_column=database.ChangeLog.changed_at,
+    days_to_keep=90,
+))
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import datetime
+import enum
 from database import UserRole # UserRole ni database.py dan import qilamiz
 
 # --- Product Schemas ---
@@ -12,6 +13,7 @@ class ProductBase(BaseModel):
     # Agar yangi mahsulot turi kiritilayotganda darhol uning boshlang'ich miqdori ham kiritilsa:
     initial_quantity_grams: Optional[float] = Field(0.0, ge=0, example=1000.0) # Boshlang'ich miqdor
     delivery_date: Optional[datetime.datetime] = None # Bu birinchi kirim sanasi bo'lishi mumkin
+    unit: str = Field("g", pattern="^(g|ml|dona)$", example="g") # Asosiy birlik; miqdorlar shu birlikda saqlanadi
 
 class ProductCreate(ProductBase):
     pass # Boshlang'ich miqdor ProductBase dan keladi
@@ -20,11 +22,23 @@ class ProductUpdate(BaseModel): # Mahsulot nomini yangilash uchun
     name: Optional[str] = Field(None, min_length=1, example="Yangi Nom")
     # Miqdorni yangilash alohida endpoint orqali (ProductDelivery) amalga oshiriladi
 
+class ProductThresholdUpdate(BaseModel): # Kam qolganlik chegarasini o'rnatish uchun
+    min_stock_grams: Optional[float] = Field(None, ge=0, example=1000.0) # None - standart chegaraga qaytarish
+
 class Product(BaseModel): # Productni qaytarish uchun schema
     id: int
     name: str
     quantity_grams: float # Ombordagi joriy miqdor
+    min_stock_grams: Optional[float] = None # Kam qolganlik chegarasi (None - standart)
     delivery_date: Optional[datetime.datetime] # Oxirgi kirim sanasi
+    unit: str = "g" # Asosiy birlik: quantity_grams, min_stock_grams va retseptlar shu birlikda
+
+    class Config:
+        orm_mode = True
+
+class ProductUnitConversion(BaseModel): # Mahsulotning qo'shimcha birligi
+    unit: str = Field(..., min_length=1, max_length=20, example="quti")
+    base_units_per_unit: float = Field(..., gt=0, example=30.0) # 1 shu birlik = nechta asosiy birlik
 
     class Config:
         orm_mode = True
@@ -35,12 +49,16 @@ class ProductDeliveryBase(BaseModel):
     quantity_received: float = Field(..., gt=0, example=5000.0) # 0 dan katta bo'lishi kerak
     delivery_date: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     supplier: Optional[str] = Field(None, example="Asosiy Yetkazib Beruvchi")
+    unit_price: Optional[float] = Field(None, ge=0, example=12000.0) # 1000 asosiy birlik (1 kg, 1 l, 1000 dona) narxi
+    expiry_date: Optional[datetime.date] = Field(None, example="2023-05-20") # Yaroqlilik muddati
 
 class ProductDeliveryCreate(ProductDeliveryBase):
-    pass
+    # Berilsa, quantity_received va unit_price shu birlikda (1 birlik narxi); saqlashda asosiy birlikka o'tkaziladi
+    unit: Optional[str] = Field(None, min_length=1, max_length=20, example="kg")
 
 class ProductDelivery(ProductDeliveryBase):
     id: int
+    remaining_grams: float # Lotning hali sarflanmagan qismi
     product: Product
     class Config:
         orm_mode = True
@@ -51,7 +69,7 @@ class MealIngredientBase(BaseModel):
     required_grams: float = Field(..., gt=0, example=150.0)
 
 class MealIngredientCreate(MealIngredientBase):
-    pass
+    unit: Optional[str] = Field(None, min_length=1, max_length=20, example="g") # required_grams birligi; None - asosiy birlik
 
 class MealIngredientSchema(MealIngredientBase):
     id: int
@@ -102,26 +120,49 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str = Field(..., min_length=6)
+    is_platform: bool = False # Faqat platforma admini bera oladi
 
 class UserUpdate(BaseModel):
     username: Optional[str] = Field(None, min_length=3)
     role: Optional[UserRole] = None
     is_active: Optional[bool] = None
+    is_platform: Optional[bool] = None
     password: Optional[str] = Field(None, min_length=6)
 
 class UserSchema(UserBase):
     id: int
     is_active: bool
+    is_platform: bool
     class Config:
         orm_mode = True
 
 MealServingLogSchema.update_forward_refs() # UserSchema uchun
 
+# --- Tenant Schemas ---
+class TenantCreate(BaseModel):
+    slug: str = Field(..., min_length=2, max_length=63, pattern=r"^[a-z][a-z0-9-]*$", example="bogcha-12")
+    name: str = Field(..., min_length=1, example="12-son bog'cha")
+    admin_username: str = Field(..., min_length=3)
+    admin_password: str = Field(..., min_length=6)
+
+class TenantSchema(BaseModel):
+    id: int
+    slug: str
+    name: str
+    is_active: bool
+    created_at: datetime.datetime
+    class Config:
+        orm_mode = True
+
 # --- Token Schemas (o'zgarmagan) ---
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+class EventStreamTicket(BaseModel):
+    ticket: str
+    expires_in: int # soniya
+
 class TokenData(BaseModel):
     username: Optional[str] = None
 
@@ -131,6 +172,74 @@ class PortionCalculationResponse(BaseModel):
     meal_name: str
     calculable_portions: int
 
+# --- Menu Planning Schemas ---
+class MenuPlanItem(BaseModel):
+    meal_id: int
+    day: datetime.date = Field(..., example="2023-05-15")
+    children: int = Field(..., gt=0, example=120) # Shu kuni shu taomni oladigan bolalar soni
+
+class MenuPlanRequest(BaseModel):
+    items: List[MenuPlanItem] = Field(..., min_length=1)
+
+class PlannedMealItem(BaseModel):
+    meal_id: int
+    meal_name: str
+    day: datetime.date
+    requested_portions: int
+    planned_portions: int
+
+class ProductShortfall(BaseModel):
+    product_id: int
+    product_name: str
+    required_grams: float # So'ralgan barcha porsiyalar uchun kerakli miqdor
+    available_grams: float
+    shortfall_grams: float # Yetishmayotgan miqdor
+
+class MenuPlanResponse(BaseModel):
+    items: List[PlannedMealItem]
+    shortfall: List[ProductShortfall]
+    total_requested_portions: int
+    total_planned_portions: int
+    fully_feasible: bool
+
+# --- What-if Simulation Schemas ---
+class SimulatedDelivery(BaseModel):
+    product_id: int
+    quantity_received: float = Field(..., gt=0, example=5000.0)
+
+class SimulatedRecipeChange(BaseModel):
+    meal_id: int
+    ingredients: List[MealIngredientCreate] # Taomning yangi retsepti (to'liq almashtiriladi)
+
+class SimulatedServe(BaseModel):
+    meal_id: int
+    portions: int = Field(..., gt=0, example=50)
+
+class SimulationRequest(BaseModel):
+    deliveries: List[SimulatedDelivery] = []
+    recipe_changes: List[SimulatedRecipeChange] = []
+    serves: List[SimulatedServe] = []
+    minimum_threshold: Optional[float] = Field(None, ge=0) # Berilmasa, mahsulotlarning o'z chegaralari
+
+class SimulatedServeResult(BaseModel):
+    meal_id: int
+    meal_name: str
+    portions: int
+    success: bool
+    message: str
+
+class SimulatedStockChange(BaseModel):
+    product_id: int
+    product_name: str
+    quantity_before: float
+    quantity_after: float
+
+class SimulationResponse(BaseModel):
+    serve_results: List[SimulatedServeResult]
+    portions: List[PortionCalculationResponse]
+    low_stock: List["LowStockAlert"]
+    stock_changes: List[SimulatedStockChange]
+
 # --- Alert Schemas (o'zgarmagan) ---
 class LowStockAlert(BaseModel):
     product_id: int
@@ -138,6 +247,17 @@ class LowStockAlert(BaseModel):
     current_quantity_grams: float
     message: str
 
+SimulationResponse.update_forward_refs() # LowStockAlert uchun
+
+class ExpiringLotAlert(BaseModel):
+    delivery_id: int
+    product_id: int
+    product_name: str
+    expiry_date: datetime.date
+    remaining_grams: float
+    days_left: int # Manfiy - muddati o'tgan
+    message: str
+
 class PotentialAbuseAlert(BaseModel):
     month: str
     prepared_portions: int
@@ -153,6 +273,63 @@ class MonthlyReportSchema(BaseModel):
     difference_percentage: float
     potential_abuse_signal: bool
 
+class RegionalTenantSummary(BaseModel):
+    tenant_id: int
+    tenant_slug: str
+    tenant_name: str
+    total_prepared_portions: int
+    potential_portions: int
+    difference_percentage: float
+    potential_abuse_signal: bool
+
+class RegionalProductConsumption(BaseModel):
+    product_name: str # Bog'chalar bo'yicha mahsulot nomi bilan birlashtiriladi
+    consumed_grams: float
+    kindergarten_count: int
+
+class RegionalMonthlyReport(BaseModel):
+    month: str
+    kindergarten_count: int
+    total_prepared_portions: int
+    total_potential_portions: int
+    difference_percentage: float
+    kindergartens: List[RegionalTenantSummary]
+    product_consumption: List[RegionalProductConsumption]
+    failed_kindergartens: List[str] = [] # Hisoboti olinmagan bog'chalar slug'i; jami ularsiz hisoblangan
+
+class MealCost(BaseModel):
+    meal_id: int
+    meal_name: Optional[str] # Taom o'chirilgan bo'lsa None
+    portions_served: int
+    total_cost: float
+    cost_per_portion: Optional[float] # Davrda berilmagan bo'lsa None
+    uncosted_grams: float # Narxi noma'lum lotlardan olingan miqdor (tannarxga kirmagan)
+
+class DailyCost(BaseModel):
+    date: str = Field(..., example="2023-05-15")
+    portions_served: int
+    total_cost: float
+    cost_per_portion: Optional[float]
+    uncosted_grams: float
+
+class MonthlyCostReport(BaseModel):
+    month: str
+    portions_served: int
+    total_cost: float
+    cost_per_portion: Optional[float]
+    uncosted_grams: float
+    meals: List[MealCost]
+
+class ProductForecast(BaseModel):
+    product_id: int
+    product_name: str
+    current_quantity_grams: float
+    daily_consumption_grams: float # Prognoz qilingan kunlik sarf
+    days_until_stockout: Optional[float] # Sarf bo'lmasa None
+    reorder_point_grams: float # Qoldiq shu darajaga tushganda buyurtma berish kerak
+    suggested_reorder_grams: float # Yetkazib berish muddati + qamrov kunlari uchun tavsiya etilgan miqdor
+    needs_reorder: bool
+
 class IngredientConsumption(BaseModel):
     product_name: str
     total_consumed_grams: float
@@ -180,4 +357,113 @@ class AuditLogSchema(AuditLogBase):
     timestamp: datetime.datetime
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# --- Retention Schemas ---
+class RetentionRunMetrics(BaseModel):
+    policy: str
+    started_at: datetime.datetime
+    cutoff_date: datetime.datetime
+    rows_deleted: int
+    chunks: int
+    duration_seconds: float
+    lock_wait_seconds: float # Yozish qulfini olishni kutish (SQLite BEGIN IMMEDIATE)
+    delete_seconds: float # DELETE + COMMIT bajarilishi
+    success: bool
+    error: Optional[str] = None
+
+class SlowQuery(BaseModel):
+    logged_at: datetime.datetime
+    duration_ms: float
+    route: Optional[str] = None
+    statement: str
+    parameters: str
+    executemany: bool
+    plan: Optional[List[str]] = None
+
+class ProfileFunctionStat(BaseModel):
+    function: str
+    calls: Optional[int] = None # sample rejimida None
+    total_ms: float
+    cumulative_ms: float
+
+class SqlTimelineEntry(BaseModel):
+    offset_ms: float # Endpoint boshlanganidan keyin
+    duration_ms: float
+    statement: str
+
+class ProfileSummary(BaseModel):
+    id: int
+    created_at: datetime.datetime
+    route: str
+    mode: str
+    duration_ms: float
+    sql_count: int
+    sql_time_ms: float
+
+class ProfileDetail(ProfileSummary):
+    samples: Optional[int] = None
+    top_functions: List[ProfileFunctionStat]
+    sql_timeline: List[SqlTimelineEntry]
+    folded: Optional[str] = None # "folded stacks" (flamegraph.pl / speedscope)
+
+# --- Offline Sync Schemas ---
+class SyncOperationType(str, enum.Enum):
+    serve = "serve"
+    receive_stock = "receive_stock"
+
+class SyncOperationStatus(str, enum.Enum):
+    applied = "applied"
+    duplicate = "duplicate" # Shu op_id avval qo'llangan
+    conflict = "conflict" # Server holati bilan to'qnashdi (masalan, qoldiq yetarli emas)
+    rejected = "rejected" # Noto'g'ri amal (topilmadi, ruxsat yo'q, ...)
+    skipped = "skipped" # atomic=True va boshqa amal muvaffaqiyatsiz bo'lgani uchun bekor qilindi
+
+class SyncOperation(BaseModel):
+    op_id: str = Field(..., min_length=1, max_length=200, example="tablet-3:000127") # Qurilmada noyob
+    type: SyncOperationType
+    client_time: datetime.datetime # Amal qurilmada bajarilgan vaqt
+    meal_id: Optional[int] = None # type=serve
+    portions: Optional[int] = Field(None, gt=0, example=25) # type=serve
+    product_id: Optional[int] = None # type=receive_stock
+    quantity_received: Optional[float] = Field(None, gt=0, example=5000.0) # type=receive_stock
+    supplier: Optional[str] = None # type=receive_stock
+    unit_price: Optional[float] = Field(None, ge=0) # type=receive_stock, 1000 asosiy birlik (unit berilsa, 1 unit) narxi
+    expiry_date: Optional[datetime.date] = None # type=receive_stock
+    unit: Optional[str] = Field(None, min_length=1, max_length=20) # type=receive_stock, quantity_received birligi
+
+class SyncRequest(BaseModel):
+    since_version: Optional[str] = Field(None, example="c3481") # Oldingi javobdagi sync_version
+    atomic: bool = False # True bo'lsa, bitta amal o'xshamasa butun paket bekor qilinadi
+    operations: List[SyncOperation] = Field(default_factory=list, max_length=500)
+
+class SyncOperationResult(BaseModel):
+    op_id: str
+    status: SyncOperationStatus
+    message: str
+    serving_log_id: Optional[int] = None
+    delivery_id: Optional[int] = None
+
+class SyncResponse(BaseModel):
+    results: List[SyncOperationResult]
+    sync_version: str
+    full_resync: bool # True bo'lsa, changed_stock barcha mahsulotlarni o'z ichiga oladi
+    changed_stock: List[Product]
+
+# --- Change Feed Schemas ---
+class ChangeTombstone(BaseModel):
+    entity: str # "products", "deliveries", "meals", "users"
+    id: int
+    seq: int
+
+class ChangesResponse(BaseModel):
+    since: int
+    next_since: int # Keyingi so'rovda since sifatida yuboriladi
+    latest_seq: int
+    has_more: bool # True bo'lsa, darhol next_since bilan yana so'rash kerak
+    reset: bool # True bo'lsa, so'ralgan o'zgarishlar jurnaldan o'chib ketgan: ro'yxatlarni to'liq qayta yuklab, next_since'dan davom eting
+    products: List[Product] = []
+    deliveries: List[ProductDelivery] = []
+    meals: List[Meal] = []
+    users: List[UserSchema] = [] # Faqat admin uchun
+    deleted: List[ChangeTombstone] = []
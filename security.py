@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Annotated
+import logging
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -10,10 +11,16 @@ from sqlalchemy.orm import Session
 import crud, schemas, database
 from database import get_db, UserRole
 
+logger = logging.getLogger(__name__)
+
 # --- Konfiguratsiya ---
 SECRET_KEY = "YOUR_VERY_SECRET_KEY"  # Buni .env faylidan olish yaxshiroq
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 1 kun
+TENANT_CLAIM = "tid" # Token qaysi bog'chaga tegishli (tenancy.py)
+SCOPE_CLAIM = "scope" # Maxsus maqsadli tokenlar (masalan, SSE chiptasi); oddiy access tokenda bo'lmaydi
+EVENT_STREAM_SCOPE = "event_stream"
+EVENT_STREAM_TICKET_EXPIRE_SECONDS = 60 # Chipta faqat ulanish uchun, oqim davomida qayta tekshirilmaydi
 
 # --- Parol hashing ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -39,10 +46,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
-) -> database.User:
+def create_event_stream_ticket(user: database.User) -> str:
+    """
+    /events/stream uchun qisqa muddatli chipta. EventSource sarlavha yubora olmaydi, shuning uchun
+    chipta query orqali beriladi - access token URL'da (va access loglarda) ko'rinmasligi uchun.
+    """
+    return create_access_token(
+        data={"sub": user.username, TENANT_CLAIM: user.tenant_id, SCOPE_CLAIM: EVENT_STREAM_SCOPE},
+        expires_delta=timedelta(seconds=EVENT_STREAM_TICKET_EXPIRE_SECONDS),
+    )
+
+def get_user_from_token(db: Session, token: str, scope: Optional[str] = None) -> database.User:
+    """
+    Tokenni tekshiradi va foydalanuvchini qaytaradi. Yaroqsiz bo'lsa 401 ko'taradi.
+    scope berilsa, faqat shu maqsad uchun chiqarilgan token qabul qilinadi; aks holda faqat oddiy access token.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,6 +71,11 @@ async def get_current_user(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
+        # Token boshqa bog'cha uchun berilgan bo'lsa (masalan, X-Tenant bilan almashtirishga urinish)
+        if payload.get(TENANT_CLAIM, database.DEFAULT_TENANT_ID) != database.current_tenant_id():
+            raise credentials_exception
+        if payload.get(SCOPE_CLAIM) != scope:
+            raise credentials_exception
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
@@ -62,6 +85,14 @@ async def get_current_user(
         raise credentials_exception
     return user
 
+# Oddiy (async emas) funksiya: bazaga sinxron so'rov yuboradi, shuning uchun FastAPI uni threadpool'da
+# bajaradi. async bo'lsa, pool'dan ulanish kutish event loop'ni bloklab qo'yadi.
+def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Session = Depends(get_db)
+) -> database.User:
+    return get_user_from_token(db, token)
+
 async def get_current_active_user(
     current_user: Annotated[database.User, Depends(get_current_user)]
 ) -> database.User:
@@ -100,6 +131,28 @@ async def get_current_chef_user(
         )
     return current_user
 
+# Bog'chalarni boshqarish: platforma huquqi (User.is_platform) berilgan admin
+async def get_current_platform_admin_user(
+    current_user: Annotated[database.User, Depends(get_current_admin_user)]
+) -> database.User:
+    if not current_user.is_platform:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The user doesn't have enough privileges (platform admin required)"
+        )
+    return current_user
+
+# Barcha bog'chalar bo'yicha hisobotlar: platforma huquqi berilgan menejer yoki admin
+async def get_current_regional_manager_user(
+    current_user: Annotated[database.User, Depends(get_current_manager_user)]
+) -> database.User:
+    if not current_user.is_platform:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The user doesn't have enough privileges (regional manager required)"
+        )
+    return current_user
+
 # Umumiy autentifikatsiyadan o'tgan foydalanuvchi (har qanday rol)
 async def get_authenticated_user(
     current_user: Annotated[database.User, Depends(get_current_active_user)]
@@ -115,9 +168,18 @@ def decode_username_from_token(token: str) -> Optional[str]:
         username: Optional[str] = payload.get("sub")
         return username
     except ExpiredSignatureError:
-        print("Token muddati o'tgan (log uchun)") # Buni loglash mumkin
+        logger.debug("Token muddati o'tgan (audit log uchun)")
         return "expired_token" # Maxsus qiymat qaytarish mumkin
     except JWTError:
-        print("Token validatsiya xatosi (log uchun)") # Buni loglash mumkin
+        logger.debug("Token validatsiya xatosi (audit log uchun)")
         return "invalid_token" # Maxsus qiymat qaytarish mumkin
-    return None
\ No newline at end of file
+    return None
+
+def decode_tenant_from_token(token: str) -> Optional[int]:
+    """Tokendagi bog'cha id'si (tid claim). Token yaroqsiz bo'lsa None; tid'siz eski tokenlar - standart bog'cha."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    tenant_id = payload.get(TENANT_CLAIM, database.DEFAULT_TENANT_ID)
+    return tenant_id if isinstance(tenant_id, int) else None
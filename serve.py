@@ -0,0 +1,49 @@
+"""
+Ilovani bir nechta jarayonda (worker) ishga tushirish.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+Ishga tushirishdan oldin migratsiyalar bir marta shu jarayonda qo'llanadi, worker'lar esa
+BOGCHA_AUTO_MIGRATE=0 bilan faqat versiyani tekshiradi. Worker soni 1 dan ko'p bo'lsa:
+
+  * BOGCHA_CACHE_SYNC=1 - har bir worker keshlarini change_log orqali boshqalar bilan
+    moslab turadi (cache_sync.py);
+  * rejalashtirilgan vazifalarni faqat bitta yetakchi worker bajaradi (leadership.py).
+
+Cheklovlar: /events/stream (SSE) obunachisi faqat o'zi ulangan worker'dagi o'zgarishlar
+haqida xabar oladi; /metrics va /debug/profiles ham har bir worker uchun alohida.
+SQLite'da barcha worker'lar bitta fayl bilan ishlaydi, yozishlar baribir ketma-ket bajariladi.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import uvicorn
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bog'cha CRM'ni bir nechta worker bilan ishga tushirish.")
+    parser.add_argument("--host", default=os.getenv("BOGCHA_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("BOGCHA_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BOGCHA_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--skip-migrations", action="store_true", help="Migratsiyalar deploy paytida alohida qo'llangan")
+    args = parser.parse_args(argv)
+
+    if not args.skip_migrations:
+        import migrations
+        applied = migrations.upgrade_all()
+        logging.getLogger(__name__).info("Migratsiyalar qo'llandi: %s", applied or "hech narsa")
+
+    # Worker'lar spawn qilinganda muhit o'zgaruvchilarini meros oladi
+    os.environ["BOGCHA_AUTO_MIGRATE"] = "0"
+    if args.workers > 1:
+        os.environ.setdefault("BOGCHA_CACHE_SYNC", "1")
+
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    sys.exit(main())
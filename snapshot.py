@@ -0,0 +1,139 @@
+"""
+Mahsulotlar va retseptlarning o'qish uchun optimallashtirilgan ustunli (columnar) nusxasi.
+
+Porsiya, ogohlantirish va hisobot hisoblari uchun ORM obyektlarini (Product,
+MealIngredient) yuklash o'rniga:
+  * qoldiq - mahsulot indeksi bo'yicha NumPy int64 vektori (milli-birliklarda, units.MILLI),
+  * retseptlar - siyrak CSR matritsa (taom x mahsulot, milli-birlik): indptr/indices/data massivlari.
+
+Nusxa http_cache versiyalari o'zgarganda dangasa (lazy) qayta quriladi: qoldiq har
+bir kirim/ovqat berishdan keyin bitta yengil so'rov bilan yangilanadi, retseptlar esa
+faqat taomlar (yoki mahsulotlar ro'yxati) o'zgarganda qayta o'qiladi. Har bir bog'cha (tenant)
+uchun alohida nusxa saqlanadi.
+Porsiyalar: qoldiq[indices] // data ning har bir qatordagi minimumi - butun sonlarda, aniq.
+Qiymatlar bazadan xom holda (MilliUnits o'girishsiz) o'qiladi.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import BigInteger, type_coerce
+from sqlalchemy.orm import Session
+
+import database, http_cache, units
+
+
+class Snapshot:
+    """O'zgarmas nusxa. Yangilanishda yangi obyekt yaratiladi, shuning uchun o'quvchilarga qulf kerak emas."""
+
+    def __init__(self, products_version: int, meals_version: int,
+                 product_ids: np.ndarray, product_names: List[str], product_units: List[str],
+                 stock: np.ndarray, thresholds: np.ndarray, meal_ids: np.ndarray, meal_names: List[str],
+                 indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+        self.products_version = products_version
+        self.meals_version = meals_version
+        self.product_ids = product_ids
+        self.product_names = product_names
+        self.product_units = product_units  # Asosiy birlik (g, ml, dona) - qoldiq va chegaralar shu birlikda
+        self.product_position: Dict[int, int] = {int(pid): i for i, pid in enumerate(product_ids)}
+        self.stock = stock
+        self.thresholds = thresholds  # min_stock_grams, None bo'lsa NaN
+        self.meal_ids = meal_ids  # Nomi bo'yicha tartiblangan
+        self.meal_names = meal_names
+        self.meal_position: Dict[int, int] = {int(mid): i for i, mid in enumerate(meal_ids)}
+        self.indptr = indptr
+        self.indices = indices  # Mahsulot pozitsiyasi, mahsulot topilmasa -1
+        self.data = data
+
+    def recipe(self, meal_position: int) -> List[tuple]:
+        start, end = self.indptr[meal_position], self.indptr[meal_position + 1]
+        return [
+            (int(self.product_ids[j]) if j >= 0 else None, units.from_milli(int(amount)))
+            for j, amount in zip(self.indices[start:end], self.data[start:end])
+        ]
+
+    def portions(self, stock: Optional[np.ndarray] = None) -> np.ndarray:
+        """Har bir taom (meal_ids tartibida) uchun tayyorlash mumkin bo'lgan porsiyalar soni."""
+        stock = self.stock if stock is None else stock
+        result = np.zeros(len(self.meal_ids), dtype=np.int64)
+        if self.indices.size == 0:
+            return result
+        valid = self.indices >= 0
+        available = np.where(valid, stock[np.where(valid, self.indices, 0)], 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_ingredient = np.where(
+                (available > 0) & (self.data > 0), np.floor_divide(available, self.data), 0
+            )
+        non_empty = self.indptr[1:] > self.indptr[:-1]
+        if non_empty.any():
+            result[non_empty] = np.minimum.reduceat(per_ingredient, self.indptr[:-1][non_empty]).astype(np.int64)
+        return result
+
+
+_lock = threading.Lock()
+_current: Dict[int, Snapshot] = {}  # tenant_id -> nusxa
+
+
+def _load_products(db: Session):
+    rows = db.query(
+        database.Product.id, database.Product.name,
+        type_coerce(database.Product.quantity_grams, BigInteger), database.Product.min_stock_grams, database.Product.unit
+    ).order_by(database.Product.id).all()
+    product_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    names = [r[1] for r in rows]
+    stock = np.fromiter((r[2] for r in rows), dtype=np.int64, count=len(rows))
+    thresholds = np.fromiter((np.nan if r[3] is None else r[3] for r in rows), dtype=np.float64, count=len(rows))
+    return product_ids, names, [r[4] for r in rows], stock, thresholds
+
+
+def _load_recipes(db: Session, product_position: Dict[int, int]):
+    meals = db.query(database.Meal.id, database.Meal.name).order_by(database.Meal.name).all()
+    meal_ids = np.fromiter((m[0] for m in meals), dtype=np.int64, count=len(meals))
+    meal_position = {meal_id: i for i, (meal_id, _) in enumerate(meals)}
+
+    ingredients = db.query(
+        database.MealIngredient.meal_id, database.MealIngredient.product_id,
+        type_coerce(database.MealIngredient.required_grams, BigInteger)
+    ).all()
+    rows = np.fromiter((meal_position.get(i[0], -1) for i in ingredients), dtype=np.int64, count=len(ingredients))
+    cols = np.fromiter((product_position.get(i[1], -1) for i in ingredients), dtype=np.int64, count=len(ingredients))
+    data = np.fromiter((i[2] for i in ingredients), dtype=np.int64, count=len(ingredients))
+    keep = rows >= 0
+    rows, cols, data = rows[keep], cols[keep], data[keep]
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(len(meals) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(meals)), out=indptr[1:])
+    return meal_ids, [m[1] for m in meals], indptr, cols[order], data[order]
+
+
+def get_snapshot(db: Session) -> Snapshot:
+    """Joriy versiyalarga mos nusxani qaytaradi, kerak bo'lsa qayta quradi."""
+    tenant_id = database.current_tenant_id()
+    products_version, meals_version = http_cache.current_versions((http_cache.PRODUCTS, http_cache.MEALS), tenant_id)
+    current = _current.get(tenant_id)
+    if current is not None and current.products_version == products_version and current.meals_version == meals_version:
+        return current
+
+    with _lock:
+        current = _current.get(tenant_id)
+        if current is not None and current.products_version == products_version and current.meals_version == meals_version:
+            return current
+        product_ids, names, product_units, stock, thresholds = _load_products(db)
+        same_products = current is not None and np.array_equal(current.product_ids, product_ids)
+        if same_products and current.meals_version == meals_version:
+            # Faqat qoldiq o'zgargan - retsept matritsasi qayta ishlatiladi
+            meal_ids, meal_names = current.meal_ids, current.meal_names
+            indptr, indices, data = current.indptr, current.indices, current.data
+        else:
+            product_position = {int(pid): i for i, pid in enumerate(product_ids)}
+            meal_ids, meal_names, indptr, indices, data = _load_recipes(db, product_position)
+        snapshot = _current[tenant_id] = Snapshot(
+            products_version, meals_version, product_ids, names, product_units, stock, thresholds,
+            meal_ids, meal_names, indptr, indices, data
+        )
+        return snapshot
+
+
+def invalidate() -> None:
+    with _lock:
+        _current.clear()
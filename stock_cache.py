@@ -0,0 +1,144 @@
+"""
+Mahsulot qoldiqlari va kam qolgan mahsulotlar uchun xotiradagi kesh.
+
+/alerts/low_stock har bir so'rovda products jadvalini skanerlamasligi uchun
+qoldiqlar bir marta yuklanadi va keyin qoldiqni o'zgartiruvchi amallar
+(kirim, ovqat berish, mahsulot yaratish/tahrirlash/o'chirish) tomonidan
+yangilab boriladi. Har bir o'zgarishda versiya oshadi, bu ETag uchun ishlatiladi.
+Har bir bog'cha (tenant) uchun alohida holat saqlanadi.
+"""
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import database, schemas
+
+MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS = 500
+
+_lock = threading.Lock()
+_boot_id = uuid.uuid4().hex[:8]  # Jarayon qayta ishga tushganda eski ETag'lar mos kelmasligi uchun
+
+
+class _TenantStock:
+    def __init__(self):
+        self.loaded = False
+        self.version = 0
+        # product_id -> [name, quantity_grams, min_stock_grams, unit]
+        self.products: Dict[int, list] = {}
+
+
+_tenants: Dict[int, _TenantStock] = {}
+
+
+def _state(tenant_id: Optional[int] = None) -> _TenantStock:
+    tenant_id = database.current_tenant_id() if tenant_id is None else tenant_id
+    state = _tenants.get(tenant_id)
+    if state is None:
+        with _lock:
+            state = _tenants.setdefault(tenant_id, _TenantStock())
+    return state
+
+
+def effective_threshold(min_stock_grams: Optional[float]) -> float:
+    return min_stock_grams if min_stock_grams is not None else MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS
+
+
+def build_low_stock_alert(product_id: int, name: str, quantity_grams: float, threshold: float, unit: str = "g") -> schemas.LowStockAlert:
+    return schemas.LowStockAlert(
+        product_id=product_id,
+        product_name=name,
+        current_quantity_grams=quantity_grams,
+        message=f"'{name}' miqdori kam ({quantity_grams} {unit}). Minimum: {threshold} {unit}."
+    )
+
+
+def _ensure_loaded(db: Session) -> _TenantStock:
+    state = _state()
+    if state.loaded:
+        return state
+    with _lock:
+        if state.loaded:
+            return state
+        rows = db.query(
+            database.Product.id, database.Product.name,
+            database.Product.quantity_grams, database.Product.min_stock_grams, database.Product.unit
+        ).all()
+        state.products.clear()
+        for product_id, name, quantity_grams, min_stock_grams, unit in rows:
+            state.products[product_id] = [name, quantity_grams, min_stock_grams, unit]
+        state.version += 1
+        state.loaded = True
+    return state
+
+
+def _is_low(entry: list) -> bool:
+    return entry[1] < effective_threshold(entry[2])
+
+
+def update_products(products: Iterable[database.Product], tenant_id: Optional[int] = None) -> List[Tuple[int, bool]]:
+    """
+    Commit qilingan mahsulotlar holatini joriy (yoki berilgan) tenant keshiga yozadi.
+    Kam qolganlik holati o'zgargan mahsulotlar ro'yxatini qaytaradi: [(product_id, is_low), ...]
+    """
+    state = _state(tenant_id)
+    transitions = []
+    with _lock:
+        if not state.loaded:
+            return transitions  # Kesh hali yuklanmagan, birinchi so'rovda bazadan o'qiladi
+        for product in products:
+            new_entry = [product.name, product.quantity_grams, product.min_stock_grams, product.unit]
+            old_entry = state.products.get(product.id)
+            was_low = _is_low(old_entry) if old_entry else False
+            state.products[product.id] = new_entry
+            is_low = _is_low(new_entry)
+            if was_low != is_low:
+                transitions.append((product.id, is_low))
+        state.version += 1
+    return transitions
+
+
+def remove_product(product_id: int, tenant_id: Optional[int] = None) -> None:
+    state = _state(tenant_id)
+    with _lock:
+        if not state.loaded:
+            return
+        state.products.pop(product_id, None)
+        state.version += 1
+
+
+def invalidate() -> None:
+    """Barcha tenantlar keshini tashlab yuboradi, keyingi so'rovda bazadan qayta yuklanadi."""
+    with _lock:
+        for state in _tenants.values():
+            state.loaded = False
+
+
+def get_stock_levels(db: Session) -> List[dict]:
+    """Barcha mahsulotlarning joriy qoldig'i (masalan, SSE mijozlari uchun boshlang'ich holat)."""
+    state = _ensure_loaded(db)
+    with _lock:
+        return [
+            {"product_id": product_id, "product_name": entry[0], "quantity_grams": entry[1], "is_low": _is_low(entry)}
+            for product_id, entry in state.products.items()
+        ]
+
+
+def get_low_stock_alerts(db: Session, minimum_threshold_grams: Optional[float] = None) -> Tuple[str, List[schemas.LowStockAlert]]:
+    """
+    (etag, alerts) qaytaradi. minimum_threshold_grams berilsa, u barcha mahsulotlar uchun
+    ishlatiladi, aks holda har bir mahsulotning o'z chegarasi (yoki standart chegara).
+    """
+    state = _ensure_loaded(db)
+    with _lock:
+        version = state.version
+        snapshot = [(product_id, *entry) for product_id, entry in state.products.items()]
+    alerts = []
+    for product_id, name, quantity_grams, min_stock_grams, unit in sorted(snapshot, key=lambda item: item[1]):
+        threshold = minimum_threshold_grams if minimum_threshold_grams is not None else effective_threshold(min_stock_grams)
+        if quantity_grams < threshold:
+            alerts.append(build_low_stock_alert(product_id, name, quantity_grams, threshold, unit))
+    threshold_key = "p" if minimum_threshold_grams is None else str(minimum_threshold_grams)
+    etag = f'"lowstock-{_boot_id}-{database.current_tenant_id()}-{version}-{threshold_key}"'
+    return etag, alerts
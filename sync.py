@@ -0,0 +1,262 @@
+"""
+Oflayn ishlaydigan planshetlar uchun paketli sinxronlash (POST /sync).
+
+Qurilma internet yo'qligida bajarilgan amallarni (ovqat berish, kirim) o'z vaqti
+(client_time) bilan navbatga yozadi va aloqa tiklanganda bitta paketda yuboradi.
+Amallar yuborilgan tartibda, bitta tranzaksiya ichida qo'llanadi: har bir amal
+alohida SAVEPOINT'da bajariladi, shuning uchun muvaffaqiyatsiz amal (masalan,
+qoldiq yetarli emas) faqat o'zini bekor qiladi va natijada 'conflict' yoki
+'rejected' deb qaytadi. atomic=True bo'lsa, bitta xato butun paketni bekor qiladi.
+
+Har bir op_id idempotency_keys jadvaliga ("sync:" prefiksi bilan) yoziladi, shuning
+uchun javobi yetib bormagan paketni qayta yuborish amallarni ikki marta qo'llamaydi.
+
+Javobda qurilmaning oxirgi sinxronlash versiyasidan (since_version) keyin o'zgargan
+mahsulotlar (qoldiq, nom, chegara, birliklar) qaytadi. Versiya "c<change_log seq>"
+ko'rinishida: o'zgarishlar jurnali (changes.py) barcha yozish amallarini qamraydi.
+Shu orada mahsulot o'chirilgan yoki jurnal retention bilan qisqargan bo'lsa, to'liq
+ro'yxat (full_resync) qaytadi.
+"""
+import datetime
+import json
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+import changes, crud, database, http_cache, idempotency, metrics, schemas, utils
+from database import UserRole
+
+OP_KEY_PREFIX = "sync:"
+OP_KEY_TTL = datetime.timedelta(days=30)  # Planshet bir necha kun oflayn bo'lishi mumkin
+MAX_CLIENT_CLOCK_SKEW = datetime.timedelta(minutes=5)
+SERVE_ROLES = (UserRole.admin, UserRole.chef)
+RECEIVE_STOCK_ROLES = (UserRole.admin, UserRole.manager)
+
+_VERSION_PATTERN = re.compile(r"^c(\d+)$")
+
+
+class _OperationFailed(Exception):
+    def __init__(self, status: schemas.SyncOperationStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _to_utc_naive(value: datetime.datetime) -> datetime.datetime:
+    """Bazada vaqtlar UTC bo'yicha, vaqt zonasisiz saqlanadi."""
+    if value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def current_version(db: Session) -> str:
+    latest_seq = crud.get_change_log_bounds(db)[1] or 0
+    return f"c{latest_seq}"
+
+
+def _parse_version(version: Optional[str]) -> Optional[int]:
+    match = _VERSION_PATTERN.match(version or "")
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def changed_products_since(db: Session, version: Optional[str]) -> Tuple[bool, List[database.Product]]:
+    """
+    (full_resync, mahsulotlar). Versiya berilmagan, noto'g'ri yoki jurnal oralig'idan tashqarida bo'lsa,
+    shuningdek shu orada mahsulot o'chirilgan bo'lsa - barcha mahsulotlar. Aks holda - shu versiyadan
+    keyin change_log'ga yozilgan mahsulotlar. Versiya (seq) commit tartibiga mos keladi
+    (database.lock_change_log), shuning uchun versiyadan oldin commit qilinmagan o'zgarish tushib qolmaydi.
+    """
+    since_seq = _parse_version(version)
+    full_resync = since_seq is None or changes.needs_reset(since_seq, *crud.get_change_log_bounds(db))
+    if not full_resync:
+        product_changes = db.query(database.ChangeLog.entity_id, database.ChangeLog.op).filter(
+            database.ChangeLog.seq > since_seq, database.ChangeLog.entity == http_cache.PRODUCTS
+        ).all()
+        full_resync = any(op == database.ChangeOp.delete for _, op in product_changes)
+    if full_resync:
+        return True, db.query(database.Product).order_by(database.Product.id).all()
+    product_ids = {entity_id for entity_id, _ in product_changes}
+    products = db.query(database.Product).filter(
+        database.Product.id.in_(product_ids)
+    ).order_by(database.Product.id).all() if product_ids else []
+    return False, products
+
+
+def _find_op_key(db: Session, user_id: int, op_id: str) -> Optional[database.IdempotencyKey]:
+    return db.query(database.IdempotencyKey).filter(
+        database.IdempotencyKey.user_id == user_id,
+        database.IdempotencyKey.key == OP_KEY_PREFIX + op_id,
+    ).first()
+
+
+def _apply_serve(db: Session, user: database.User, op: schemas.SyncOperation,
+                 client_time: datetime.datetime) -> Dict[str, int]:
+    if user.role not in SERVE_ROLES:
+        raise _OperationFailed(schemas.SyncOperationStatus.rejected, "Chef or admin role required to serve meals.")
+    if op.meal_id is None or op.portions is None:
+        raise _OperationFailed(schemas.SyncOperationStatus.rejected, "meal_id and portions are required for 'serve'.")
+    if not crud.get_meal(db, op.meal_id):
+        raise _OperationFailed(schemas.SyncOperationStatus.rejected, f"Meal with ID {op.meal_id} not found.")
+
+    success, message, log_entry = utils.serve_meal_action(
+        db, meal_id=op.meal_id, user_id=user.id, portions_to_serve=op.portions,
+        serving_time=client_time, commit=False
+    )
+    if not success or not log_entry:
+        # Taom mavjud, demak sabab - qurilma oflayn bo'lgan paytda qoldiq o'zgargan
+        raise _OperationFailed(schemas.SyncOperationStatus.conflict, message)
+    return {"serving_log_id": log_entry.id}
+
+
+def _apply_receive_stock(db: Session, user: database.User, op: schemas.SyncOperation,
+                         client_time: datetime.datetime) -> Dict[str, int]:
+    if user.role not in RECEIVE_STOCK_ROLES:
+        raise _OperationFailed(schemas.SyncOperationStatus.rejected, "Manager or admin role required to receive stock.")
+    if op.product_id is None or op.quantity_received is None:
+        raise _OperationFailed(
+            schemas.SyncOperationStatus.rejected, "product_id and quantity_received are required for 'receive_stock'."
+        )
+    delivery_in = schemas.ProductDeliveryCreate(
+        product_id=op.product_id, quantity_received=op.quantity_received,
+        delivery_date=client_time, supplier=op.supplier, unit_price=op.unit_price, expiry_date=op.expiry_date,
+        unit=op.unit,
+    )
+    try:
+        delivery = crud.create_product_delivery(db, delivery_in=delivery_in, commit=False)
+    except ValueError as e:
+        raise _OperationFailed(schemas.SyncOperationStatus.rejected, str(e))
+    return {"delivery_id": delivery.id}
+
+
+_HANDLERS = {
+    schemas.SyncOperationType.serve: _apply_serve,
+    schemas.SyncOperationType.receive_stock: _apply_receive_stock,
+}
+
+
+def _apply_operation(db: Session, user: database.User, op: schemas.SyncOperation,
+                     now: datetime.datetime) -> schemas.SyncOperationResult:
+    fingerprint = idempotency.request_fingerprint(op.model_dump(mode="json"))
+    existing = _find_op_key(db, user.id, op.op_id)
+    if existing is not None and existing.expires_at > now:
+        if existing.request_fingerprint != fingerprint:
+            return schemas.SyncOperationResult(
+                op_id=op.op_id, status=schemas.SyncOperationStatus.rejected,
+                message="op_id was already used for a different operation."
+            )
+        return schemas.SyncOperationResult(
+            op_id=op.op_id, status=schemas.SyncOperationStatus.duplicate,
+            message="Operation was already applied.", **json.loads(existing.response_body or "{}")
+        )
+
+    client_time = _to_utc_naive(op.client_time)
+    if client_time > now + MAX_CLIENT_CLOCK_SKEW:
+        return schemas.SyncOperationResult(
+            op_id=op.op_id, status=schemas.SyncOperationStatus.rejected,
+            message="client_time is in the future. Check the device clock."
+        )
+
+    savepoint = db.begin_nested()
+    try:
+        if existing is not None:
+            db.delete(existing)  # Muddati o'tgan kalit
+        ids = _HANDLERS[op.type](db, user, op, client_time)
+        db.add(database.IdempotencyKey(
+            key=OP_KEY_PREFIX + op.op_id, user_id=user.id, method="SYNC", path=op.type.value,
+            request_fingerprint=fingerprint, status_code=200, response_body=json.dumps(ids),
+            created_at=now, expires_at=now + OP_KEY_TTL,
+        ))
+        db.flush()
+        savepoint.commit()
+    except _OperationFailed as e:
+        savepoint.rollback()
+        return schemas.SyncOperationResult(op_id=op.op_id, status=e.status, message=e.message)
+    except Exception:
+        savepoint.rollback()
+        raise
+    return schemas.SyncOperationResult(
+        op_id=op.op_id, status=schemas.SyncOperationStatus.applied, message="Applied.", **ids
+    )
+
+
+def apply_sync_batch(db: Session, user: database.User, sync_request: schemas.SyncRequest) -> schemas.SyncResponse:
+    """Amallarni tartib bilan qo'llaydi, bitta commit qiladi va o'zgargan qoldiqlarni qaytaradi."""
+    now = datetime.datetime.utcnow()
+    results: List[schemas.SyncOperationResult] = []
+
+    database.begin_write_transaction(db)
+    try:
+        for op in sync_request.operations:
+            result = _apply_operation(db, user, op, now)
+            results.append(result)
+            if sync_request.atomic and result.status not in (
+                schemas.SyncOperationStatus.applied, schemas.SyncOperationStatus.duplicate
+            ):
+                break
+    except Exception:
+        db.rollback()
+        raise
+
+    failed = any(
+        r.status not in (schemas.SyncOperationStatus.applied, schemas.SyncOperationStatus.duplicate) for r in results
+    )
+    if sync_request.atomic and failed:
+        db.rollback()
+        for result in results:
+            if result.status == schemas.SyncOperationStatus.applied:
+                result.status = schemas.SyncOperationStatus.skipped
+                result.message = "Rolled back: another operation in the atomic batch failed."
+                result.serving_log_id = result.delivery_id = None
+        for op in sync_request.operations[len(results):]:
+            results.append(schemas.SyncOperationResult(
+                op_id=op.op_id, status=schemas.SyncOperationStatus.skipped,
+                message="Not attempted: another operation in the atomic batch failed."
+            ))
+    else:
+        db.commit()
+        _notify_applied(db, results)
+
+    # Versiya mahsulotlardan OLDIN o'qiladi: oradagi yozish keyingi sinxronlashda qaytadi, o'tkazib yuborilmaydi
+    sync_version = current_version(db)
+    full_resync, products = changed_products_since(db, sync_request.since_version)
+    return schemas.SyncResponse(
+        results=results,
+        sync_version=sync_version,
+        full_resync=full_resync,
+        changed_stock=[schemas.Product.model_validate(product, from_attributes=True) for product in products],
+    )
+
+
+def _notify_applied(db: Session, results: List[schemas.SyncOperationResult]) -> None:
+    """Commit'dan keyin keshlar va jonli obunachilarni xabardor qiladi."""
+    applied = [r for r in results if r.status == schemas.SyncOperationStatus.applied]
+    if not applied:
+        return
+    delivery_ids = [r.delivery_id for r in applied if r.delivery_id is not None]
+    log_ids = [r.serving_log_id for r in applied if r.serving_log_id is not None]
+    if delivery_ids or log_ids:
+        http_cache.bump(http_cache.DELIVERIES) # Ovqat berish ham lotlar qoldig'ini o'zgartiradi
+    if log_ids:
+        http_cache.bump(http_cache.SERVING_LOGS)
+
+    # Katta oflayn paket uchun ham so'rovlar soni amallar soniga bog'liq emas: hammasi id bo'yicha bir marta olinadi
+    product_ids: Set[int] = set()
+    if delivery_ids:
+        product_ids.update(product_id for (product_id,) in db.query(database.ProductDelivery.product_id).filter(
+            database.ProductDelivery.id.in_(delivery_ids)
+        ))
+    log_entries = db.query(database.MealServingLog).options(
+        selectinload(database.MealServingLog.meal).selectinload(database.Meal.ingredients)
+    ).filter(database.MealServingLog.id.in_(log_ids)).order_by(database.MealServingLog.id).all() if log_ids else []
+    for log_entry in log_entries:
+        product_ids.update(ingredient.product_id for ingredient in log_entry.meal.ingredients)
+
+    products = db.query(database.Product).filter(database.Product.id.in_(product_ids)).all()
+    crud.notify_stock_changed(products)
+    for log_entry in log_entries:
+        utils.publish_meal_served(log_entry, log_entry.meal.name)
+        metrics.MEAL_SERVINGS.inc("sync")
+        metrics.MEAL_PORTIONS_SERVED.inc("sync", amount=log_entry.portions_served)
@@ -0,0 +1,136 @@
+"""
+Bir nechta bog'chani (tenant) bitta deploy'da xizmat qilish.
+
+Har bir so'rovning bog'chasi TenantMiddleware'da aniqlanadi:
+  1. Bearer token'dagi "tid" claim (login paytida foydalanuvchi bog'chasidan yoziladi);
+  2. token bo'lmasa - X-Tenant sarlavhasi (bog'cha slug'i yoki id'si), masalan /auth/token uchun;
+  3. ikkalasi ham bo'lmasa - standart bog'cha (DEFAULT_TENANT_ID), eski mijozlar o'zgarishsiz ishlaydi.
+
+Aniqlangan id database contextvar'iga o'rnatiladi. Shundan keyin:
+  * crud va boshqa modullardagi ORM so'rovlari TenantScoped modellar bo'yicha avtomatik
+    cheklanadi (database._scope_to_tenant), yangi yozuvlarga tenant_id yoziladi;
+  * get_db sessiyasi tenant bazasiga ulanadi (BOGCHA_TENANT_DATABASE_URL berilgan bo'lsa,
+    har bir bog'chaning alohida fayli, aks holda umumiy baza);
+  * xotiradagi keshlar (http_cache, stock_cache, snapshot, idempotency) va SSE hodisalari
+    bog'cha bo'yicha ajratilgan.
+
+Bog'chalar ro'yxati doim umumiy bazadagi tenants jadvalida. Yangi bog'cha create_tenant()
+bilan (POST /tenants) yaratiladi.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import crud, database, schemas, security
+from database import UserRole
+
+logger = logging.getLogger(__name__)
+
+TENANT_HEADER = "X-Tenant"
+REGISTRY_CACHE_SECONDS = 30.0  # Boshqa worker'da o'chirilgan/yaratilgan bog'cha shuncha vaqtda ko'rinadi
+
+
+class UnknownTenantError(LookupError):
+    pass
+
+
+# slug yoki id (satr) -> (tenant_id, is_active, o'qilgan vaqt)
+_registry: Dict[str, Tuple[int, bool, float]] = {}
+_registry_lock = threading.Lock()
+
+
+def _lookup(identifier: str) -> Tuple[int, bool]:
+    now = time.monotonic()
+    with _registry_lock:
+        cached = _registry.get(identifier)
+    if cached is not None and now - cached[2] < REGISTRY_CACHE_SECONDS:
+        return cached[0], cached[1]
+    tenants = database.Tenant.__table__
+    condition = tenants.c.id == int(identifier) if identifier.isdigit() else tenants.c.slug == identifier
+    with database.engine.connect() as conn:
+        row = conn.execute(select(tenants.c.id, tenants.c.is_active).where(condition)).first()
+    if row is None:
+        raise UnknownTenantError(identifier)
+    with _registry_lock:
+        _registry[identifier] = (row.id, bool(row.is_active), now)
+    return row.id, bool(row.is_active)
+
+
+def resolve_tenant(token: Optional[str], header_value: Optional[str]) -> int:
+    """So'rov bog'chasi id'si. Bog'cha topilmasa yoki faol bo'lmasa UnknownTenantError."""
+    tenant_id = security.decode_tenant_from_token(token) if token else None
+    if tenant_id is not None:
+        identifier = str(tenant_id)
+    elif header_value:
+        identifier = header_value.strip().lower()
+    else:
+        return database.DEFAULT_TENANT_ID
+    tenant_id, is_active = _lookup(identifier)
+    if not is_active:
+        raise UnknownTenantError(identifier)
+    return tenant_id
+
+
+def all_tenant_ids() -> List[int]:
+    with database.engine.connect() as conn:
+        return [row[0] for row in conn.execute(select(database.Tenant.id).order_by(database.Tenant.id))]
+
+
+def maintenance_scopes() -> List[Optional[int]]:
+    """
+    Fon vazifalari (retention) qaysi kontekstlarda bajarilishi kerak: umumiy bazada bitta
+    cheklanmagan kontekst (None), alohida bazalar rejimida har bir bog'cha.
+    """
+    if database.TENANT_DATABASE_URL is None:
+        return [None]
+    return all_tenant_ids()
+
+
+def get_tenants() -> List[database.Tenant]:
+    db = database.SessionLocal()  # Ro'yxat doim umumiy bazada
+    try:
+        return db.query(database.Tenant).order_by(database.Tenant.id).all()
+    finally:
+        db.close()
+
+
+def create_tenant(tenant_in: schemas.TenantCreate) -> database.Tenant:
+    """Bog'chani ro'yxatga qo'shadi, kerak bo'lsa bazasini yaratadi va birinchi admin foydalanuvchini qo'shadi."""
+    import migrations
+
+    registry_db = database.SessionLocal()
+    try:
+        tenant = database.Tenant(slug=tenant_in.slug.lower(), name=tenant_in.name, is_active=True)
+        registry_db.add(tenant)
+        try:
+            registry_db.commit()
+        except IntegrityError:
+            registry_db.rollback()
+            raise ValueError(f"Tenant with slug '{tenant_in.slug}' already exists.")
+        registry_db.refresh(tenant)
+        registry_db.expunge(tenant)
+    finally:
+        registry_db.close()
+
+    url = database.tenant_database_url(tenant.id)
+    if url is not None:
+        tenant_engine = database.create_database_engine(url)
+        try:
+            migrations.upgrade(tenant_engine, tenant_database=True)
+        finally:
+            tenant_engine.dispose()
+
+    with database.tenant_scope(tenant.id):
+        db = database.new_session()
+        try:
+            crud.create_user(db, schemas.UserCreate(
+                username=tenant_in.admin_username, password=tenant_in.admin_password, role=UserRole.admin,
+            ))
+        finally:
+            db.close()
+    logger.info("Yangi bog'cha yaratildi: %s (id=%s)", tenant.slug, tenant.id, extra={"tenant_id": tenant.id})
+    return tenant
@@ -0,0 +1,121 @@
+"""
+Testlar uchun umumiy fixture'lar.
+
+Ilova vaqtinchalik SQLite bazasi bilan bir marta (sessiya uchun) ishga tushiriladi. Har bir test
+o'z bog'chasini (tenant) oladi - ma'lumotlar, keshlar va o'zgarishlar jurnali testlar orasida
+aralashmaydi. Ishga tushirish: loyiha ildizidan `python -m pytest -q tests`.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_data_dir = tempfile.mkdtemp(prefix="bogcha-tests-")
+os.environ["BOGCHA_DATABASE_URL"] = f"sqlite:///{_data_dir}/bogcha_test.db"
+os.environ.setdefault("BOGCHA_LOG_LEVEL", "WARNING")
+
+import pytest
+from fastapi.testclient import TestClient
+
+ADMIN_USERNAME, ADMIN_PASSWORD = "admin", "adminpassword"  # 2-migratsiya yaratadi
+
+
+def login(client, username: str, password: str, tenant_slug: str = None) -> dict:
+    headers = {"X-Tenant": tenant_slug} if tenant_slug else {}
+    response = client.post("/auth/token", data={"username": username, "password": password}, headers=headers)
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class Kitchen:
+    """Bitta bog'cha nomidan API chaqiruvlari uchun qisqa yordamchilar."""
+
+    def __init__(self, client, headers: dict, tenant_id: int, slug: str):
+        self.client = client
+        self.headers = headers
+        self.tenant_id = tenant_id
+        self.slug = slug
+
+    def get(self, path: str, **kwargs):
+        return self.client.get(path, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.client.post(path, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def put(self, path: str, **kwargs):
+        return self.client.put(path, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def delete(self, path: str, **kwargs):
+        return self.client.delete(path, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def product(self, name: str = None, quantity: float = 0.0, **fields) -> dict:
+        response = self.post("/products/type", json={"name": name or f"Mahsulot {uuid.uuid4().hex[:6]}",
+                                                     "initial_quantity_grams": quantity, **fields})
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    def receive(self, product_id: int, quantity: float, **fields) -> dict:
+        response = self.post(f"/products/{product_id}/receive_stock",
+                             json={"product_id": product_id, "quantity_received": quantity, **fields})
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    def meal(self, ingredients, name: str = None) -> dict:
+        """ingredients: [(product_id, gramm), ...] yoki tayyor lug'atlar ro'yxati."""
+        payload = [
+            item if isinstance(item, dict) else {"product_id": item[0], "required_grams": item[1]}
+            for item in ingredients
+        ]
+        response = self.post("/meals/", json={"name": name or f"Taom {uuid.uuid4().hex[:6]}", "ingredients": payload})
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    def serve(self, meal_id: int, portions: int, **kwargs):
+        return self.post(f"/serve/{meal_id}", json={"portions_to_serve": portions}, **kwargs)
+
+    def stock(self, product_id: int) -> float:
+        response = self.get(f"/products/{product_id}")
+        assert response.status_code == 200, response.text
+        return response.json()["quantity_grams"]
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client) -> dict:
+    """Standart bog'cha admini (platforma admini)."""
+    return login(client, ADMIN_USERNAME, ADMIN_PASSWORD)
+
+
+def make_kitchen(client, admin_headers: dict) -> Kitchen:
+    """Yangi bog'cha va uning admini: test ma'lumotlari boshqa testlarnikidan ajratilgan."""
+    slug = f"test-{uuid.uuid4().hex[:10]}"
+    response = client.post("/tenants/", headers=admin_headers, json={
+        "slug": slug, "name": slug, "admin_username": "admin", "admin_password": "secret-pass",
+    })
+    assert response.status_code == 201, response.text
+    return Kitchen(client, login(client, "admin", "secret-pass", slug), response.json()["id"], slug)
+
+
+@pytest.fixture
+def kitchen(client, admin_headers) -> Kitchen:
+    return make_kitchen(client, admin_headers)
+
+
+@pytest.fixture
+def db():
+    """Standart bog'cha kontekstidagi to'g'ridan-to'g'ri sessiya."""
+    import database
+    session = database.new_session()
+    try:
+        yield session
+    finally:
+        session.close()
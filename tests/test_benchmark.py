@@ -0,0 +1,55 @@
+import asyncio
+
+import benchmark
+
+
+def test_recorder_summary_counts_errors_and_percentiles():
+    recorder = benchmark.Recorder()
+    for i in range(1, 101):
+        recorder.add("GET /products", i / 1000.0, 200, 2, 0.5)
+    recorder.add("POST /serve", 0.010, 400, 5, 1.0)
+    recorder.add("POST /serve", 0.020, 200, 7, 3.0)
+
+    summary = recorder.summary(elapsed=2.0)
+    assert summary["requests"] == 102 and summary["errors"] == 1
+    assert summary["throughput_rps"] == 51.0
+
+    products = summary["endpoints"]["GET /products"]
+    assert products["latency_ms"]["p50"] == 50.5 and products["latency_ms"]["max"] == 100.0
+    assert products["sql_per_request"] == {"mean": 2.0, "max": 2}
+
+    serve = summary["endpoints"]["POST /serve"]
+    assert serve["status_codes"] == {"200": 1, "400": 1} and serve["errors"] == 1
+    assert serve["db_time_ms"]["mean"] == 2.0
+
+
+def test_empty_recorder_summary():
+    summary = benchmark.Recorder().summary(elapsed=0)
+    assert summary["requests"] == 0 and summary["throughput_rps"] is None and summary["endpoints"] == {}
+
+
+def test_run_limited_respects_concurrency():
+    running = peak = 0
+
+    async def task():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+
+    asyncio.run(benchmark._run_limited(3, [task] * 10))
+    assert peak == 3 and running == 0
+
+
+def test_refuses_to_overwrite_existing_database(tmp_path):
+    existing = tmp_path / "bench.db"
+    existing.write_bytes(b"")
+    assert benchmark.main(["--db", str(existing)]) == 2
+    assert existing.read_bytes() == b""
+
+
+def test_parse_args_defaults_cover_all_scenarios():
+    args = benchmark.parse_args([])
+    assert args.scenarios == list(benchmark.SCENARIOS)
+    assert benchmark.parse_args(["--scenarios", "login_burst"]).scenarios == ["login_burst"]
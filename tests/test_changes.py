@@ -0,0 +1,105 @@
+def _changes(kitchen, since: int, **params) -> dict:
+    response = kitchen.get("/changes", params={"since": since, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _latest(kitchen) -> int:
+    # Yangi bog'cha uchun since=0 jurnal oralig'idan tashqarida: reset javobi joriy seq'ni beradi
+    return _changes(kitchen, 0)["latest_seq"]
+
+
+def test_feed_returns_changed_objects_once_and_tombstones(kitchen):
+    rice = kitchen.product("Guruch", quantity=100)
+    salt = kitchen.product("Tuz", quantity=100)
+    since = _latest(kitchen)
+
+    kitchen.receive(rice["id"], 50)
+    kitchen.receive(rice["id"], 25)
+    meal = kitchen.meal([(rice["id"], 10)])
+    assert kitchen.delete(f"/products/{salt['id']}").status_code == 200
+
+    feed = _changes(kitchen, since)
+    assert not feed["reset"] and not feed["has_more"]
+    assert [(p["id"], p["quantity_grams"]) for p in feed["products"]] == [(rice["id"], 175)]  # Ikki o'zgarish - bitta yozuv
+    assert len(feed["deliveries"]) == 2
+    assert [m["id"] for m in feed["meals"]] == [meal["id"]]
+    assert {(t["entity"], t["id"]) for t in feed["deleted"]} >= {("products", salt["id"])}
+    assert feed["next_since"] == feed["latest_seq"]
+
+    assert _changes(kitchen, feed["next_since"])["products"] == []
+
+
+def test_feed_pages_with_has_more(kitchen):
+    since = _latest(kitchen)
+    created = [kitchen.product(quantity=1)["id"] for _ in range(5)]
+    seen, pages = [], 0
+    while True:
+        page = _changes(kitchen, since, limit=2)
+        seen += [p["id"] for p in page["products"]]
+        since, pages = page["next_since"], pages + 1
+        if not page["has_more"]:
+            break
+    # Boshlang'ich qoldiqli mahsulot bir nechta jurnal qatori yozadi - sahifalar orasida takrorlanishi mumkin
+    assert sorted(set(seen)) == created and pages >= 3
+
+
+def test_feed_resets_when_since_is_out_of_range(kitchen):
+    kitchen.product(quantity=1)
+    latest = _latest(kitchen)
+    feed = _changes(kitchen, latest + 1000)
+    assert feed["reset"] and feed["next_since"] == latest
+
+
+def test_users_are_only_visible_to_admin(kitchen, client):
+    since = _latest(kitchen)
+    response = kitchen.post("/users/", json={"username": "oshpaz", "password": "oshpaz-pass", "role": "chef"})
+    assert response.status_code == 201, response.text
+    assert [u["username"] for u in _changes(kitchen, since)["users"]] == ["oshpaz"]
+
+    from conftest import login
+    chef = login(client, "oshpaz", "oshpaz-pass", kitchen.slug)
+    feed = client.get("/changes", params={"since": since}, headers=chef).json()
+    assert feed["users"] == [] and not feed["reset"]
+
+
+def test_feed_requires_authentication(client):
+    assert client.get("/changes", params={"since": 0}).status_code == 401
+
+
+class _FakeSession:
+    """lock_change_log uchun: faqat dialekt, tranzaksiya va bajarilgan so'rovlar."""
+
+    def __init__(self, dialect: str):
+        from types import SimpleNamespace
+        self.info, self.statements, self.transaction = {}, [], None
+        self._bind = SimpleNamespace(dialect=SimpleNamespace(name=dialect))
+
+    def get_bind(self):
+        return self._bind
+
+    def get_transaction(self):
+        return self.transaction
+
+    def execute(self, statement):
+        self.transaction = self.transaction or object()  # Birinchi so'rov tranzaksiyani boshlaydi
+        self.statements.append(statement)
+
+
+def test_change_log_lock_is_taken_once_per_postgres_transaction():
+    from sqlalchemy.dialects import postgresql
+    import database
+
+    session = _FakeSession("postgresql")
+    database.lock_change_log(session)
+    database.lock_change_log(session)
+    assert len(session.statements) == 1
+    assert "pg_advisory_xact_lock" in str(session.statements[0].compile(dialect=postgresql.dialect()))
+
+    session.transaction = object()  # Commit'dan keyingi yangi tranzaksiya
+    database.lock_change_log(session)
+    assert len(session.statements) == 2
+
+    sqlite_session = _FakeSession("sqlite")
+    database.lock_change_log(sqlite_session)
+    assert sqlite_session.statements == []
@@ -0,0 +1,50 @@
+import datetime
+
+from conftest import login
+
+TODAY = datetime.date.today()  # Ovqat berish vaqti - utcnow, kun chegarasida farq qilmasligi uchun keng davr
+PERIOD = {"start_date": (TODAY - datetime.timedelta(days=1)).isoformat(), "end_date": (TODAY + datetime.timedelta(days=1)).isoformat()}
+
+
+def _remaining(kitchen, product_id: int) -> dict:
+    return {d["id"]: d["remaining_grams"] for d in kitchen.get(f"/products/{product_id}/deliveries").json()}
+
+
+def test_meal_cost_takes_oldest_lots_first(kitchen):
+    rice = kitchen.product(quantity=0)
+    old = kitchen.receive(rice["id"], 1000, unit_price=10, delivery_date="2024-01-01T08:00:00")
+    new = kitchen.receive(rice["id"], 1000, unit_price=20, delivery_date="2024-01-05T08:00:00")
+    meal = kitchen.meal([(rice["id"], 150)])
+    assert kitchen.serve(meal["id"], 10).status_code == 200
+
+    assert _remaining(kitchen, rice["id"]) == {old["id"]: 0, new["id"]: 500}
+    [cost] = kitchen.get("/reports/costs/meals", params=PERIOD).json()
+    assert cost == {
+        "meal_id": meal["id"], "meal_name": meal["name"], "portions_served": 10,
+        "total_cost": 20.0, "cost_per_portion": 2.0, "uncosted_grams": 0.0,  # 1 kg * 10 + 0.5 kg * 20
+    }
+
+
+def test_unpriced_stock_is_reported_as_uncosted(kitchen):
+    salt = kitchen.product(quantity=100)  # Boshlang'ich qoldiq - narxsiz, eng yangi lot
+    kitchen.receive(salt["id"], 100, unit_price=4, delivery_date="2024-02-01T08:00:00")
+    meal = kitchen.meal([(salt["id"], 60)])
+    assert kitchen.serve(meal["id"], 2).status_code == 200
+
+    [day] = kitchen.get("/reports/costs/daily", params=PERIOD).json()
+    assert (day["portions_served"], day["total_cost"], day["uncosted_grams"]) == (2, 0.4, 20.0)
+    monthly = kitchen.get("/reports/costs/monthly", params={"year": datetime.datetime.utcnow().year,
+                                                             "month": datetime.datetime.utcnow().month}).json()
+    assert (monthly["portions_served"], monthly["total_cost"], monthly["cost_per_portion"]) == (2, 0.4, 0.2)
+    assert [m["meal_id"] for m in monthly["meals"]] == [meal["id"]]
+
+
+def test_cost_reports_require_manager(kitchen, client):
+    assert kitchen.post("/users/", json={"username": "oshpaz", "password": "oshpaz-pass", "role": "chef"}).status_code == 201
+    chef = login(client, "oshpaz", "oshpaz-pass", kitchen.slug)
+    assert client.get("/reports/costs/meals", params=PERIOD, headers=chef).status_code == 403
+    assert kitchen.get("/reports/costs/daily").status_code == 422
+    rice = kitchen.product(quantity=0)
+    response = kitchen.post(f"/products/{rice['id']}/receive_stock",
+                            json={"product_id": rice["id"], "quantity_received": 10, "unit_price": -1})
+    assert response.status_code == 422
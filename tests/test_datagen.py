@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+import database
+import datagen
+
+CONFIG = datagen.GeneratorConfig(years=0.05, end_date=datetime.date(2024, 3, 15), products=12, meals=8, groups=2, chefs=1)
+
+
+def _count(engine, model, *where) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model.__table__).where(*where)).scalar()
+
+
+def test_generates_deterministic_rolled_up_history(tmp_path):
+    template = f"sqlite:///{tmp_path}/bogcha_{{kindergarten}}.db"
+    first = datagen.generate(template, CONFIG, kindergartens=1, seed=7)[0]
+    again = datagen.generate(template.replace("bogcha_", "again_"), CONFIG, kindergartens=1, seed=7)[0]
+    rows = lambda result: {name: entry["rows"] for name, entry in result["tables"].items()}
+    assert rows(first) == rows(again)
+
+    engine = create_engine(template.replace("{kindergarten}", "1"))
+    try:
+        assert _count(engine, database.Product) == first["tables"]["products"]["rows"] == 12
+        logs = _count(engine, database.MealServingLog)
+        assert logs == first["tables"]["meal_serving_logs"]["rows"] > 0
+        # Tarix forecast yig'indisiga oldindan yozilgan - qayta yig'ilmaydi
+        assert _count(engine, database.MealServingLog, database.MealServingLog.consumption_rolled_up.is_(False)) == 0
+        assert _count(engine, database.DailyProductConsumption) > 0
+    finally:
+        engine.dispose()
+
+
+def test_refuses_non_empty_database_without_overwrite(tmp_path):
+    url = f"sqlite:///{tmp_path}/bogcha.db"
+    datagen.generate(url, CONFIG)
+    with pytest.raises(ValueError, match="not empty"):
+        datagen.generate(url, CONFIG)
+    assert datagen.generate(url, CONFIG, overwrite=True)[0]["tables"]["products"]["rows"] == 12
+
+
+def test_several_kindergartens_need_placeholder(tmp_path):
+    with pytest.raises(ValueError, match="placeholder"):
+        datagen.generate(f"sqlite:///{tmp_path}/bogcha.db", CONFIG, kindergartens=2)
+    assert datagen.main(["--database-url", f"sqlite:///{tmp_path}/x.db", "--kindergartens", "2"]) == 2
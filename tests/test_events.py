@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import database
+import events
+import main
+
+
+def _ticket(kitchen) -> str:
+    response = kitchen.post("/events/ticket")
+    assert response.status_code == 200, response.text
+    assert response.json()["expires_in"] <= 60
+    return response.json()["ticket"]
+
+
+def test_ticket_opens_stream_with_initial_snapshot(kitchen):
+    product = kitchen.product("Sut", quantity=700)
+    ticket = _ticket(kitchen)
+    with database.tenant_scope(kitchen.tenant_id):
+        snapshot = main._open_event_stream(ticket, None)
+    assert [(p["product_id"], p["quantity_grams"], p["is_low"]) for p in snapshot] == [(product["id"], 700, False)]
+
+
+def test_access_token_is_not_accepted_in_query(kitchen):
+    access_token = kitchen.headers["Authorization"].split(" ", 1)[1]
+    response = kitchen.client.get("/events/stream", params={"ticket": access_token})
+    assert response.status_code == 401
+
+
+def test_ticket_is_not_accepted_as_bearer_token(kitchen):
+    ticket = _ticket(kitchen)
+    response = kitchen.client.get("/products/", headers={"Authorization": f"Bearer {ticket}"})
+    assert response.status_code == 401
+
+
+def test_stream_requires_credentials(client):
+    assert client.get("/events/stream").status_code == 401
+    assert client.post("/events/ticket").status_code == 401
+
+
+def test_ticket_of_other_tenant_is_rejected(kitchen, admin_headers, client):
+    other_ticket = client.post("/events/ticket", headers=admin_headers).json()["ticket"]
+    with database.tenant_scope(kitchen.tenant_id), pytest.raises(HTTPException) as error:
+        main._open_event_stream(other_ticket, None)
+    assert error.value.status_code == 401
+
+
+def test_serve_publishes_stock_changes(kitchen):
+    product = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(product["id"], 100)])
+
+    async def collect():
+        with database.tenant_scope(kitchen.tenant_id):
+            subscriber = events.subscribe()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: kitchen.serve(meal["id"], 2))
+            return await subscriber.next_message(timeout=5)
+        finally:
+            events.unsubscribe(subscriber)
+
+    message = asyncio.run(collect())
+    assert message is not None and "event: stock_changed" in message
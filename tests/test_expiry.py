@@ -0,0 +1,51 @@
+import datetime
+
+from conftest import login
+
+TODAY = datetime.datetime.utcnow().date()
+
+
+def _day(offset: int) -> str:
+    return (TODAY + datetime.timedelta(days=offset)).isoformat()
+
+
+def _remaining(kitchen, product_id: int) -> dict:
+    return {d["id"]: d["remaining_grams"] for d in kitchen.get(f"/products/{product_id}/deliveries").json()}
+
+
+def test_serving_takes_soonest_expiring_lot_first(kitchen):
+    milk = kitchen.product(quantity=0)
+    undated = kitchen.receive(milk["id"], 500, delivery_date="2024-01-01T08:00:00")
+    late = kitchen.receive(milk["id"], 500, expiry_date=_day(10), delivery_date="2024-01-02T08:00:00")
+    soon = kitchen.receive(milk["id"], 500, expiry_date=_day(2), delivery_date="2024-01-03T08:00:00")
+    meal = kitchen.meal([(milk["id"], 100)])
+
+    assert kitchen.serve(meal["id"], 7).status_code == 200
+    # Avval muddati yaqini, so'ng kechrog'i; muddatsiz (eski bo'lsa ham) eng oxirida
+    assert _remaining(kitchen, milk["id"]) == {undated["id"]: 500, late["id"]: 300, soon["id"]: 0}
+
+
+def test_expiring_alert_lists_open_lots_within_window(kitchen):
+    milk = kitchen.product("Sut", quantity=0)
+    expired = kitchen.receive(milk["id"], 200, expiry_date=_day(-1))
+    soon = kitchen.receive(milk["id"], 300, expiry_date=_day(2))
+    kitchen.receive(milk["id"], 400, expiry_date=_day(30))
+    kitchen.receive(milk["id"], 100)
+
+    alerts = kitchen.get("/alerts/expiring", params={"within_days": 3}).json()
+    assert [(a["delivery_id"], a["days_left"], a["remaining_grams"]) for a in alerts] == [
+        (expired["id"], -1, 200), (soon["id"], 2, 300),
+    ]
+    assert "1 kun oldin o'tgan" in alerts[0]["message"] and "2 kunda tugaydi" in alerts[1]["message"]
+
+    # Sarflangan lot ro'yxatdan chiqadi
+    meal = kitchen.meal([(milk["id"], 200)])
+    assert kitchen.serve(meal["id"], 1).status_code == 200
+    assert [a["delivery_id"] for a in kitchen.get("/alerts/expiring", params={"within_days": 3}).json()] == [soon["id"]]
+
+
+def test_expiring_alert_validation_and_access(kitchen, client):
+    assert kitchen.get("/alerts/expiring", params={"within_days": -1}).status_code == 422
+    assert kitchen.post("/users/", json={"username": "oshpaz", "password": "oshpaz-pass", "role": "chef"}).status_code == 201
+    chef = login(client, "oshpaz", "oshpaz-pass", kitchen.slug)
+    assert client.get("/alerts/expiring", headers=chef).status_code == 403
@@ -0,0 +1,119 @@
+import datetime
+import uuid
+
+import database
+import forecast
+
+
+def _serve_at(kitchen, meal_id: int, portions: int, moment: datetime.datetime) -> None:
+    response = kitchen.post("/sync", json={"operations": [{
+        "op_id": uuid.uuid4().hex, "type": "serve", "client_time": moment.isoformat(),
+        "meal_id": meal_id, "portions": portions,
+    }]})
+    assert response.status_code == 200, response.text
+    assert response.json()["results"][0]["status"] == "applied", response.text
+
+
+def _daily(kitchen, product_id: int) -> dict:
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            forecast.refresh_daily_rollups(db)
+            return {
+                row.day: row.consumed_grams
+                for row in db.query(database.DailyProductConsumption).filter_by(product_id=product_id)
+            }
+        finally:
+            db.close()
+
+
+def test_rollup_uses_served_amounts_not_current_recipe(kitchen):
+    product = kitchen.product(quantity=10000)
+    meal = kitchen.meal([(product["id"], 100)])
+    yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    _serve_at(kitchen, meal["id"], 5, yesterday)
+    assert _daily(kitchen, product["id"]) == {yesterday.date(): 500}
+
+    response = kitchen.put(f"/meals/{meal['id']}", json={
+        "name": meal["name"], "ingredients": [{"product_id": product["id"], "required_grams": 300}],
+    })
+    assert response.status_code == 200, response.text
+    _serve_at(kitchen, meal["id"], 1, yesterday)
+    assert _daily(kitchen, product["id"]) == {yesterday.date(): 800}  # 500 (eski retsept) + 300
+
+
+def test_logs_committed_out_of_id_order_are_not_skipped(kitchen):
+    product = kitchen.product(quantity=10000)
+    meal = kitchen.meal([(product["id"], 10)])
+    assert kitchen.serve(meal["id"], 2).status_code == 200
+    today = datetime.datetime.utcnow().date()
+    assert _daily(kitchen, product["id"]) == {today: 20}
+
+    # Yuqori ID'li log allaqachon yig'ilgan; pastroq ID'li log kechikib "commit" qilinadi
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            log = db.query(database.MealServingLog).filter_by(meal_id=meal["id"]).one()
+            late_log = database.MealServingLog(
+                meal_id=meal["id"], served_by_user_id=log.served_by_user_id, portions_served=1, serving_time=log.serving_time,
+            )
+            db.add(late_log)
+            db.flush()
+            db.add(database.LotAllocation(
+                serving_log_id=late_log.id, product_id=product["id"], meal_id=meal["id"],
+                served_at=log.serving_time, allocated_grams=10,
+            ))
+            log.consumption_rolled_up = True
+            db.commit()
+        finally:
+            db.close()
+    assert _daily(kitchen, product["id"]) == {today: 30}
+    assert _daily(kitchen, product["id"]) == {today: 30}  # Ikkinchi marta qo'shilmaydi
+
+
+def test_forecast_reports_daily_rate(kitchen):
+    product = kitchen.product(quantity=5000)
+    meal = kitchen.meal([(product["id"], 100)])
+    yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    _serve_at(kitchen, meal["id"], 7, yesterday)
+
+    response = kitchen.get("/reports/forecast", params={"window_days": 7, "method": "sma"})
+    assert response.status_code == 200, response.text
+    row = next(item for item in response.json() if item["product_id"] == product["id"])
+    assert row["daily_consumption_grams"] == 100  # 700 g / 7 kun
+    assert row["current_quantity_grams"] == 4300
+
+
+def test_forecast_rejects_unknown_method(kitchen):
+    assert kitchen.get("/reports/forecast", params={"method": "arima"}).status_code == 422
+
+
+def _pending_logs(kitchen, meal_id: int) -> int:
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            return db.query(database.MealServingLog).filter_by(meal_id=meal_id, consumption_rolled_up=False).count()
+        finally:
+            db.close()
+
+
+def _rate(kitchen, product_id: int) -> float:
+    response = kitchen.get("/reports/forecast", params={"window_days": 7, "method": "sma"})
+    assert response.status_code == 200, response.text
+    return next(item for item in response.json() if item["product_id"] == product_id)["daily_consumption_grams"]
+
+
+def test_forecast_is_read_only_and_counts_pending_logs_once(kitchen):
+    product = kitchen.product(quantity=5000)
+    meal = kitchen.meal([(product["id"], 100)])
+    yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    _serve_at(kitchen, meal["id"], 7, yesterday)
+
+    assert _rate(kitchen, product["id"]) == 100
+    assert _pending_logs(kitchen, meal["id"]) == 1  # GET yig'ish bayrog'ini qo'ymaydi
+
+    assert forecast.refresh_all_daily_rollups() >= 1  # Scheduler vazifasi
+    assert _pending_logs(kitchen, meal["id"]) == 0
+    _serve_at(kitchen, meal["id"], 7, yesterday)
+    assert _rate(kitchen, product["id"]) == 200  # Yig'ilgan + yig'ilmagan, ikki marta sanalmaydi
+    assert _pending_logs(kitchen, meal["id"]) == 1
@@ -0,0 +1,43 @@
+def _conditional_get(kitchen, path: str, etag: str):
+    return kitchen.get(path, headers={"If-None-Match": etag})
+
+
+def test_products_list_returns_304_until_a_product_changes(kitchen):
+    product = kitchen.product("Guruch", quantity=100)
+    first = kitchen.get("/products/")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    not_modified = _conditional_get(kitchen, "/products/", etag)
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert _conditional_get(kitchen, "/products/", f"W/{etag}").status_code == 304
+
+    kitchen.receive(product["id"], 50)
+    changed = _conditional_get(kitchen, "/products/", etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["quantity_grams"] == 150
+
+
+def test_meal_etag_depends_on_products_and_query(kitchen):
+    product = kitchen.product(quantity=100)
+    meal = kitchen.meal([(product["id"], 10)])
+    etag = kitchen.get(f"/meals/{meal['id']}").headers["ETag"]
+    assert _conditional_get(kitchen, f"/meals/{meal['id']}", etag).status_code == 304
+    assert kitchen.get("/meals/", params={"limit": 5}).headers["ETag"] != kitchen.get("/meals/").headers["ETag"]
+
+    response = kitchen.put(f"/products/{product['id']}/update_info", json={"name": "Yangi nom"})
+    assert response.status_code == 200, response.text
+    changed = _conditional_get(kitchen, f"/meals/{meal['id']}", etag)
+    assert changed.status_code == 200
+
+
+def test_missing_meal_is_not_cached_as_success(kitchen):
+    assert kitchen.get("/meals/999999").status_code == 404
+    assert kitchen.get("/meals/999999").status_code == 404
+
+
+def test_etags_are_not_shared_between_tenants(kitchen, client, admin_headers):
+    etag = kitchen.get("/products/").headers["ETag"]
+    response = client.get("/products/", headers={**admin_headers, "If-None-Match": etag})
+    assert response.status_code == 200
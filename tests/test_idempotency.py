@@ -0,0 +1,101 @@
+import datetime
+import uuid
+
+import database
+import idempotency
+
+
+def _key() -> dict:
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+def test_replayed_serve_does_not_decrement_stock_twice(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    headers = _key()
+
+    first = kitchen.serve(meal["id"], 2, headers=headers)
+    assert first.status_code == 200, first.text
+    replayed = kitchen.serve(meal["id"], 2, headers=headers)
+    assert replayed.status_code == 200
+    assert replayed.headers[idempotency.REPLAY_HEADER] == "true"
+    assert replayed.json() == first.json()
+
+    # Xotiradagi kesh bo'lmasa ham (boshqa worker) javob bazadan qaytariladi
+    with idempotency._front_cache_lock:
+        idempotency._front_cache.clear()
+    assert kitchen.serve(meal["id"], 2, headers=headers).headers[idempotency.REPLAY_HEADER] == "true"
+
+    assert kitchen.stock(rice["id"]) == 800
+    assert len(kitchen.get("/reports/meal_serving_logs", params={"meal_id": meal["id"]}).json()) == 1
+
+
+def test_replayed_receive_creates_one_delivery(kitchen):
+    product = kitchen.product(quantity=0)
+    headers = _key()
+    payload = {"product_id": product["id"], "quantity_received": 250}
+    first = kitchen.post(f"/products/{product['id']}/receive_stock", json=payload, headers=headers)
+    second = kitchen.post(f"/products/{product['id']}/receive_stock", json=payload, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert first.json()["id"] == second.json()["id"]
+    assert kitchen.stock(product["id"]) == 250
+
+
+def test_key_reused_for_different_request_is_rejected(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    headers = _key()
+    assert kitchen.serve(meal["id"], 1, headers=headers).status_code == 200
+    response = kitchen.serve(meal["id"], 3, headers=headers)
+    assert response.status_code == 422
+    assert kitchen.stock(rice["id"]) == 900
+
+
+def test_key_in_progress_returns_409(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    key = uuid.uuid4().hex
+    user_id = kitchen.get("/users/me").json()["id"]
+    now = datetime.datetime.utcnow()
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            db.add(database.IdempotencyKey(
+                key=key, user_id=user_id, method="POST", path=f"/serve/{meal['id']}", request_fingerprint="-",
+                created_at=now, expires_at=now + idempotency.KEY_TTL,
+            ))
+            db.commit()
+        finally:
+            db.close()
+    response = kitchen.serve(meal["id"], 1, headers={"Idempotency-Key": key})
+    assert response.status_code == 409
+    assert kitchen.stock(rice["id"]) == 1000
+
+
+def test_failed_request_releases_key(kitchen):
+    rice = kitchen.product(quantity=50)
+    meal = kitchen.meal([(rice["id"], 100)])
+    headers = _key()
+    assert kitchen.serve(meal["id"], 1, headers=headers).status_code == 400
+    kitchen.receive(rice["id"], 100)
+    retried = kitchen.serve(meal["id"], 1, headers=headers)
+    assert retried.status_code == 200 and idempotency.REPLAY_HEADER not in retried.headers
+    assert kitchen.stock(rice["id"]) == 50
+
+
+def test_write_and_stored_response_commit_together(kitchen, monkeypatch):
+    import utils
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    headers = _key()
+
+    def crash(*args):
+        raise RuntimeError("jarayon commit'dan keyin to'xtadi")
+
+    monkeypatch.setattr(utils, "notify_meal_served", crash)
+    assert kitchen.serve(meal["id"], 2, headers=headers).status_code == 500
+    monkeypatch.undo()
+
+    retried = kitchen.serve(meal["id"], 2, headers=headers)
+    assert retried.status_code == 200 and retried.headers[idempotency.REPLAY_HEADER] == "true"
+    assert kitchen.stock(rice["id"]) == 800
@@ -0,0 +1,59 @@
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, update
+
+import database
+import leadership
+import migrations
+
+
+@pytest.fixture
+def lease_name(client):  # client - umumiy baza migratsiya qilingan bo'lishi uchun
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+def test_only_one_worker_holds_the_lease(lease_name):
+    first = leadership.LeaderLease(lease_name, lease_seconds=30)
+    second = leadership.LeaderLease(lease_name, lease_seconds=30)
+    assert first.try_acquire() and first.try_acquire()  # Uzaytirish
+    assert not second.try_acquire() and not second.is_leader
+
+    first.release()
+    assert not first.is_leader
+    assert second.try_acquire()  # Bo'shatilgan ijara darhol olinadi
+    assert not first.try_acquire()
+
+
+def test_expired_lease_is_taken_over(lease_name):
+    stalled = leadership.LeaderLease(lease_name, lease_seconds=30)
+    assert stalled.try_acquire()
+    table = database.SchedulerLease.__table__
+    with database.engine.begin() as conn:
+        conn.execute(update(table).where(table.c.name == lease_name)
+                     .values(expires_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=1)))
+    standby = leadership.LeaderLease(lease_name, lease_seconds=30)
+    assert standby.try_acquire()
+    assert not stalled.try_acquire() and not stalled.is_leader
+
+
+def test_leader_only_skips_job_on_followers(lease_name):
+    leader = leadership.LeaderLease(lease_name)
+    follower = leadership.LeaderLease(lease_name)
+    calls = []
+    job = lambda: calls.append(1) or "ok"
+    assert leadership.leader_only(job, leader)() == "ok"
+    assert leadership.leader_only(job, follower)() is None
+    assert calls == [1]
+
+
+def test_database_error_drops_leadership(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/lease.db")
+    migrations.upgrade(engine, target=3)
+    lease = leadership.LeaderLease("scheduler", engine=engine)
+    assert lease.try_acquire()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE scheduler_leases")
+    assert not lease.try_acquire() and not lease.is_leader  # Ijarani tasdiqlab bo'lmasa - yetakchi emas
+    engine.dispose()
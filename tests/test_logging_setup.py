@@ -0,0 +1,53 @@
+import json
+import logging
+import queue
+import sys
+
+import logging_setup
+
+
+def _record(message="Mahsulot %s qo'shildi", args=("Guruch",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("crud", logging.INFO, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    token = logging_setup.set_request_id("abc123")
+    try:
+        record = _record(product_id=7)
+        logging_setup.RequestIdFilter().filter(record)
+    finally:
+        logging_setup.reset_request_id(token)
+    entry = json.loads(logging_setup.JsonFormatter().format(record))
+    assert entry["message"] == "Mahsulot Guruch qo'shildi"
+    assert (entry["request_id"], entry["product_id"], entry["level"], entry["logger"]) == ("abc123", 7, "INFO", "crud")
+    assert logging_setup.request_id_var.get() == "-"
+
+
+def test_queue_handler_renders_message_and_traceback_before_enqueueing():
+    log_queue = queue.SimpleQueue()
+    handler = logging_setup._QueueHandler(log_queue)
+    try:
+        raise RuntimeError("baza band")
+    except RuntimeError:
+        record = _record(exc_info=None)
+        record.exc_info = sys.exc_info()
+    handler.handle(record)
+    queued = log_queue.get_nowait()
+    assert queued.msg == "Mahsulot Guruch qo'shildi" and queued.args is None
+    assert queued.exc_info is None and "RuntimeError: baza band" in queued.exc_text
+    assert "RuntimeError" in json.loads(logging_setup.JsonFormatter().format(queued))["exc_info"]
+
+
+def test_parse_levels_ignores_malformed_items():
+    assert logging_setup._parse_levels("main=debug, sqlalchemy = warning,broken,=INFO,") == {
+        "main": "DEBUG", "sqlalchemy": "WARNING",
+    }
+
+
+def test_request_id_is_echoed_or_generated(client):
+    response = client.get("/metrics", headers={logging_setup.REQUEST_ID_HEADER: "x" * 100})
+    assert response.headers[logging_setup.REQUEST_ID_HEADER] == "x" * 64
+    generated = client.get("/metrics").headers[logging_setup.REQUEST_ID_HEADER]
+    assert len(generated) == 32 and generated != client.get("/metrics").headers[logging_setup.REQUEST_ID_HEADER]
@@ -0,0 +1,52 @@
+import re
+import threading
+
+import metrics
+
+
+def _sample(text: str, line_prefix: str) -> float:
+    match = re.search(rf"^{re.escape(line_prefix)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_counter_and_histogram_merge_thread_shards():
+    counter = metrics.Counter("test_total", "Sinov.", ("kind",))
+    histogram = metrics.Histogram("test_seconds", "Sinov.", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(100):
+            counter.inc("a")
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc('x"y')
+
+    assert counter.render()[2:] == ['test_total{kind="a"} 400', 'test_total{kind="x\\"y"} 1']
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 0', 'test_seconds_bucket{le="1"} 400', 'test_seconds_bucket{le="+Inf"} 400',
+        "test_seconds_sum 200", "test_seconds_count 400",
+    ]
+
+
+def test_metrics_endpoint_reports_routes_and_servings(kitchen, client):
+    rice = kitchen.product(quantity=100)
+    meal = kitchen.meal([(rice["id"], 100)])
+    before = client.get("/metrics").text
+
+    assert kitchen.serve(meal["id"], 1).status_code == 200
+    assert kitchen.serve(meal["id"], 1).status_code == 400
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    after = response.text
+
+    for prefix, delta in [
+        ('bogcha_meal_servings_total{source="api"}', 1),
+        ('bogcha_stock_deduction_failures_total{reason="insufficient_stock"}', 1),
+        ('bogcha_http_request_duration_seconds_count{method="POST",route="/serve/{meal_id}",status="400"}', 1),
+    ]:
+        assert _sample(after, prefix) - _sample(before, prefix) == delta, prefix
+    assert f"/serve/{meal['id']}\"" not in after  # Yorliq - route shabloni, aniq yo'l emas
@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import database
+import migrations
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/migrations.db")
+    yield engine
+    engine.dispose()
+
+
+def test_fresh_database_matches_models(engine):
+    assert migrations.upgrade(engine) == [version for version, _, _ in migrations.get_migrations()]
+    inspector = inspect(engine)
+    for table in database.Base.metadata.sorted_tables:
+        assert {c["name"] for c in inspector.get_columns(table.name)} == set(table.columns.keys()), table.name
+        index_names = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= index_names, table.name
+    assert migrations.upgrade(engine) == []
+    assert migrations.check_schema(engine, auto_migrate=False) == migrations.latest_version()
+
+
+def test_old_database_is_upgraded_in_steps(engine):
+    migrations.upgrade(engine, target=1)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, hashed_password, role, is_active) VALUES "
+                          "(1, 'oshpaz', '-', 'chef', 1), (2, 'bosh', '-', 'admin', 1)"))
+        conn.execute(text("INSERT INTO products (id, name, quantity_grams) VALUES (1, 'Tuz', 12.5)"))
+        conn.execute(text("INSERT INTO product_deliveries (id, product_id, quantity_received, delivery_date) VALUES "
+                          "(1, 1, 10, '2024-01-01 00:00:00'), (2, 1, 10, '2024-01-02 00:00:00')"))
+        conn.execute(text("INSERT INTO meals (id, name) VALUES (1, 'Sho''rva')"))
+        conn.execute(text("INSERT INTO meal_ingredients (meal_id, product_id, required_grams) VALUES (1, 1, 0.25)"))
+        conn.execute(text("INSERT INTO meal_serving_logs (id, meal_id, served_by_user_id, portions_served) VALUES (1, 1, 1, 1), (2, 1, 1, 1)"))
+        conn.execute(text("INSERT INTO rollup_state (name, last_processed_id) VALUES ('daily_product_consumption', 1)"))
+
+    migrations.upgrade(engine)
+    session = database.SessionLocal(bind=engine)
+    try:
+        product = session.get(database.Product, 1)
+        assert (product.quantity_grams, product.unit, product.tenant_id) == (12.5, "g", database.DEFAULT_TENANT_ID)
+        # Qoldiq eng yangi kirimlarga taqsimlanadi
+        remaining = {d.id: d.remaining_grams for d in session.query(database.ProductDelivery)}
+        assert remaining == {1: 2.5, 2: 10.0}
+        assert session.query(database.MealIngredient).one().required_grams == 0.25
+        flags = {log.id: log.consumption_rolled_up for log in session.query(database.MealServingLog)}
+        assert flags == {1: True, 2: False}
+        assert session.get(database.Tenant, database.DEFAULT_TENANT_ID).slug == "default"
+        # Standart bog'cha admini avvalgidek platforma huquqini saqlaydi
+        assert {u.username: u.is_platform for u in session.query(database.User)} == {
+            "oshpaz": False, "bosh": True, "admin": True, "manager": True, "chef": False,
+        }
+        # Nom endi faqat bog'cha ichida noyob
+        session.add(database.Product(name="Tuz", quantity_grams=0.0, tenant_id=2, unit="g"))
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_pre_versioned_database_gets_missing_baseline_columns(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, quantity_grams FLOAT NOT NULL)"))
+        conn.execute(text("INSERT INTO products (id, name, quantity_grams) VALUES (1, 'Un', 1000)"))
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert {"min_stock_grams", "delivery_date", "tenant_id", "unit"} <= {c["name"] for c in inspect(conn).get_columns("products")}
+        assert conn.execute(text("SELECT entity, entity_id FROM change_log WHERE entity = 'products'")).all() == [("products", 1)]
+        assert conn.execute(text("SELECT quantity_grams FROM products")).scalar() == 1_000_000
+
+
+def test_outdated_schema_is_rejected_without_auto_migrate(engine):
+    migrations.upgrade(engine, target=3)
+    with pytest.raises(migrations.SchemaOutOfDateError, match="behind"):
+        migrations.check_schema(engine, auto_migrate=False)
+    assert migrations.check_schema(engine, auto_migrate=True) == migrations.latest_version()
+
+
+def test_integer_quantities_are_converted_once(engine):
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products (id, name, quantity_grams, unit, tenant_id) VALUES (1, 'Tuz', 2500, 'g', 1)"))
+        migrations._integer_quantities(conn)  # Qayta bajarish milli-birliklarni yana ko'paytirmaydi
+        assert conn.execute(text("SELECT quantity_grams FROM products")).scalar() == 2500
+
+
+def test_platform_flag_is_not_granted_again(engine):
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET is_platform = 0 WHERE username = 'admin'"))
+        migrations._platform_users(conn)  # Olib qo'yilgan huquq qayta bajarishda qaytarilmaydi
+        assert conn.execute(text("SELECT is_platform FROM users WHERE username = 'admin'")).scalar() == 0
@@ -0,0 +1,61 @@
+import datetime
+import uuid
+
+from sqlalchemy import BigInteger, type_coerce
+
+import database
+import forecast
+
+
+def _raw(kitchen, column, *criteria) -> list:
+    """Bazadagi xom milli-birlik qiymatlari (MilliUnits o'tkazishisiz)."""
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            return [value for (value,) in db.query(type_coerce(column, BigInteger)).filter(*criteria)]
+        finally:
+            db.close()
+
+
+def test_repeated_small_deliveries_and_servings_stay_exact(kitchen):
+    salt = kitchen.product(quantity=0)
+    for _ in range(30):
+        kitchen.receive(salt["id"], 0.1)
+    assert kitchen.stock(salt["id"]) == 3.0
+
+    meal = kitchen.meal([(salt["id"], 0.1)])
+    for _ in range(7):
+        assert kitchen.serve(meal["id"], 1).status_code == 200
+    assert kitchen.stock(salt["id"]) == 2.3
+    assert _raw(kitchen, database.Product.quantity_grams, database.Product.id == salt["id"]) == [2300]
+
+
+def test_insufficient_stock_leaves_quantity_untouched(kitchen):
+    salt = kitchen.product(quantity=0.3)
+    meal = kitchen.meal([(salt["id"], 0.1)])
+    assert kitchen.serve(meal["id"], 4).status_code == 400
+    assert _raw(kitchen, database.Product.quantity_grams, database.Product.id == salt["id"]) == [300]
+
+
+def test_rollup_adds_to_existing_day_in_milli_units(kitchen):
+    salt = kitchen.product(quantity=100)
+    meal = kitchen.meal([(salt["id"], 0.1)])
+    yesterday = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).isoformat()
+
+    def serve_and_roll_up(portions: int) -> None:
+        response = kitchen.post("/sync", json={"operations": [{
+            "op_id": uuid.uuid4().hex, "type": "serve", "client_time": yesterday, "meal_id": meal["id"], "portions": portions,
+        }]})
+        assert response.json()["results"][0]["status"] == "applied", response.text
+        with database.tenant_scope(kitchen.tenant_id):
+            db = database.new_session()
+            try:
+                forecast.refresh_daily_rollups(db)
+            finally:
+                db.close()
+
+    serve_and_roll_up(3)
+    for _ in range(3):
+        serve_and_roll_up(1)  # Mavjud kun qatoriga qo'shiladi
+    consumption = database.DailyProductConsumption
+    assert _raw(kitchen, consumption.consumed_grams, consumption.product_id == salt["id"]) == [600]
@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+
+import planning
+
+DAY = datetime.date(2026, 10, 20)
+
+
+def _plan(kitchen, items):
+    return kitchen.post("/portions/plan", json={"items": [
+        {"meal_id": meal_id, "day": (DAY + datetime.timedelta(days=offset)).isoformat(), "children": children}
+        for meal_id, offset, children in items
+    ]})
+
+
+def test_lp_solver_shares_stock_between_competing_meals():
+    # Mahsulot A: 1-taom 2 g, 2-taom 1 g; mahsulot B: faqat 1-taom 1 g
+    usage = np.array([[2.0, 1.0], [1.0, 0.0]])
+    solution = planning._solve_max_portions_lp(usage, stock=np.array([10.0, 3.0]), upper=np.array([10.0, 10.0]))
+    assert solution.sum() == 10  # Hammasi 2-taomga: 10 porsiya (ochko'z yondashuv 1-taomdan boshlasa 3 + 4 = 7)
+    assert np.all(usage @ solution <= np.array([10.0, 3.0]) + 1e-9)
+
+
+def test_plan_maximises_portions_and_reports_shortfall(kitchen):
+    flour = kitchen.product("Un", quantity=1000)
+    milk = kitchen.product("Sut", quantity=300)
+    pancakes = kitchen.meal([(flour["id"], 100), (milk["id"], 100)])  # Ko'pi bilan 3 porsiya (sut)
+    bread = kitchen.meal([(flour["id"], 50)])
+
+    response = _plan(kitchen, [(pancakes["id"], 0, 5), (bread["id"], 1, 20)])
+    assert response.status_code == 200, response.text
+    plan = response.json()
+    planned = {item["meal_id"]: item["planned_portions"] for item in plan["items"]}
+    assert planned == {pancakes["id"]: 0, bread["id"]: 20}
+    assert plan["total_planned_portions"] == 20 and not plan["fully_feasible"]
+
+    shortfall = {row["product_id"]: row["shortfall_grams"] for row in plan["shortfall"]}
+    assert shortfall == {flour["id"]: 500, milk["id"]: 200}  # 5*100 + 20*50 - 1000; 5*100 - 300
+
+
+def test_plan_is_feasible_when_stock_is_enough(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    plan = _plan(kitchen, [(meal["id"], 0, 4), (meal["id"], 1, 6)]).json()
+    assert [item["planned_portions"] for item in plan["items"]] == [4, 6]
+    assert plan["fully_feasible"] and plan["shortfall"] == []
+
+
+def test_plan_rejects_unknown_meal_and_empty_recipe(kitchen):
+    assert _plan(kitchen, [(999999, 0, 5)]).status_code == 400
+    empty = kitchen.meal([])
+    response = _plan(kitchen, [(empty["id"], 0, 5)])
+    assert response.status_code == 400 and "no ingredients" in response.json()["detail"]
@@ -0,0 +1,69 @@
+import time
+
+import profiling
+from conftest import login
+
+
+def test_admin_request_is_profiled(kitchen, client, admin_headers):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+
+    response = kitchen.get(f"/portions/{meal['id']}/calculate", headers={profiling.PROFILE_HEADER: "cprofile"})
+    assert response.status_code == 200 and response.json()["calculable_portions"] == 10
+    profile_id = int(response.headers[profiling.PROFILE_ID_HEADER])
+
+    profile = client.get(f"/debug/profiles/{profile_id}", headers=admin_headers).json()
+    assert profile["mode"] == "cprofile" and profile["route"] == f"GET /portions/{meal['id']}/calculate"
+    assert profile["sql_count"] == len(profile["sql_timeline"]) > 0
+    assert any("calculate_portions_for_meal" in row["function"] for row in profile["top_functions"])
+    assert client.get(f"/debug/profiles/{profile_id}/pstats", headers=admin_headers).status_code == 200
+    assert client.get(f"/debug/profiles/{profile_id}/folded", headers=admin_headers).status_code == 404
+
+
+def test_sample_mode_produces_folded_stacks(kitchen, client, admin_headers, monkeypatch):
+    rice = kitchen.product(quantity=1000)
+    kitchen.meal([(rice["id"], 100)])
+    original = profiling._run_profiled
+
+    def slow_endpoint(profile_request, function, args, kwargs):
+        def wrapped(*a, **kw):
+            time.sleep(0.05)  # Sampler kamida bir nechta namuna olishi uchun
+            return function(*a, **kw)
+        return original(profile_request, wrapped, args, kwargs)
+
+    monkeypatch.setattr(profiling, "_run_profiled", slow_endpoint)
+    response = kitchen.get("/portions/all/all/calculate", params={"profile": "1"})
+    profile_id = int(response.headers[profiling.PROFILE_ID_HEADER])
+    profile = client.get(f"/debug/profiles/{profile_id}", headers=admin_headers).json()
+    assert profile["mode"] == "sample" and profile["samples"] > 0
+    assert "wrapped" in client.get(f"/debug/profiles/{profile_id}/folded", headers=admin_headers).text
+
+
+def test_non_admin_and_unknown_mode_are_not_profiled(kitchen, client):
+    response = kitchen.post("/users/", json={"username": "oshpaz", "password": "oshpaz-pass", "role": "chef"})
+    assert response.status_code == 201, response.text
+    chef = login(client, "oshpaz", "oshpaz-pass", kitchen.slug)
+    response = client.get("/portions/all/all/calculate", headers={**chef, profiling.PROFILE_HEADER: "sample"})
+    assert response.status_code == 200 and profiling.PROFILE_ID_HEADER not in response.headers
+
+    response = kitchen.get("/portions/all/all/calculate", headers={profiling.PROFILE_HEADER: "perf"})
+    assert profiling.PROFILE_ID_HEADER not in response.headers
+
+
+def test_profiles_are_platform_admin_only(kitchen, client, admin_headers):
+    assert kitchen.get("/debug/profiles").status_code == 403
+    assert client.get("/debug/profiles/999999999", headers=admin_headers).status_code == 404
+
+
+def test_consumption_report_is_computed_once_after_product_lookup(kitchen, monkeypatch):
+    import utils
+    calls = []
+    original = utils.get_ingredient_consumption_data
+    monkeypatch.setattr(utils, "get_ingredient_consumption_data", lambda *args: calls.append(args) or original(*args))
+    params = {"start_date": "2024-01-01", "end_date": "2024-01-31"}
+
+    assert kitchen.get("/reports/ingredient_consumption", params={"product_id": 999999, **params}).status_code == 404
+    assert calls == []
+    rice = kitchen.product(quantity=1000)
+    assert kitchen.get("/reports/ingredient_consumption", params={"product_id": rice["id"], **params}).status_code == 200
+    assert len(calls) == 1
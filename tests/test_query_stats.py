@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import text
+
+import database
+
+
+def test_slow_queries_are_logged_with_route(client, admin_headers, kitchen, monkeypatch):
+    monkeypatch.setattr(database, "SLOW_QUERY_THRESHOLD_MS", 1e-9)  # Har bir so'rov "sekin"
+    product = kitchen.product(quantity=5)
+    assert kitchen.get(f"/products/{product['id']}").status_code == 200
+    monkeypatch.setattr(database, "SLOW_QUERY_THRESHOLD_MS", 0)
+
+    response = client.get("/audit-logs/slow_queries", params={"limit": 200}, headers=admin_headers)
+    assert response.status_code == 200
+    routes = {entry["route"] for entry in response.json()}
+    assert f"GET /products/{product['id']}" in routes
+    assert all(entry["duration_ms"] >= 0 and entry["statement"] for entry in response.json())
+
+
+def test_slow_query_log_is_platform_admin_only(kitchen):
+    assert kitchen.get("/audit-logs/slow_queries").status_code == 403
+
+
+def test_query_stats_count_statements_and_survive_errors(monkeypatch):
+    monkeypatch.setattr(database, "SLOW_QUERY_THRESHOLD_MS", 0)
+    stats, token = database.start_query_stats("test")
+    try:
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 2"))
+            # Xatolik boshlanish vaqtlari stekida qoldiq qoldirmaydi
+            assert conn.info.get("query_start_times") == []
+    finally:
+        database.stop_query_stats(token)
+    assert stats.count == 2 and stats.seconds > 0
+    assert database.current_query_stats() is None
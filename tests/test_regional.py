@@ -0,0 +1,92 @@
+import datetime
+import uuid
+
+import database
+import regional
+import utils
+from conftest import make_kitchen
+
+TODAY = datetime.datetime.utcnow()
+MONTH = {"year": TODAY.year, "month": TODAY.month}
+
+
+def _report(client, admin_headers) -> dict:
+    response = client.get("/reports/regional/monthly_summary", params=MONTH, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _serve_rice(kitchen, name: str, grams: float, portions: int) -> None:
+    rice = kitchen.product(name, quantity=10_000)
+    meal = kitchen.meal([(rice["id"], grams)])
+    assert kitchen.serve(meal["id"], portions).status_code == 200
+
+
+def test_report_merges_kindergartens(kitchen, client, admin_headers):
+    other = make_kitchen(client, admin_headers)
+    name = f"Guruch {uuid.uuid4().hex[:6]}"
+    _serve_rice(kitchen, name, 100, 3)
+    _serve_rice(other, name, 50, 2)
+
+    report = _report(client, admin_headers)
+    assert report["month"] == f"{TODAY.year}-{TODAY.month:02d}" and report["failed_kindergartens"] == []
+    ours = {k["tenant_id"]: k for k in report["kindergartens"]}
+    assert ours[kitchen.tenant_id]["total_prepared_portions"] == 3
+    assert ours[other.tenant_id]["total_prepared_portions"] == 2
+    rice = next(p for p in report["product_consumption"] if p["product_name"] == name)
+    assert (rice["consumed_grams"], rice["kindergarten_count"]) == (400, 2)
+
+
+def test_unchanged_kindergartens_come_from_cache(kitchen, client, admin_headers, monkeypatch):
+    _serve_rice(kitchen, f"Guruch {uuid.uuid4().hex[:6]}", 100, 1)
+    _report(client, admin_headers)
+
+    calls = []
+    original = utils.generate_monthly_report_data
+    monkeypatch.setattr(utils, "generate_monthly_report_data", lambda db, *a: calls.append(1) or original(db, *a))
+    _report(client, admin_headers)
+    assert calls == []
+
+    _serve_rice(kitchen, f"Tuz {uuid.uuid4().hex[:6]}", 1, 1)
+    report = _report(client, admin_headers)
+    assert calls == [1]  # Faqat o'zgargan bog'cha qayta hisoblanadi
+    assert {k["tenant_id"]: k for k in report["kindergartens"]}[kitchen.tenant_id]["total_prepared_portions"] == 2
+
+
+def test_failing_kindergarten_is_reported_not_fatal(kitchen, client, admin_headers, monkeypatch):
+    _serve_rice(kitchen, f"Guruch {uuid.uuid4().hex[:6]}", 100, 1)
+    regional.clear()
+    original = utils.generate_monthly_report_data
+
+    def broken(db, year, month):
+        if database.current_tenant_id() == kitchen.tenant_id:
+            raise RuntimeError("baza javob bermadi")
+        return original(db, year, month)
+
+    monkeypatch.setattr(utils, "generate_monthly_report_data", broken)
+    report = _report(client, admin_headers)
+    assert report["failed_kindergartens"] == [kitchen.slug]
+    assert kitchen.tenant_id not in {k["tenant_id"] for k in report["kindergartens"]}
+
+    monkeypatch.setattr(utils, "generate_monthly_report_data", original)
+    assert _report(client, admin_headers)["failed_kindergartens"] == []  # Xatolik natijasi keshlanmagan
+
+
+def test_report_reads_pending_consumption_without_rolling_it_up(kitchen, client, admin_headers):
+    import forecast
+    name = f"Guruch {uuid.uuid4().hex[:6]}"
+    _serve_rice(kitchen, name, 100, 3)
+
+    def consumed() -> float:
+        return next(p for p in _report(client, admin_headers)["product_consumption"] if p["product_name"] == name)["consumed_grams"]
+
+    assert consumed() == 300
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            assert db.query(database.MealServingLog).filter_by(consumption_rolled_up=False).count() >= 1
+        finally:
+            db.close()
+    forecast.refresh_all_daily_rollups()
+    regional.clear()
+    assert consumed() == 300  # Yig'ilgandan keyin ham ikki marta sanalmaydi
@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+import database
+import retention
+
+
+@pytest.fixture
+def old_audit_logs():
+    """25 ta eski va 3 ta yangi audit yozuvi (standart bog'chada)."""
+    marker = f"retention-test-{datetime.datetime.utcnow().timestamp()}"
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=400)
+    db = database.new_session()
+    try:
+        db.add_all([
+            database.AuditLog(timestamp=old, method="GET", endpoint_path="/old", details=marker) for _ in range(25)
+        ] + [
+            database.AuditLog(timestamp=datetime.datetime.utcnow(), method="GET", endpoint_path="/new", details=marker)
+            for _ in range(3)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    yield marker
+
+
+def _count(marker: str) -> int:
+    db = database.new_session()
+    try:
+        return db.query(database.AuditLog).filter(database.AuditLog.details == marker).count()
+    finally:
+        db.close()
+
+
+def test_policy_deletes_in_chunks_and_reports_lock_wait_separately(client, old_audit_logs):
+    policy = retention.RetentionPolicy(
+        name="test_audit_logs", model=database.AuditLog, timestamp_column=database.AuditLog.timestamp,
+        days_to_keep=365, chunk_size=10, pause_seconds=0,
+    )
+    run = retention.run_policy(policy)
+
+    assert run.success, run.error
+    assert run.rows_deleted >= 25
+    assert run.chunks >= 3  # 10 + 10 + 5 (+ bo'sh bo'lak bo'lishi mumkin)
+    assert _count(old_audit_logs) == 3  # Yangi yozuvlar qoladi
+    assert run.lock_wait_seconds >= 0 and run.delete_seconds > 0
+    assert run.lock_wait_seconds + run.delete_seconds <= run.duration_seconds + 1e-3
+
+
+def test_failed_policy_is_recorded_not_raised(client):
+    policy = retention.RetentionPolicy(
+        name="test_broken", model=database.AuditLog, timestamp_column=None, days_to_keep=1, pause_seconds=0,
+    )
+    run = retention.run_policy(policy)
+    assert not run.success and run.error
+    assert retention.get_recent_runs(limit=1)[0].policy == "test_broken"
+
+
+def test_retention_runs_endpoint_requires_platform_admin(client, admin_headers, kitchen):
+    retention.run_policy(retention.RetentionPolicy(
+        name="test_endpoint", model=database.AuditLog, timestamp_column=database.AuditLog.timestamp,
+        days_to_keep=365, pause_seconds=0,
+    ))
+    response = client.get("/audit-logs/retention/runs", headers=admin_headers)
+    assert response.status_code == 200
+    assert {"lock_wait_seconds", "delete_seconds"} <= set(response.json()[0])
+
+    assert kitchen.get("/audit-logs/retention/runs").status_code == 403
@@ -0,0 +1,44 @@
+def _simulate(kitchen, **payload):
+    response = kitchen.post("/portions/simulate", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_simulation_applies_deliveries_recipe_changes_and_serves_in_order(kitchen):
+    rice = kitchen.product("Guruch", quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+
+    result = _simulate(
+        kitchen,
+        deliveries=[{"product_id": rice["id"], "quantity_received": 500}],
+        recipe_changes=[{"meal_id": meal["id"], "ingredients": [{"product_id": rice["id"], "required_grams": 150}]}],
+        serves=[{"meal_id": meal["id"], "portions": 6}, {"meal_id": meal["id"], "portions": 5}],
+    )
+    assert [r["success"] for r in result["serve_results"]] == [True, False]  # 1500 - 900 = 600 < 750
+    assert result["stock_changes"] == [{
+        "product_id": rice["id"], "product_name": "Guruch", "quantity_before": 1000, "quantity_after": 600,
+    }]
+    assert [p["calculable_portions"] for p in result["portions"] if p["meal_id"] == meal["id"]] == [4]
+    assert [a["product_id"] for a in result["low_stock"]] == []  # 600 >= 500 (standart chegara)
+
+    # Bazaga hech narsa yozilmagan
+    assert kitchen.stock(rice["id"]) == 1000
+    assert kitchen.get(f"/meals/{meal['id']}").json()["ingredients"][0]["required_grams"] == 100
+
+
+def test_simulation_reports_low_stock_with_request_threshold(kitchen):
+    sugar = kitchen.product("Shakar", quantity=800)
+    meal = kitchen.meal([(sugar["id"], 20)])
+    result = _simulate(kitchen, serves=[{"meal_id": meal["id"], "portions": 10}], minimum_threshold=700)
+    assert [a["current_quantity_grams"] for a in result["low_stock"]] == [600]
+
+
+def test_simulation_rejects_unknown_ids(kitchen):
+    product = kitchen.product(quantity=100)
+    meal = kitchen.meal([(product["id"], 10)])
+    for payload in (
+        {"deliveries": [{"product_id": 999999, "quantity_received": 1}]},
+        {"serves": [{"meal_id": 999999, "portions": 1}]},
+        {"recipe_changes": [{"meal_id": meal["id"], "ingredients": [{"product_id": 999999, "required_grams": 1}]}]},
+    ):
+        assert kitchen.post("/portions/simulate", json=payload).status_code == 400
@@ -0,0 +1,70 @@
+import database
+import snapshot
+
+
+def _snapshot(kitchen) -> snapshot.Snapshot:
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        try:
+            return snapshot.get_snapshot(db)
+        finally:
+            db.close()
+
+
+def _portions(current: snapshot.Snapshot) -> dict:
+    return {int(meal_id): int(count) for meal_id, count in zip(current.meal_ids, current.portions())}
+
+
+def test_snapshot_portions_match_integer_stock(kitchen):
+    salt = kitchen.product(quantity=0.3)
+    rice = kitchen.product(quantity=1000)
+    soup = kitchen.meal([(salt["id"], 0.1), (rice["id"], 100)])
+    plov = kitchen.meal([(rice["id"], 300)])
+    empty = kitchen.meal([])
+
+    current = _snapshot(kitchen)
+    assert current.stock[current.product_position[salt["id"]]] == 300  # Milli-birliklarda
+    assert _portions(current) == {soup["id"]: 3, plov["id"]: 3, empty["id"]: 0}
+    assert sorted(current.recipe(current.meal_position[soup["id"]])) == sorted([(salt["id"], 0.1), (rice["id"], 100)])
+
+    # Endpoint'lar ham shu nusxadan hisoblaydi
+    listed = {row["meal_id"]: row["calculable_portions"] for row in kitchen.get("/portions/all/all/calculate").json()}
+    assert listed == _portions(current)
+
+
+def test_stock_change_reuses_recipe_matrix(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    before = _snapshot(kitchen)
+    assert _snapshot(kitchen) is before  # Versiyalar o'zgarmagan
+
+    kitchen.receive(rice["id"], 500)
+    after = _snapshot(kitchen)
+    assert after is not before
+    assert after.indptr is before.indptr and after.data is before.data
+    assert _portions(after) == {meal["id"]: 15}
+
+
+def test_recipe_change_rebuilds_matrix(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    before = _snapshot(kitchen)
+    response = kitchen.put(f"/meals/{meal['id']}", json={
+        "name": meal["name"], "ingredients": [{"product_id": rice["id"], "required_grams": 250}],
+    })
+    assert response.status_code == 200, response.text
+    after = _snapshot(kitchen)
+    assert after.data is not before.data
+    assert _portions(after) == {meal["id"]: 4}
+
+
+def test_snapshots_are_per_tenant(kitchen, client, admin_headers):
+    kitchen.product(quantity=10)
+    current = _snapshot(kitchen)
+    with database.tenant_scope(database.DEFAULT_TENANT_ID):
+        db = database.new_session()
+        try:
+            default = snapshot.get_snapshot(db)
+        finally:
+            db.close()
+    assert not set(current.product_ids.tolist()) & set(default.product_ids.tolist())
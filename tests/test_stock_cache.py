@@ -0,0 +1,46 @@
+def _alert_ids(kitchen, **params):
+    response = kitchen.get("/alerts/low_stock", params=params)
+    assert response.status_code == 200, response.text
+    return {alert["product_id"] for alert in response.json()}
+
+
+def test_low_stock_alerts_follow_receive_serve_and_threshold_changes(kitchen):
+    rice = kitchen.product("Guruch", quantity=1000)
+    salt = kitchen.product("Tuz", quantity=100)
+    assert _alert_ids(kitchen) == {salt["id"]}  # Standart chegara 500 g
+
+    meal = kitchen.meal([(rice["id"], 200)])
+    assert kitchen.serve(meal["id"], 3).status_code == 200
+    assert _alert_ids(kitchen) == {salt["id"], rice["id"]}  # 400 g qoldi
+
+    kitchen.receive(salt["id"], 1000)
+    assert _alert_ids(kitchen) == {rice["id"]}
+
+    response = kitchen.put(f"/products/{rice['id']}/threshold", json={"min_stock_grams": 100})
+    assert response.status_code == 200, response.text
+    assert _alert_ids(kitchen) == set()
+
+    # So'rovdagi chegara mahsulot chegaralaridan ustun
+    assert _alert_ids(kitchen, minimum_threshold=2000) == {rice["id"], salt["id"]}
+
+
+def test_low_stock_etag_changes_only_when_stock_changes(kitchen):
+    product = kitchen.product(quantity=10)
+    first = kitchen.get("/alerts/low_stock")
+    etag = first.headers["ETag"]
+    assert kitchen.get("/alerts/low_stock", headers={"If-None-Match": etag}).status_code == 304
+
+    kitchen.receive(product["id"], 5)
+    second = kitchen.get("/alerts/low_stock", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json()[0]["current_quantity_grams"] == 15
+
+
+def test_low_stock_alerts_are_tenant_scoped(kitchen, client, admin_headers):
+    product = kitchen.product(quantity=1)
+    response = client.get("/alerts/low_stock", headers=admin_headers)
+    assert product["id"] not in {alert["product_id"] for alert in response.json()}
+
+
+def test_low_stock_alerts_require_manager(client):
+    assert client.get("/alerts/low_stock").status_code == 401
@@ -0,0 +1,107 @@
+import datetime
+import uuid
+
+NOW = datetime.datetime.utcnow().isoformat()
+
+
+def _serve_op(meal_id: int, portions: int, op_id: str = None) -> dict:
+    return {"op_id": op_id or uuid.uuid4().hex, "type": "serve", "client_time": NOW, "meal_id": meal_id, "portions": portions}
+
+
+def _receive_op(product_id: int, quantity: float, op_id: str = None) -> dict:
+    return {"op_id": op_id or uuid.uuid4().hex, "type": "receive_stock", "client_time": NOW,
+            "product_id": product_id, "quantity_received": quantity}
+
+
+def _sync(kitchen, operations=(), since_version=None, atomic=False) -> dict:
+    response = kitchen.post("/sync", json={"operations": list(operations), "since_version": since_version, "atomic": atomic})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_failed_operation_rolls_back_only_itself(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    result = _sync(kitchen, [_serve_op(meal["id"], 4), _serve_op(meal["id"], 7), _receive_op(rice["id"], 50)])
+    assert [r["status"] for r in result["results"]] == ["applied", "conflict", "applied"]
+    assert kitchen.stock(rice["id"]) == 650
+
+
+def test_atomic_batch_is_rolled_back_entirely(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    result = _sync(kitchen, [_receive_op(rice["id"], 50), _serve_op(meal["id"], 20), _serve_op(meal["id"], 1)], atomic=True)
+    assert [r["status"] for r in result["results"]] == ["skipped", "conflict", "skipped"]
+    assert kitchen.stock(rice["id"]) == 1000
+    assert [d["quantity_received"] for d in kitchen.get(f"/products/{rice['id']}/deliveries").json()] == [1000]  # Faqat boshlang'ich
+
+
+def test_resent_operation_is_applied_once(kitchen):
+    rice = kitchen.product(quantity=1000)
+    meal = kitchen.meal([(rice["id"], 100)])
+    op = _serve_op(meal["id"], 2)
+    first = _sync(kitchen, [op])["results"][0]
+    second = _sync(kitchen, [op])["results"][0]
+    assert (first["status"], second["status"]) == ("applied", "duplicate")
+    assert first["serving_log_id"] == second["serving_log_id"]
+    assert kitchen.stock(rice["id"]) == 800
+
+    reused = _sync(kitchen, [{**op, "portions": 3}])["results"][0]
+    assert reused["status"] == "rejected"
+
+
+def test_version_covers_product_edits_not_only_stock(kitchen):
+    rice = kitchen.product(quantity=1000)
+    salt = kitchen.product(quantity=1000)
+    version = _sync(kitchen)["sync_version"]
+    assert _sync(kitchen, since_version=version) == {
+        "results": [], "sync_version": version, "full_resync": False, "changed_stock": [],
+    }
+
+    assert kitchen.put(f"/products/{rice['id']}/threshold", json={"min_stock_grams": 50}).status_code == 200
+    result = _sync(kitchen, since_version=version)
+    assert result["sync_version"] != version and not result["full_resync"]
+    assert [(p["id"], p["min_stock_grams"]) for p in result["changed_stock"]] == [(rice["id"], 50)]
+
+    version = result["sync_version"]
+    assert kitchen.put(f"/products/{salt['id']}/update_info", json={"name": "Osh tuzi"}).status_code == 200
+    assert [p["name"] for p in _sync(kitchen, since_version=version)["changed_stock"]] == ["Osh tuzi"]
+
+
+def test_deleted_product_forces_full_resync(kitchen):
+    rice = kitchen.product(quantity=1000)
+    salt = kitchen.product(quantity=1000)
+    version = _sync(kitchen)["sync_version"]
+    assert kitchen.delete(f"/products/{salt['id']}").status_code == 200
+    result = _sync(kitchen, since_version=version)
+    assert result["full_resync"]
+    assert [p["id"] for p in result["changed_stock"]] == [rice["id"]]
+
+
+def test_unknown_version_forces_full_resync(kitchen):
+    kitchen.product(quantity=1)
+    for version in (None, "d1.s2", "c999999999"):
+        assert _sync(kitchen, since_version=version)["full_resync"]
+
+
+def _notify_query_count(kitchen, results) -> int:
+    import database
+    import sync
+    with database.tenant_scope(kitchen.tenant_id):
+        db = database.new_session()
+        stats, token = database.start_query_stats("test")
+        try:
+            sync._notify_applied(db, [sync.schemas.SyncOperationResult(**r) for r in results])
+        finally:
+            database.stop_query_stats(token)
+            db.close()
+    return stats.count
+
+
+def test_notifying_applied_batch_does_not_query_per_operation(kitchen):
+    rice = kitchen.product(quantity=100000)
+    meal = kitchen.meal([(rice["id"], 10)])
+    small = _sync(kitchen, [_serve_op(meal["id"], 1), _receive_op(rice["id"], 5)])["results"]
+    large = _sync(kitchen, [_serve_op(meal["id"], 1) for _ in range(8)] + [_receive_op(rice["id"], 5) for _ in range(8)])["results"]
+    assert all(r["status"] == "applied" for r in small + large)
+    assert _notify_query_count(kitchen, large) == _notify_query_count(kitchen, small)
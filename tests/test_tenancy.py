@@ -0,0 +1,46 @@
+import uuid
+
+from conftest import login, make_kitchen
+
+
+def test_kitchens_do_not_see_each_other(kitchen, client, admin_headers):
+    other = make_kitchen(client, admin_headers)
+    rice = kitchen.product("Guruch", quantity=100)
+    assert other.get(f"/products/{rice['id']}").status_code == 404
+    assert other.product("Guruch", quantity=5)["quantity_grams"] == 5  # Nom faqat bog'cha ichida noyob
+    assert kitchen.stock(rice["id"]) == 100
+
+    # Token'dagi bog'cha X-Tenant sarlavhasidan ustun: boshqa bog'cha ma'lumotlari ko'rinmaydi
+    response = client.get("/products/", headers={**kitchen.headers, "X-Tenant": other.slug})
+    assert [p["id"] for p in response.json()] == [rice["id"]]
+
+
+def test_tenant_admin_has_no_platform_access(kitchen):
+    assert kitchen.get("/users/me").json()["is_platform"] is False
+    assert kitchen.get("/tenants/").status_code == 403
+    assert kitchen.post("/tenants/", json={"slug": "boshqa", "name": "x", "admin_username": "admin",
+                                           "admin_password": "secret-pass"}).status_code == 403
+    assert kitchen.get("/reports/regional/monthly_summary", params={"year": 2024, "month": 1}).status_code == 403
+
+
+def test_only_platform_admin_grants_platform_access(kitchen, client, admin_headers):
+    payload = {"username": "mintaqa", "password": "mintaqa-pass", "role": "manager", "is_platform": True}
+    assert kitchen.post("/users/", json=payload).status_code == 403
+    response = kitchen.post("/users/", json={**payload, "is_platform": False})
+    assert response.status_code == 201, response.text
+    assert kitchen.put(f"/users/{response.json()['id']}", json={"is_platform": True}).status_code == 403
+
+    username = f"mintaqa-{uuid.uuid4().hex[:6]}"
+    response = client.post("/users/", headers=admin_headers, json={**payload, "username": username})
+    assert response.status_code == 201 and response.json()["is_platform"] is True
+    regional = login(client, username, "mintaqa-pass")
+    assert client.get("/reports/regional/monthly_summary", params={"year": 2024, "month": 1}, headers=regional).status_code == 200
+    assert client.get("/tenants/", headers=regional).status_code == 403  # Menejer - faqat hisobot
+
+
+def test_duplicate_slug_is_rejected(kitchen, client, admin_headers):
+    response = client.post("/tenants/", headers=admin_headers, json={
+        "slug": kitchen.slug, "name": "x", "admin_username": "admin", "admin_password": "secret-pass",
+    })
+    assert response.status_code == 400
+    assert kitchen.slug in [t["slug"] for t in client.get("/tenants/", headers=admin_headers).json()]
@@ -0,0 +1,62 @@
+def _set_units(kitchen, product_id: int, conversions: dict):
+    return kitchen.put(f"/products/{product_id}/units",
+                       json=[{"unit": unit, "base_units_per_unit": factor} for unit, factor in conversions.items()])
+
+
+def test_receive_recipe_and_serve_convert_to_base_unit(kitchen):
+    rice = kitchen.product(quantity=0)
+    assert _set_units(kitchen, rice["id"], {"qop": 25000}).status_code == 200
+
+    delivery = kitchen.receive(rice["id"], 1.5, unit="kg", unit_price=12000)
+    assert delivery["quantity_received"] == 1500
+    kitchen.receive(rice["id"], 1, unit="qop")
+    assert kitchen.stock(rice["id"]) == 26500
+
+    meal = kitchen.meal([{"product_id": rice["id"], "required_grams": 0.25, "unit": "kg"}])
+    assert meal["ingredients"][0]["required_grams"] == 250
+    assert kitchen.serve(meal["id"], 6).status_code == 200
+    assert kitchen.stock(rice["id"]) == 25000
+
+
+def test_unknown_or_incompatible_unit_is_rejected(kitchen):
+    milk = kitchen.product(quantity=1000, unit="ml")
+    for unit in ("kg", "quti"):
+        response = kitchen.post(f"/products/{milk['id']}/receive_stock",
+                                json={"product_id": milk["id"], "quantity_received": 1, "unit": unit})
+        assert response.status_code == 400, response.text
+    assert kitchen.stock(milk["id"]) == 1000
+    assert _set_units(kitchen, milk["id"], {"ml": 2}).status_code == 400  # Asosiy birlikni qayta ta'riflab bo'lmaydi
+
+
+def test_simulation_converts_recipe_change_units(kitchen):
+    milk = kitchen.product("Sut", quantity=3000, unit="ml")
+    meal = kitchen.meal([(milk["id"], 100)])
+    change = {"meal_id": meal["id"], "ingredients": [{"product_id": milk["id"], "required_grams": 0.5, "unit": "l"}]}
+
+    result = kitchen.post("/portions/simulate", json={
+        "recipe_changes": [change], "serves": [{"meal_id": meal["id"], "portions": 2}, {"meal_id": meal["id"], "portions": 5}],
+        "minimum_threshold": 2500,
+    }).json()
+    assert [r["success"] for r in result["serve_results"]] == [True, False]  # 3000 - 2 * 500 = 2000 < 5 * 500
+    assert "Required: 2500.0 ml, Available: 2000.0 ml" in result["serve_results"][1]["message"]
+    assert result["stock_changes"][0]["quantity_after"] == 2000
+    assert [a["message"] for a in result["low_stock"]] == ["'Sut' miqdori kam (2000.0 ml). Minimum: 2500.0 ml."]
+
+
+def test_simulation_rejects_unknown_recipe_unit(kitchen):
+    milk = kitchen.product(quantity=3000, unit="ml")
+    meal = kitchen.meal([(milk["id"], 100)])
+    change = {"meal_id": meal["id"], "ingredients": [{"product_id": milk["id"], "required_grams": 1, "unit": "kg"}]}
+    response = kitchen.post("/portions/simulate", json={"recipe_changes": [change]})
+    assert response.status_code == 400 and "kg" in response.json()["detail"]
+
+
+def test_setting_units_invalidates_product_caches(kitchen):
+    rice = kitchen.product(quantity=100)
+    etag = kitchen.get("/products/").headers["ETag"]
+    since = kitchen.get("/changes", params={"since": 0}).json()["latest_seq"]
+
+    assert _set_units(kitchen, rice["id"], {"qop": 25000}).status_code == 200
+    assert kitchen.get("/products/", headers={"If-None-Match": etag}).status_code == 200
+    feed = kitchen.get("/changes", params={"since": since}).json()
+    assert [p["id"] for p in feed["products"]] == [rice["id"]]
@@ -0,0 +1,69 @@
+"""
+O'lchov birliklari.
+
+Har bir mahsulotning asosiy birligi bor: g (massa), ml (hajm) yoki dona. Ombordagi qoldiq,
+retseptlar va kirimlar bazada faqat shu asosiy birlikda saqlanadi (*_grams ustunlari nomi
+tarixiy; massa bo'lmagan mahsulotlarda qiymat ml yoki dona). Kirim va retsept boshqa birlikda
+kiritilsa, yozish paytida bir marta asosiy birlikka o'tkaziladi - porsiya hisoblash va ovqat
+berish kabi tez-tez bajariladigan yo'llarda birlik o'girish yo'q.
+
+Miqdorlar bazada butun son - asosiy birlikning mingdan biri (database.MilliUnits) sifatida
+saqlanadi, API va Python kodi esa asosiy birlikda ishlaydi. Qoldiqni ayirish, porsiya va lot
+hisoblari butun milli-birliklarda bajariladi (to_milli/from_milli), shuning uchun float
+xatoliklari to'planmaydi.
+
+Bir turdagi standart birliklar (kg -> g, l -> ml) avtomatik o'giriladi. Boshqa birliklar
+mahsulotning o'z koeffitsiyentlari bilan beriladi (ProductUnitConversion): masalan, tuxum
+(asosiy birlik - dona) uchun "quti" = 30 dona, sut (ml) uchun "kg" = 970 ml.
+"""
+from typing import Dict, Optional
+
+# Saqlash aniqligi: miqdorlar bazada asosiy birlikning mingdan biri (g uchun mg) sifatida butun son
+MILLI = 1000
+
+MASS, VOLUME, COUNT = "mass", "volume", "count"
+
+BASE_UNITS = {"g": MASS, "ml": VOLUME, "dona": COUNT}
+
+# Standart birlik -> (tur, 1 birlikdagi asosiy birliklar soni)
+STANDARD_UNITS: Dict[str, tuple] = {
+    "mg": (MASS, 0.001),
+    "g": (MASS, 1.0),
+    "kg": (MASS, 1000.0),
+    "ml": (VOLUME, 1.0),
+    "l": (VOLUME, 1000.0),
+    "dona": (COUNT, 1.0),
+}
+
+
+def to_milli(value: float) -> int:
+    """Asosiy birlikdagi miqdor -> butun milli-birlik (eng yaqin butunga yaxlitlanadi)."""
+    return int(round(value * MILLI))
+
+
+def from_milli(value: int) -> float:
+    return value / MILLI
+
+
+class UnitConversionError(ValueError):
+    """Birlik mahsulot asosiy birligiga o'tkazilmaydi."""
+
+
+def normalize_unit_name(unit: str) -> str:
+    return unit.strip().lower()
+
+
+def conversion_factor(base_unit: str, unit: Optional[str], custom_factors: Dict[str, float]) -> float:
+    """
+    1 'unit' necha asosiy birlikka tengligi. unit None bo'lsa - 1 (qiymat allaqachon asosiy birlikda).
+    Mahsulot koeffitsiyenti standart birlikdan ustun. Mos kelmasa UnitConversionError.
+    """
+    if unit is None:
+        return 1.0
+    unit = normalize_unit_name(unit)
+    if unit in custom_factors:
+        return custom_factors[unit]
+    standard = STANDARD_UNITS.get(unit)
+    if standard is not None and standard[0] == BASE_UNITS[base_unit]:
+        return standard[1] / STANDARD_UNITS[base_unit][1]
+    raise UnitConversionError(f"Unit '{unit}' is not compatible with base unit '{base_unit}'. Add a conversion factor for this product.")
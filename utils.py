@@ -1,93 +1,168 @@
 from sqlalchemy.orm import Session
-import database, crud, schemas 
-from typing import List, Dict, Tuple, Optional
+from sqlalchemy import func, literal
+import database, crud, schemas, stock_cache, events, snapshot, http_cache, metrics, costing, units
+from typing import Iterable, List, Dict, Tuple, Optional
 import datetime
+import logging
 
-MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS = 500
+logger = logging.getLogger(__name__)
+
+MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS = stock_cache.MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS
 
 def calculate_portions_for_meal(db: Session, meal_id: int) -> int:
-    meal = crud.get_meal(db, meal_id)
-    if not meal or not meal.ingredients:
+    current = snapshot.get_snapshot(db)
+    position = current.meal_position.get(meal_id)
+    if position is None:
         return 0
-    min_portions = float('inf')
-    for ingredient_recipe in meal.ingredients:
-        product = crud.get_product(db, ingredient_recipe.product_id)
-        if not product or product.quantity_grams <= 0 or ingredient_recipe.required_grams <= 0:
-            return 0
-        portions_for_this_ingredient = product.quantity_grams // ingredient_recipe.required_grams
-        min_portions = min(min_portions, portions_for_this_ingredient)
-    return int(min_portions) if min_portions != float('inf') else 0
+    return int(current.portions()[position])
 
 def calculate_portions_for_all_meals(db: Session) -> List[schemas.PortionCalculationResponse]:
-    all_meals = crud.get_meals(db, limit=1000)
-    response = []
-    for meal in all_meals:
-        portions = calculate_portions_for_meal(db, meal.id)
-        response.append(schemas.PortionCalculationResponse(
-            meal_id=meal.id,
-            meal_name=meal.name,
-            calculable_portions=portions
-        ))
-    return response
-
-def serve_meal_action(db: Session, meal_id: int, user_id: int, portions_to_serve: int) -> Tuple[bool, str, Optional[database.MealServingLog]]:
-    """Ovqat berish: ko'p porsiya uchun ingredientlarni ayrish va log yozish."""
+    current = snapshot.get_snapshot(db)
+    portions = current.portions()
+    return [
+        schemas.PortionCalculationResponse(
+            meal_id=int(meal_id),
+            meal_name=meal_name,
+            calculable_portions=int(meal_portions)
+        )
+        for meal_id, meal_name, meal_portions in zip(current.meal_ids, current.meal_names, portions)
+    ]
+
+def publish_meal_served(log_entry: database.MealServingLog, meal_name: str) -> None:
+    events.publish("meal_served", {
+        "log_id": log_entry.id,
+        "meal_id": log_entry.meal_id,
+        "meal_name": meal_name,
+        "portions_served": log_entry.portions_served,
+        "served_by_user_id": log_entry.served_by_user_id,
+        "serving_time": log_entry.serving_time.isoformat(),
+    })
+
+def serve_meal_action(db: Session, meal_id: int, user_id: int, portions_to_serve: int,
+                      serving_time: Optional[datetime.datetime] = None, commit: bool = True) -> Tuple[bool, str, Optional[database.MealServingLog]]:
+    """
+    Ovqat berish: ko'p porsiya uchun ingredientlarni ayrish va log yozish.
+    commit=False bo'lsa, o'zgarishlar faqat flush qilinadi va muvaffaqiyatsizlikda tranzaksiyani
+    bekor qilish (masalan, savepoint'ni) chaqiruvchining vazifasi.
+    """
     if portions_to_serve <= 0:
+        metrics.STOCK_DEDUCTION_FAILURES.inc("invalid_portions")
         return False, "Portions to serve must be greater than zero.", None
 
     meal = crud.get_meal(db, meal_id)
     if not meal:
+        metrics.STOCK_DEDUCTION_FAILURES.inc("meal_not_found")
         return False, f"Meal with ID {meal_id} not found.", None
     if not meal.ingredients:
+        metrics.STOCK_DEDUCTION_FAILURES.inc("no_ingredients")
         return False, f"Meal '{meal.name}' has no ingredients defined.", None
 
-    # Kerakli ingredientlar miqdorini hisoblash va zaxirani tekshirish
+    # Kerakli ingredientlar miqdorini hisoblash va zaxirani tekshirish (butun milli-birliklarda, aniq)
     required_ingredients_total = {}
     for ing_recipe in meal.ingredients:
-        total_needed_for_ingredient = ing_recipe.required_grams * portions_to_serve
+        total_needed_for_ingredient = units.to_milli(ing_recipe.required_grams) * portions_to_serve
         product = crud.get_product(db, ing_recipe.product_id)
         if not product:
+            metrics.STOCK_DEDUCTION_FAILURES.inc("product_not_found")
             return False, f"Product '{ing_recipe.product.name if ing_recipe.product else 'ID: '+str(ing_recipe.product_id)}' for meal '{meal.name}' not found in stock.", None
-        if product.quantity_grams < total_needed_for_ingredient:
-            return False, f"Not enough '{product.name}' for {portions_to_serve} portions of '{meal.name}'. Required: {total_needed_for_ingredient}g, Available: {product.quantity_grams}g.", None
+        if units.to_milli(product.quantity_grams) < total_needed_for_ingredient:
+            metrics.STOCK_DEDUCTION_FAILURES.inc("insufficient_stock")
+            logger.debug("Taom (ID: %s) uchun '%s' yetarli emas.", meal_id, product.name)
+            return False, f"Not enough '{product.name}' for {portions_to_serve} portions of '{meal.name}'. Required: {units.from_milli(total_needed_for_ingredient)} {product.unit}, Available: {product.quantity_grams} {product.unit}.", None
         required_ingredients_total[product.id] = total_needed_for_ingredient
 
     # Agar hamma narsa yetarli bo'lsa, ingredientlarni ayrish
     for product_id, amount_to_deduct in required_ingredients_total.items():
         product_to_update = crud.get_product(db, product_id) # Qayta olish
         if product_to_update: # Xavfsizlik uchun yana tekshirish
-            product_to_update.quantity_grams -= amount_to_deduct
-            if product_to_update.quantity_grams < 0: # Bu holat yuz bermasligi kerak
-                db.rollback()
+            if units.to_milli(product_to_update.quantity_grams) < amount_to_deduct: # Bu holat yuz bermasligi kerak
+                if commit:
+                    db.rollback()
+                metrics.STOCK_DEDUCTION_FAILURES.inc("negative_stock")
+                logger.error("'%s' mahsuloti qoldig'i manfiy bo'lib qoldi (taom ID: %s).", product_to_update.name, meal_id)
                 return False, f"Critical error: Product '{product_to_update.name}' stock went negative. Transaction rolled back.", None
+            product_to_update.quantity_grams = database.milli_add(database.Product.quantity_grams, -amount_to_deduct)
             db.add(product_to_update)
+            crud.record_change(db, http_cache.PRODUCTS, product_id)
 
     # Ovqat berish logini yozish
+    if not commit:
+        log_entry = crud.create_meal_serving_log(db, meal_id=meal.id, user_id=user_id, portions_served=portions_to_serve,
+                                                 serving_time=serving_time, commit=False)
+        costing.allocate_serving(db, log_entry, required_ingredients_total)
+        return True, f"{portions_to_serve} portions of meal '{meal.name}' served successfully. Ingredients deducted.", log_entry
     try:
-        log_entry = crud.create_meal_serving_log(db, meal_id=meal.id, user_id=user_id, portions_served=portions_to_serve)
-        db.commit() # CRUD ichida commit bor, lekin bu yerda ham bo'lishi mumkin agar crud da bo'lmasa
-        db.refresh(log_entry)
-        # Mahsulotlarni ham refresh qilish
-        for product_id in required_ingredients_total.keys():
-             product_refreshed = crud.get_product(db, product_id)
-             if product_refreshed: db.refresh(product_refreshed)
+        log_entry = crud.create_meal_serving_log(db, meal_id=meal.id, user_id=user_id, portions_served=portions_to_serve,
+                                                 serving_time=serving_time, commit=False)
+        # Sarflangan miqdorlar lotlarga (FIFO) log bilan bitta tranzaksiyada taqsimlanadi
+        costing.allocate_serving(db, log_entry, required_ingredients_total)
+        db.commit()
+        notify_meal_served(db, log_entry, required_ingredients_total.keys())
 
     except Exception as e:
         db.rollback()
+        metrics.STOCK_DEDUCTION_FAILURES.inc("error")
+        logger.exception("Taom (ID: %s) berish va logni yozishda xatolik", meal_id)
         return False, f"Error during serving meal and logging: {str(e)}", None
         
     return True, f"{portions_to_serve} portions of meal '{meal.name}' served successfully. Ingredients deducted.", log_entry
 
 
-def check_low_stock_alerts(db: Session, minimum_threshold_grams: int = MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS) -> List[schemas.LowStockAlert]:
-    low_stock_products = db.query(database.Product).filter(database.Product.quantity_grams < minimum_threshold_grams).all()
+def notify_meal_served(db: Session, log_entry: database.MealServingLog, product_ids: Iterable[int]) -> None:
+    """serve_meal_action natijasi commit qilingandan keyin: keshlar, qoldiq xabarnomalari, SSE va metrikalar."""
+    db.refresh(log_entry)
+    http_cache.bump(http_cache.SERVING_LOGS, http_cache.DELIVERIES) # Lotlar qoldig'i ham o'zgardi
+    # Mahsulotlarni ham refresh qilish
+    refreshed_products = []
+    for product_id in product_ids:
+        product_refreshed = crud.get_product(db, product_id)
+        if product_refreshed:
+            db.refresh(product_refreshed)
+            refreshed_products.append(product_refreshed)
+    crud.notify_stock_changed(refreshed_products)
+    publish_meal_served(log_entry, log_entry.meal.name)
+    metrics.MEAL_SERVINGS.inc("api")
+    metrics.MEAL_PORTIONS_SERVED.inc("api", amount=log_entry.portions_served)
+
+
+def check_low_stock_alerts(db: Session, minimum_threshold_grams: Optional[float] = None) -> List[schemas.LowStockAlert]:
+    """Bazadan to'g'ridan-to'g'ri hisoblaydi. Tez-tez so'raladigan joylarda stock_cache.get_low_stock_alerts ishlatiladi."""
+    query = db.query(database.Product)
+    if minimum_threshold_grams is not None:
+        query = query.filter(database.Product.quantity_grams < minimum_threshold_grams)
+    else:
+        query = query.filter(database.Product.quantity_grams < func.coalesce(database.Product.min_stock_grams, literal(MINIMUM_STOCK_THRESHOLD_DEFAULT_GRAMS, database.MilliUnits)))
+    alerts = []
+    for product in query.order_by(database.Product.name).all():
+        threshold = minimum_threshold_grams if minimum_threshold_grams is not None else stock_cache.effective_threshold(product.min_stock_grams)
+        alerts.append(stock_cache.build_low_stock_alert(product.id, product.name, product.quantity_grams, threshold, product.unit))
+    return alerts
+
+def get_expiring_lot_alerts(db: Session, within_days: int) -> List[schemas.ExpiringLotAlert]:
+    """Muddati 'within_days' kun ichida tugaydigan yoki o'tib ketgan ochiq lotlar (qisman indeks bo'yicha)."""
+    today = datetime.datetime.utcnow().date()
+    rows = db.query(
+        database.ProductDelivery.id, database.ProductDelivery.product_id, database.Product.name,
+        database.ProductDelivery.expiry_date, database.ProductDelivery.remaining_grams, database.Product.unit,
+    ).join(
+        database.Product, database.Product.id == database.ProductDelivery.product_id
+    ).filter(
+        # Shartlar ix_product_deliveries_expiring indeksi shartini takrorlaydi, aks holda indeks ishlatilmaydi
+        database.ProductDelivery.remaining_grams > 0,
+        database.ProductDelivery.expiry_date.isnot(None),
+        database.ProductDelivery.expiry_date <= today + datetime.timedelta(days=within_days),
+    ).order_by(database.ProductDelivery.expiry_date, database.ProductDelivery.id).all()
+
     alerts = []
-    for product in low_stock_products:
-        alerts.append(schemas.LowStockAlert(
-            product_id=product.id,
-            product_name=product.name,
-            current_quantity_grams=product.quantity_grams,
-            message=f"'{product.name}' miqdori kam ({product.quantity_grams}g). Minimum: {minimum_threshold_grams}g."
+    for delivery_id, product_id, product_name, expiry_date, remaining_grams, unit in rows:
+        days_left = (expiry_date - today).days
+        if days_left < 0:
+            message = f"'{product_name}' partiyasining muddati {-days_left} kun oldin o'tgan ({remaining_grams} {unit} qolgan)."
+        else:
+            message = f"'{product_name}' partiyasining muddati {days_left} kunda tugaydi ({remaining_grams} {unit} qolgan)."
+        alerts.append(schemas.ExpiringLotAlert(
+            delivery_id=delivery_id, product_id=product_id, product_name=product_name, expiry_date=expiry_date,
+            remaining_grams=remaining_grams, days_left=days_left, message=message,
         ))
     return alerts
 
@@ -148,13 +223,13 @@ def get_ingredient_consumption_data(db: Session, product_id: int, start_date: da
             filter(database.MealServingLog.serving_time <= day_end).\
             all()
 
-        daily_consumption = 0.0
+        daily_consumption = 0 # Milli-birliklarda
         for serving_log, ingredient_recipe in logs_for_day_with_recipes:
-            daily_consumption += (ingredient_recipe.required_grams * serving_log.portions_served)
+            daily_consumption += units.to_milli(ingredient_recipe.required_grams) * serving_log.portions_served
         
         consumption_data.append({
             "date": current_date.strftime("%Y-%m-%d"),
-            "consumed_grams": daily_consumption
+            "consumed_grams": units.from_milli(daily_consumption)
         })
         current_date += datetime.timedelta(days=1)
     return consumption_data